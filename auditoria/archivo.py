@@ -0,0 +1,266 @@
+import datetime
+import gzip
+import json
+import os
+import tempfile
+from itertools import islice
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from core.paginacion import TAMANO_PAGINA, armar_pagina, decodificar_cursor
+from .models import Actividad
+
+
+# =========================
+# ARCHIVO DE AUDITORÍA
+# =========================
+# archivar() saca de la tabla los eventos más viejos que
+# AUDITORIA_RETENCION_DIAS y los guarda en una partición por día local:
+# ``actividad-AAAA-MM-DD.jsonl.gz`` (un evento JSON por línea) junto a un
+# índice chico ``actividad-AAAA-MM-DD.indice.json`` con el rango de horas,
+# los usuarios y los tipos de acción que contiene. Al leer se descartan
+# primero por el nombre (el día) y después por el índice, sin abrir el gzip.
+
+CAMPOS_ORDEN = ('fecha_hora', 'id')
+
+
+def directorio_archivo():
+    return Path(getattr(settings, 'AUDITORIA_ARCHIVO_DIR', settings.BASE_DIR / 'archivo' / 'auditoria'))
+
+
+def _ruta_particion(dia):
+    return directorio_archivo() / f'actividad-{dia:%Y-%m-%d}.jsonl.gz'
+
+
+def _ruta_indice(dia):
+    return directorio_archivo() / f'actividad-{dia:%Y-%m-%d}.indice.json'
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min))
+
+
+class ActividadArchivada:
+    """Evento leído de una partición; se muestra igual que una ``Actividad``."""
+
+    archivada = True
+
+    def __init__(self, fila):
+        self.id = self.pk = fila['id']
+        self.fecha_hora = datetime.datetime.fromisoformat(fila['fecha_hora'])
+        self.usuario_id = fila['usuario_id']
+        self.usuario = SimpleNamespace(pk=fila['usuario_id'], username=fila['usuario'])
+        self.tipo_accion = fila['tipo_accion']
+        self.descripcion = fila['descripcion']
+
+    def get_tipo_accion_display(self):
+        return dict(Actividad.TIPO_ACCION_CHOICES).get(self.tipo_accion, self.tipo_accion)
+
+    def __str__(self):
+        return f"{self.tipo_accion} - {self.fecha_hora}"
+
+
+# --- escritura ---
+
+def _fila(actividad):
+    return {
+        'id': actividad.pk,
+        'fecha_hora': actividad.fecha_hora.isoformat(),
+        'usuario_id': actividad.usuario_id,
+        'usuario': actividad.usuario.username,
+        'tipo_accion': actividad.tipo_accion,
+        'descripcion': actividad.descripcion,
+    }
+
+
+def _escribir_atomico(destino, escribir):
+    fd, temporal = tempfile.mkstemp(dir=destino.parent, suffix='.tmp')
+    os.close(fd)
+    try:
+        escribir(temporal)
+        os.replace(temporal, destino)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def _leer_filas(dia):
+    ruta = _ruta_particion(dia)
+    if not ruta.exists():
+        return []
+    with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+        return [json.loads(linea) for linea in archivo]
+
+
+def _guardar_particion(dia, filas):
+    """Agrega ``filas`` a la partición del día (sin duplicar ids) y rehace su índice."""
+    por_id = {fila['id']: fila for fila in _leer_filas(dia)}
+    por_id.update((fila['id'], fila) for fila in filas)
+    filas = sorted(por_id.values(), key=lambda f: (datetime.datetime.fromisoformat(f['fecha_hora']), f['id']))
+
+    def escribir_datos(ruta):
+        with gzip.open(ruta, 'wt', encoding='utf-8') as archivo:
+            for fila in filas:
+                archivo.write(json.dumps(fila, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    tipos = {}
+    for fila in filas:
+        tipos[fila['tipo_accion']] = tipos.get(fila['tipo_accion'], 0) + 1
+    indice = {
+        'desde': filas[0]['fecha_hora'],
+        'hasta': filas[-1]['fecha_hora'],
+        'filas': len(filas),
+        'usuarios': {str(f['usuario_id']): f['usuario'] for f in filas},
+        'tipos': tipos,
+    }
+
+    def escribir_indice(ruta):
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            json.dump(indice, archivo, ensure_ascii=False)
+
+    # Primero los datos: un índice nunca describe una partición que no existe.
+    _escribir_atomico(_ruta_particion(dia), escribir_datos)
+    _escribir_atomico(_ruta_indice(dia), escribir_indice)
+
+
+def archivar(corte=None, simular=False):
+    """
+    Mueve al archivo los eventos anteriores a ``corte`` (por defecto, hace
+    ``AUDITORIA_RETENCION_DIAS`` días), un día a la vez. Cada día se borra
+    de la tabla recién después de escrita su partición; si el proceso se
+    corta en el medio, volver a ejecutarlo no duplica eventos.
+
+    Devuelve ``[(dia, cantidad), ...]``. Con ``simular`` no escribe ni borra.
+    """
+    if corte is None:
+        corte = timezone.now() - datetime.timedelta(days=getattr(settings, 'AUDITORIA_RETENCION_DIAS', 90))
+    pendientes = Actividad.objects.filter(fecha_hora__lt=corte)
+    if not simular:
+        directorio_archivo().mkdir(parents=True, exist_ok=True)
+
+    archivados = []
+    inicio = None
+    while True:
+        restantes = pendientes if inicio is None else pendientes.filter(fecha_hora__gte=inicio)
+        primera = restantes.order_by('fecha_hora').values_list('fecha_hora', flat=True).first()
+        if primera is None:
+            return archivados
+        dia = timezone.localdate(primera)
+        inicio = _inicio_del_dia(dia + datetime.timedelta(days=1))
+        del_dia = pendientes.filter(fecha_hora__gte=_inicio_del_dia(dia), fecha_hora__lt=inicio)
+
+        if simular:
+            archivados.append((dia, del_dia.count()))
+            continue
+        actividades = list(del_dia.select_related('usuario').order_by(*CAMPOS_ORDEN))
+        _guardar_particion(dia, [_fila(a) for a in actividades])
+        ids = [a.pk for a in actividades]
+        for i in range(0, len(ids), 500):
+            Actividad.objects.filter(pk__in=ids[i:i + 500]).delete()
+        archivados.append((dia, len(ids)))
+
+
+# --- lectura ---
+
+def particiones(desde=None, hasta=None):
+    """Días archivados dentro de ``[desde, hasta]``, en orden."""
+    directorio = directorio_archivo()
+    if not directorio.is_dir():
+        return []
+    dias = []
+    for ruta in directorio.glob('actividad-*.indice.json'):
+        try:
+            dia = datetime.date.fromisoformat(ruta.name[len('actividad-'):-len('.indice.json')])
+        except ValueError:
+            continue
+        if (desde is None or dia >= desde) and (hasta is None or dia <= hasta):
+            dias.append(dia)
+    return sorted(dias)
+
+
+def _leer_indice(dia):
+    try:
+        with open(_ruta_indice(dia), encoding='utf-8') as archivo:
+            indice = json.load(archivo)
+    except FileNotFoundError:
+        return None
+    indice['desde'] = datetime.datetime.fromisoformat(indice['desde'])
+    indice['hasta'] = datetime.datetime.fromisoformat(indice['hasta'])
+    return indice
+
+
+def actividades_archivadas(desde=None, hasta=None, usuario=None, tipo_accion=None, despues_de=None, descendente=True):
+    """
+    Genera ``ActividadArchivada`` del rango de días ``[desde, hasta]``,
+    ordenadas por ``(fecha_hora, id)`` (de la más nueva a la más vieja con
+    ``descendente``) y estrictamente después de ``despues_de`` en ese orden.
+    Solo se abren las particiones cuyo índice puede contener resultados, y
+    recién cuando se llega a ellas.
+    """
+    for dia in sorted(particiones(desde, hasta), reverse=descendente):
+        indice = _leer_indice(dia)
+        if indice is None:
+            continue
+        if usuario and usuario not in indice['usuarios'].values():
+            continue
+        if tipo_accion and tipo_accion not in indice['tipos']:
+            continue
+        if despues_de is not None:
+            if descendente and indice['desde'] > despues_de[0]:
+                continue
+            if not descendente and indice['hasta'] < despues_de[0]:
+                continue
+
+        actividades = []
+        for fila in _leer_filas(dia):
+            if usuario and fila['usuario'] != usuario:
+                continue
+            if tipo_accion and fila['tipo_accion'] != tipo_accion:
+                continue
+            actividad = ActividadArchivada(fila)
+            clave = (actividad.fecha_hora, actividad.id)
+            if despues_de is not None and (clave >= despues_de if descendente else clave <= despues_de):
+                continue
+            actividades.append(actividad)
+        actividades.sort(key=lambda a: (a.fecha_hora, a.id), reverse=descendente)
+        yield from actividades
+
+
+def paginar_con_archivo(queryset, cursor=None, tamano=TAMANO_PAGINA, desde=None, hasta=None, usuario=None, tipo_accion=None):
+    """
+    Como ``core.paginacion.paginar`` con orden ``('-fecha_hora', '-id')``,
+    pero junta las filas de ``queryset`` con las archivadas del mismo rango
+    de días y filtros. ``queryset`` ya debe venir filtrado por esos mismos
+    criterios.
+    """
+    opts = Actividad._meta
+    decodificado = decodificar_cursor(cursor, [opts.get_field('fecha_hora'), opts.pk]) if cursor else None
+    direccion, valores = decodificado or ('sig', None)
+    hacia_atras = direccion == 'ant'
+
+    if valores is not None:
+        fecha_hora, pk = valores
+        if hacia_atras:
+            queryset = queryset.filter(Q(fecha_hora__gt=fecha_hora) | Q(fecha_hora=fecha_hora, id__gt=pk))
+        else:
+            queryset = queryset.filter(Q(fecha_hora__lt=fecha_hora) | Q(fecha_hora=fecha_hora, id__lt=pk))
+    orden = CAMPOS_ORDEN if hacia_atras else tuple(f'-{c}' for c in CAMPOS_ORDEN)
+
+    # Un evento archivado que todavía no se borró de la tabla aparece en los
+    # dos lados: se queda el de la base.
+    por_id = {a.id: a for a in islice(actividades_archivadas(
+        desde, hasta, usuario, tipo_accion,
+        despues_de=tuple(valores) if valores is not None else None,
+        descendente=not hacia_atras,
+    ), tamano + 1)}
+    por_id.update((a.pk, a) for a in queryset.order_by(*orden)[:tamano + 1])
+    filas = sorted(por_id.values(), key=lambda a: (a.fecha_hora, a.id), reverse=not hacia_atras)
+
+    return armar_pagina(
+        filas[:tamano + 1], tamano, hacia_atras, valores is not None,
+        lambda actividad: [actividad.fecha_hora, actividad.id],
+    )
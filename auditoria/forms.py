@@ -0,0 +1,20 @@
+from django import forms
+
+from .models import Actividad
+
+
+class ActividadFiltroForm(forms.Form):
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'class':'form-control', 'type':'date'}))
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'class':'form-control', 'type':'date'}))
+    # Por nombre de usuario y no por id: es lo que guardan las particiones
+    # archivadas, y así el formulario no consulta la lista de usuarios.
+    usuario = forms.CharField(required=False, widget=forms.TextInput(attrs={'class':'form-control', 'placeholder':'Usuario'}))
+    tipo_accion = forms.ChoiceField(choices=[('', 'Todas')] + Actividad.TIPO_ACCION_CHOICES, required=False, widget=forms.Select(attrs={'class':'form-select'}))
+
+    def clean(self):
+        cleaned = super().clean()
+        desde = cleaned.get('desde')
+        hasta = cleaned.get('hasta')
+        if desde and hasta and hasta < desde:
+            self.add_error('hasta', 'La fecha final no puede ser anterior a la inicial.')
+        return cleaned
@@ -0,0 +1,29 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from auditoria.archivo import archivar, directorio_archivo
+
+
+class Command(BaseCommand):
+    help = 'Mueve los eventos de auditoría antiguos a archivos comprimidos por día.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=getattr(settings, 'AUDITORIA_RETENCION_DIAS', 90),
+            help='Archiva los eventos con más de esta cantidad de días.',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa qué se archivaría.')
+
+    def handle(self, *args, **options):
+        corte = timezone.now() - datetime.timedelta(days=options['dias'])
+        archivados = archivar(corte, simular=options['dry_run'])
+        verbo = 'Se archivarían' if options['dry_run'] else 'Archivados'
+        for dia, cantidad in archivados:
+            self.stdout.write(f'  {dia:%d/%m/%Y}: {cantidad} evento(s)')
+        self.stdout.write(self.style.SUCCESS(
+            f'{verbo} {sum(c for _, c in archivados)} evento(s) en {len(archivados)} partición(es) '
+            f'en {directorio_archivo()}.'
+        ))
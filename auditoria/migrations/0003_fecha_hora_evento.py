@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 17:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0002_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='actividad',
+            name='fecha_hora',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='actividad',
+            name='tipo_accion',
+            field=models.CharField(choices=[('APERTURA_CAJA', 'Apertura de Caja'), ('CIERRE_CAJA', 'Cierre de Caja'), ('VENTA', 'Venta'), ('INGRESO_STOCK', 'Ingreso de Stock'), ('CREACION_PRODUCTO', 'Creación de Producto'), ('EDICION_PRODUCTO', 'Edición de Producto'), ('ELIMINACION_PRODUCTO', 'Eliminación de Producto')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0003_fecha_hora_evento'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='actividad',
+            name='tipo_accion',
+            field=models.CharField(choices=[('APERTURA_CAJA', 'Apertura de Caja'), ('CIERRE_CAJA', 'Cierre de Caja'), ('VENTA', 'Venta'), ('INGRESO_STOCK', 'Ingreso de Stock'), ('CREACION_PRODUCTO', 'Creación de Producto'), ('EDICION_PRODUCTO', 'Edición de Producto'), ('ELIMINACION_PRODUCTO', 'Eliminación de Producto'), ('CAMBIO_PRECIOS', 'Cambio de Precios')], max_length=30),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Actividad(models.Model):
@@ -10,9 +11,12 @@ class Actividad(models.Model):
         ('INGRESO_STOCK', 'Ingreso de Stock'),
         ('CREACION_PRODUCTO', 'Creación de Producto'),
         ('EDICION_PRODUCTO', 'Edición de Producto'),
+        ('ELIMINACION_PRODUCTO', 'Eliminación de Producto'),
+        ('CAMBIO_PRECIOS', 'Cambio de Precios'),
     ]
 
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    # la hora del evento, no la de su escritura en lote (ver registro.py)
+    fecha_hora = models.DateTimeField(default=timezone.now)
     usuario = models.ForeignKey(
         'auth.User',
         on_delete=models.PROTECT
@@ -23,5 +27,11 @@ class Actividad(models.Model):
     )
     descripcion = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [
+            # paginación por cursor de auditoria_list
+            models.Index(fields=['fecha_hora', 'id'], name='actividad_fecha_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.tipo_accion} - {self.fecha_hora}"
@@ -0,0 +1,168 @@
+import atexit
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .archivo import directorio_archivo
+from .models import Actividad
+
+
+logger = logging.getLogger(__name__)
+
+
+# =========================
+# ESCRITURA DE AUDITORÍA EN LOTES
+# =========================
+# registrar() no escribe en la transacción de quien llama: al confirmarse,
+# el evento pasa a una cola en memoria y un hilo lo inserta con bulk_create
+# junto con los demás, cuando se juntan AUDITORIA_TAMANO_LOTE eventos o
+# pasan AUDITORIA_INTERVALO segundos. Al terminar el proceso se vacía la
+# cola. Con AUDITORIA_SINCRONA (lo activa el runner de tests) se escribe en
+# el momento, en el hilo que llama.
+#
+# Un lote que falla (p. ej. la base bloqueada por otra escritura) vuelve al
+# principio de la cola y se reintenta con espera creciente. Tras
+# AUDITORIA_REINTENTOS fallos seguidos, o al cerrar, se escribe evento por
+# evento; los que aun así fallan se agregan a un archivo JSONL de
+# pendientes en AUDITORIA_ARCHIVO_DIR. Ningún evento se descarta.
+
+ESPERA_MAXIMA = 60
+
+class EscritorAuditoria:
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._pendientes = []
+        self._hilo = None
+        self._pid = None
+        self._cerrando = False
+
+    @property
+    def tamano_lote(self):
+        return getattr(settings, 'AUDITORIA_TAMANO_LOTE', 200)
+
+    @property
+    def reintentos(self):
+        return getattr(settings, 'AUDITORIA_REINTENTOS', 5)
+
+    def encolar(self, actividad):
+        with self._condicion:
+            if self._pid != os.getpid():
+                # Proceso nuevo (p. ej. un worker tras el fork): el hilo y
+                # los eventos del padre no existen aquí.
+                self._pendientes, self._hilo, self._pid = [], None, os.getpid()
+            self._pendientes.append(actividad)
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name='auditoria', daemon=True)
+                self._hilo.start()
+            if len(self._pendientes) >= self.tamano_lote:
+                self._condicion.notify()
+
+    def _bucle(self):
+        fallos = 0
+        try:
+            while True:
+                with self._condicion:
+                    if fallos:
+                        # espera creciente antes de reintentar; al cerrar, ya
+                        self._condicion.wait_for(
+                            lambda: self._cerrando, timeout=min(2 ** (fallos - 1), ESPERA_MAXIMA),
+                        )
+                    else:
+                        self._condicion.wait_for(
+                            lambda: len(self._pendientes) >= self.tamano_lote or self._cerrando,
+                            timeout=getattr(settings, 'AUDITORIA_INTERVALO', 2),
+                        )
+                    lote, self._pendientes = self._pendientes, []
+                    if not lote and self._cerrando:
+                        # bajo el lock: un encolar() posterior arranca otro hilo
+                        self._hilo = None
+                        return
+                if not lote:
+                    continue
+                if self._escribir(lote):
+                    fallos = 0
+                    continue
+                fallos += 1
+                if fallos >= self.reintentos or self._cerrando:
+                    self._rescatar(lote)
+                    fallos = 0
+                else:
+                    with self._condicion:
+                        self._pendientes[:0] = lote
+        finally:
+            connection.close()
+
+    def _escribir(self, lote):
+        try:
+            Actividad.objects.bulk_create(lote, batch_size=self.tamano_lote)
+        except Exception:
+            logger.warning('No se pudieron escribir %d eventos de auditoría; se reintentará.', len(lote), exc_info=True)
+            connection.close()
+            return False
+        return True
+
+    def _rescatar(self, lote):
+        """Último recurso: evento por evento, y al archivo de pendientes los que fallen."""
+        fallidos = []
+        for actividad in lote:
+            try:
+                Actividad.objects.bulk_create([actividad])
+            except Exception:
+                connection.close()
+                fallidos.append(actividad)
+        if not fallidos:
+            return
+        ruta = directorio_archivo() / f'pendientes-{os.getpid()}.jsonl'
+        try:
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            with open(ruta, 'a', encoding='utf-8') as archivo:
+                for actividad in fallidos:
+                    archivo.write(json.dumps({
+                        'fecha_hora': actividad.fecha_hora.isoformat(),
+                        'usuario_id': actividad.usuario_id,
+                        'tipo_accion': actividad.tipo_accion,
+                        'descripcion': actividad.descripcion,
+                    }, ensure_ascii=False) + '\n')
+        except OSError:
+            logger.exception('Se perdieron %d eventos de auditoría.', len(fallidos))
+        else:
+            logger.error('%d eventos de auditoría quedaron en %s.', len(fallidos), ruta)
+
+    def vaciar(self, timeout=10):
+        """Escribe lo pendiente y detiene el hilo (se llama al salir)."""
+        with self._condicion:
+            hilo = self._hilo
+            if hilo is None or self._pid != os.getpid():
+                return
+            self._cerrando = True
+            self._condicion.notify()
+        hilo.join(timeout)
+        with self._condicion:
+            self._cerrando = False
+
+
+escritor = EscritorAuditoria()
+atexit.register(escritor.vaciar)
+
+
+def registrar(usuario, tipo_accion, descripcion):
+    """
+    Registra un evento de auditoría cuando la transacción en curso se
+    confirme (si se revierte, no queda registro). No agrega consultas al
+    camino de quien llama.
+    """
+    actividad = Actividad(
+        usuario=usuario,
+        tipo_accion=tipo_accion,
+        descripcion=descripcion[:Actividad._meta.get_field('descripcion').max_length],
+        fecha_hora=timezone.now(),
+    )
+    if getattr(settings, 'AUDITORIA_SINCRONA', False):
+        transaction.on_commit(lambda: Actividad.objects.bulk_create([actividad]))
+    else:
+        transaction.on_commit(lambda: escritor.encolar(actividad))
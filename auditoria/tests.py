@@ -1,3 +1,215 @@
-from django.test import TestCase
+import datetime
+import json
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.pruebas import PresupuestoConsultasMixin
+
+from . import archivo, registro
+from .models import Actividad
+
+
+class AuditoriaListTest(PresupuestoConsultasMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auditor', password='x')
+        Actividad.objects.bulk_create([
+            Actividad(usuario=self.user, tipo_accion='VENTA', descripcion=f'Venta {i}')
+            for i in range(150)
+        ])
+        self.client.force_login(self.user)
+
+    def test_pagina_con_cursor(self):
+        response = self.client.get(reverse('auditoria_list'))
+        self.assertEqual(len(response.context['actividades']), 100)
+        self.assertContains(response, 'Historial de Actividades')
+
+        siguiente = response.context['pagina'].siguiente
+        response = self.client.get(reverse('auditoria_list'), {'cursor': siguiente})
+        self.assertEqual(len(response.context['actividades']), 50)
+        self.assertIsNone(response.context['pagina'].siguiente)
+
+
+class RegistroAuditoriaTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.client.force_login(self.user)
+
+    def test_apertura_y_cierre_de_caja(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('abrir_caja'))
+        self.assertEqual(
+            list(Actividad.objects.values_list('tipo_accion', 'usuario')),
+            [('APERTURA_CAJA', self.user.pk)],
+        )
+
+    def test_no_registra_si_la_transaccion_se_revierte(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    registro.registrar(self.user, 'VENTA', 'Venta revertida')
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertFalse(Actividad.objects.exists())
+
+
+@override_settings(AUDITORIA_SINCRONA=False, AUDITORIA_TAMANO_LOTE=3, AUDITORIA_INTERVALO=60)
+class EscritorAuditoriaTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+
+    def test_escribe_en_lotes_y_vacia_al_cerrar(self):
+        antes = timezone.now()
+        for i in range(7):
+            registro.registrar(self.user, 'VENTA', f'Venta {i}')
+
+        # los lotes completos se escriben sin esperar al intervalo
+        limite = timezone.now() + datetime.timedelta(seconds=10)
+        while Actividad.objects.count() < 6 and timezone.now() < limite:
+            time.sleep(0.01)
+        self.assertGreaterEqual(Actividad.objects.count(), 6)
+
+        registro.escritor.vaciar()
+        self.assertEqual(Actividad.objects.count(), 7)
+        # la hora es la del evento, no la de la escritura
+        self.assertTrue(all(
+            antes <= fecha <= timezone.now()
+            for fecha in Actividad.objects.values_list('fecha_hora', flat=True)
+        ))
+
+    def test_reintenta_un_lote_que_falla(self):
+        escribir = Actividad.objects.bulk_create
+        intentos = []
+
+        def base_bloqueada(*args, **kwargs):
+            intentos.append(len(args[0]))
+            if len(intentos) < 3:
+                raise OperationalError('database is locked')
+            return escribir(*args, **kwargs)
+
+        with mock.patch.object(Actividad.objects, 'bulk_create', side_effect=base_bloqueada), \
+                self.assertLogs('auditoria.registro', 'WARNING'):
+            for i in range(3):
+                registro.registrar(self.user, 'VENTA', f'Venta {i}')
+            limite = timezone.now() + datetime.timedelta(seconds=10)
+            while Actividad.objects.count() < 3 and timezone.now() < limite:
+                time.sleep(0.01)
+        self.assertEqual(intentos, [3, 3, 3])
+        self.assertEqual(Actividad.objects.count(), 3)
+        registro.escritor.vaciar()
+
+    def test_sin_base_los_eventos_quedan_en_archivo(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        with override_settings(AUDITORIA_ARCHIVO_DIR=Path(directorio.name)), \
+                mock.patch.object(Actividad.objects, 'bulk_create', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('auditoria.registro', 'ERROR'):
+            registro.registrar(self.user, 'VENTA', 'Venta perdida')
+            registro.escritor.vaciar()
+        lineas = next(Path(directorio.name).glob('pendientes-*.jsonl')).read_text(encoding='utf-8').splitlines()
+        self.assertEqual([json.loads(linea)['descripcion'] for linea in lineas], ['Venta perdida'])
+
+
+
+class ArchivoAuditoriaTest(PresupuestoConsultasMixin, TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.enterContext(override_settings(AUDITORIA_ARCHIVO_DIR=directorio.name))
+        self.directorio = Path(directorio.name)
+
+        self.user = User.objects.create_user(username='auditor', password='x')
+        self.otro = User.objects.create_user(username='cajero', password='x')
+        self.hoy = timezone.localdate()
+        mediodia = timezone.make_aware(datetime.datetime.combine(self.hoy, datetime.time(12)))
+        # 3 días viejos con 40 eventos cada uno, y 30 recientes
+        Actividad.objects.bulk_create([
+            Actividad(
+                usuario=self.user if i % 2 else self.otro,
+                tipo_accion='VENTA' if dias < 200 else 'INGRESO_STOCK',
+                descripcion=f'Evento {dias}-{i}',
+                fecha_hora=mediodia - datetime.timedelta(days=dias, minutes=i),
+            )
+            for dias in (100, 101, 200) for i in range(40)
+        ] + [
+            Actividad(usuario=self.user, tipo_accion='VENTA', descripcion=f'Reciente {i}',
+                      fecha_hora=mediodia - datetime.timedelta(days=1, minutes=i))
+            for i in range(30)
+        ])
+        self.client.force_login(self.user)
+
+    def dia(self, dias):
+        return self.hoy - datetime.timedelta(days=dias)
+
+    def test_archiva_por_dia_con_indice(self):
+        archivados = archivo.archivar()
+        self.assertEqual(archivados, [(self.dia(200), 40), (self.dia(101), 40), (self.dia(100), 40)])
+        self.assertEqual(Actividad.objects.count(), 30)
+        self.assertEqual(archivo.particiones(), [self.dia(200), self.dia(101), self.dia(100)])
+
+        indice = archivo._leer_indice(self.dia(200))
+        self.assertEqual(indice['filas'], 40)
+        self.assertEqual(indice['tipos'], {'INGRESO_STOCK': 40})
+        self.assertEqual(sorted(indice['usuarios'].values()), ['auditor', 'cajero'])
+        self.assertLess(indice['desde'], indice['hasta'])
+
+        # volver a archivar no duplica: los eventos que quedaron en la tabla
+        # (p. ej. por un corte a mitad de camino) se fusionan por id
+        self.assertEqual(archivo.archivar(), [])
+        archivadas = list(archivo.actividades_archivadas())
+        self.assertEqual(len(archivadas), 120)
+        self.assertEqual(len({a.id for a in archivadas}), 120)
+
+    def test_simular_no_mueve_nada(self):
+        out = StringIO()
+        call_command('archivar_auditoria', '--dry-run', stdout=out)
+        self.assertIn('Se archivarían 120 evento(s) en 3 partición(es)', out.getvalue())
+        self.assertEqual(Actividad.objects.count(), 150)
+        self.assertEqual(archivo.particiones(), [])
+
+    def test_listado_por_rango_junta_base_y_archivo(self):
+        archivo.archivar(timezone.now() - datetime.timedelta(days=100, hours=12))
+        # el día 100 quedó en la tabla; los otros dos, archivados
+        self.assertEqual(Actividad.objects.count(), 70)
+        # una partición fuera del rango no se abre
+        (self.directorio / f'actividad-{self.dia(200):%Y-%m-%d}.jsonl.gz').write_bytes(b'corrupto')
+
+        filtros = {'desde': self.dia(150).isoformat(), 'hasta': self.dia(1).isoformat()}
+        response = self.client.get(reverse('auditoria_list'), filtros)
+        self.assertConsultas(response, 5)
+        pagina = response.context['pagina']
+        self.assertEqual(len(pagina), 100)
+        self.assertEqual(sum(getattr(a, 'archivada', False) for a in pagina), 30)
+
+        response = self.client.get(reverse('auditoria_list'), {**filtros, 'cursor': pagina.siguiente})
+        segunda = response.context['pagina']
+        self.assertEqual(len(segunda), 10)
+        self.assertIsNone(segunda.siguiente)
+        self.assertContains(response, 'archivado')
+
+        fechas = [a.fecha_hora for a in list(pagina) + list(segunda)]
+        self.assertEqual(fechas, sorted(fechas, reverse=True))
+
+        # y de vuelta a la primera
+        response = self.client.get(reverse('auditoria_list'), {**filtros, 'cursor': segunda.anterior})
+        self.assertEqual([a.id for a in response.context['pagina']], [a.id for a in pagina])
+
+    def test_filtros_de_usuario_y_accion(self):
+        archivo.archivar()
+        response = self.client.get(reverse('auditoria_list'), {
+            'desde': self.dia(250).isoformat(), 'usuario': 'cajero', 'tipo_accion': 'INGRESO_STOCK',
+        })
+        actividades = list(response.context['pagina'])
+        self.assertEqual(len(actividades), 20)
+        self.assertTrue(all(a.usuario.username == 'cajero' for a in actividades))
+        self.assertContains(response, 'Ingreso Stock')
@@ -1,8 +1,52 @@
+import datetime
+
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.utils import timezone
+from core.instrumentacion import presupuesto_consultas
+from core.paginacion import conteo_aproximado, paginar
+from core.routers import solo_lectura
+from .archivo import paginar_con_archivo
+from .forms import ActividadFiltroForm
 from .models import Actividad
 
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
 @login_required
+@solo_lectura()
+@presupuesto_consultas(6)
 def auditoria_list(request):
-    actividades = Actividad.objects.all().order_by('-fecha_hora')[:100]
-    return render(request, 'auditoria/auditoria_list.html', {'actividades': actividades})
+    form = ActividadFiltroForm(request.GET)
+    filtros = form.cleaned_data if form.is_valid() else {}
+    desde, hasta = filtros.get('desde'), filtros.get('hasta')
+    usuario, tipo_accion = filtros.get('usuario'), filtros.get('tipo_accion')
+
+    actividades = Actividad.objects.select_related('usuario')
+    if desde:
+        actividades = actividades.filter(fecha_hora__gte=_inicio_del_dia(desde))
+    if hasta:
+        actividades = actividades.filter(fecha_hora__lt=_inicio_del_dia(hasta + datetime.timedelta(days=1)))
+    if usuario:
+        actividades = actividades.filter(usuario__username=usuario)
+    if tipo_accion:
+        actividades = actividades.filter(tipo_accion=tipo_accion)
+
+    cursor = request.GET.get('cursor')
+    if desde or hasta:
+        # Con un rango de fechas se incluyen los eventos ya archivados.
+        pagina = paginar_con_archivo(
+            actividades, cursor, tamano=100,
+            desde=desde, hasta=hasta, usuario=usuario, tipo_accion=tipo_accion,
+        )
+    else:
+        pagina = paginar(actividades, ('-fecha_hora', '-id'), cursor, tamano=100)
+
+    return render(request, 'auditoria/auditoria_list.html', {
+        'actividades': pagina,
+        'pagina': pagina,
+        'form': form,
+        'total_aproximado': None if filtros and any(filtros.values()) else conteo_aproximado(Actividad),
+    })
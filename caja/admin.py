@@ -8,13 +8,14 @@ from .models import Caja
 class CajaAdmin(admin.ModelAdmin):
     list_display = (
         'fecha',
+        'terminal',
         'abierta',
         'hora_apertura',
         'hora_cierre',
         'total_vendido',
     )
 
-    list_filter = ('abierta', 'fecha')
+    list_filter = ('abierta', 'terminal', 'fecha')
     search_fields = ('fecha',)
 
     readonly_fields = (
@@ -0,0 +1,41 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from caja.models import Caja
+from caja.services import recalcular_cajas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde las ventas los totales acumulados de las cajas e informa las diferencias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('caja_ids', nargs='*', type=int, help='Cajas a recalcular (por defecto, todas).')
+        parser.add_argument('--desde', type=datetime.date.fromisoformat, help='Primera fecha de caja (AAAA-MM-DD).')
+        parser.add_argument('--hasta', type=datetime.date.fromisoformat, help='Última fecha de caja (AAAA-MM-DD).')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo informa las diferencias, sin corregirlas.',
+        )
+
+    def handle(self, *args, **options):
+        cajas = Caja.objects.all()
+        if options['caja_ids']:
+            cajas = cajas.filter(pk__in=options['caja_ids'])
+        if options['desde']:
+            cajas = cajas.filter(fecha__gte=options['desde'])
+        if options['hasta']:
+            cajas = cajas.filter(fecha__lte=options['hasta'])
+
+        diferencias = recalcular_cajas(cajas, simular=options['dry_run'])
+        for caja, campos in diferencias:
+            for campo, (actual, esperado) in campos.items():
+                self.stdout.write(f'{caja}: {campo} {actual} -> {esperado}')
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('Todos los totales de caja coinciden con las ventas.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(diferencias)} caja(s) con diferencias.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(diferencias)} caja(s) corregida(s).'))
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caja',
+            index=models.Index(fields=['fecha', 'id'], name='caja_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caja', '0002_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='caja',
+            name='terminal',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='caja',
+            name='fecha',
+            field=models.DateField(),
+        ),
+        migrations.AddConstraint(
+            model_name='caja',
+            constraint=models.UniqueConstraint(fields=('fecha', 'terminal'), name='caja_fecha_terminal_uniq'),
+        ),
+    ]
@@ -3,7 +3,10 @@ from django.db import models
 
 
 class Caja(models.Model):
-    fecha = models.DateField(unique=True)
+    fecha = models.DateField()
+    # Cada terminal (punto de venta) abre su propia caja por día y sus ventas
+    # solo actualizan esa fila: dos terminales nunca se disputan la misma.
+    terminal = models.PositiveSmallIntegerField(default=1)
 
     monto_inicial = models.DecimalField(max_digits=10, decimal_places=2)
 
@@ -19,5 +22,14 @@ class Caja(models.Model):
     hora_apertura = models.DateTimeField()
     hora_cierre = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'terminal'], name='caja_fecha_terminal_uniq'),
+        ]
+        indexes = [
+            # paginación por cursor de caja_list
+            models.Index(fields=['fecha', 'id'], name='caja_fecha_id_idx'),
+        ]
+
     def __str__(self):
-        return f"Caja {self.fecha}"
+        return f"Caja {self.terminal} - {self.fecha}"
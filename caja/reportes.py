@@ -0,0 +1,216 @@
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+from ventas.models import Venta, VentaDetalle
+from .services import CAMPO_POR_METODO
+
+
+# Solo el dibujo del PDF corre en el pool: los datos se leen antes, en el
+# hilo que lo pide, así los hilos del pool no necesitan conexión a la base.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'REPORTES_CAJA_WORKERS', 2),
+    thread_name_prefix='reporte-caja',
+)
+_pendientes = {}
+_lock = threading.RLock()
+
+
+def directorio_reportes():
+    return Path(getattr(settings, 'REPORTES_CAJA_DIR', settings.BASE_DIR / 'reportes' / 'caja'))
+
+
+def version_datos(caja):
+    """
+    Huella de los datos que alimentan el reporte: cambia con cada venta
+    nueva, con los totales acumulados y al reabrir o cerrar la caja.
+    """
+    resumen = Venta.objects.filter(caja=caja).aggregate(cantidad=Count('id'), ultima=Max('id'))
+    partes = [
+        caja.pk,
+        resumen['cantidad'],
+        resumen['ultima'],
+        caja.total_vendido,
+        caja.ganancia_diaria,
+        caja.hora_cierre.isoformat() if caja.hora_cierre else 'abierta',
+    ]
+    return hashlib.sha1('|'.join(str(p) for p in partes).encode()).hexdigest()[:16]
+
+
+def ruta_reporte(caja):
+    return directorio_reportes() / f'cierre_caja_{caja.pk}_{version_datos(caja)}.pdf'
+
+
+def datos_cierre(caja):
+    detalles = VentaDetalle.objects.filter(venta__caja=caja)
+    top_productos = list(
+        detalles
+        .values('presentacion__producto__nombre', 'presentacion__nombre')
+        .annotate(cantidad=Sum('cantidad_ingresada'), total=Sum('subtotal'))
+        .order_by('-total')[:10]
+    )
+    por_hora = {
+        fila['hora']: fila
+        for fila in Venta.objects.filter(caja=caja)
+        .annotate(hora=ExtractHour('fecha', tzinfo=timezone.get_current_timezone()))
+        .values('hora')
+        .annotate(cantidad=Count('id'), total=Sum('total'))
+    }
+    return {
+        'titulo': f'Cierre de {caja}',
+        'apertura': timezone.localtime(caja.hora_apertura) if caja.hora_apertura else None,
+        'cierre': timezone.localtime(caja.hora_cierre) if caja.hora_cierre else None,
+        'monto_inicial': caja.monto_inicial,
+        'total_vendido': caja.total_vendido,
+        'ganancia': caja.ganancia_diaria,
+        'por_metodo': [
+            (metodo.title(), getattr(caja, campo)) for metodo, campo in CAMPO_POR_METODO.items()
+        ],
+        'top_productos': [
+            (
+                f"{p['presentacion__producto__nombre']} - {p['presentacion__nombre']}",
+                p['cantidad'],
+                p['total'],
+            )
+            for p in top_productos
+        ],
+        'por_hora': [
+            (hora, por_hora[hora]['cantidad'], por_hora[hora]['total'] or Decimal('0'))
+            for hora in range(24)
+            if hora in por_hora
+        ],
+    }
+
+
+def _dinero(valor):
+    return f'${valor:,.2f}'
+
+
+def dibujar_pdf(datos, destino):
+    """Genera el PDF del cierre en ``destino`` (escritura atómica)."""
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    estilos = getSampleStyleSheet()
+    estilo_tabla = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#667eea')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ])
+
+    margen = Decimal('0')
+    if datos['total_vendido']:
+        margen = datos['ganancia'] * 100 / datos['total_vendido']
+
+    elementos = [
+        Paragraph(datos['titulo'], estilos['Title']),
+        Paragraph(
+            f"Apertura: {datos['apertura']:%d/%m/%Y %H:%M}" if datos['apertura'] else 'Apertura: -',
+            estilos['Normal'],
+        ),
+        Paragraph(
+            f"Cierre: {datos['cierre']:%d/%m/%Y %H:%M}" if datos['cierre'] else 'Cierre: caja abierta',
+            estilos['Normal'],
+        ),
+        Spacer(1, 0.5 * cm),
+        Paragraph('Totales por método de pago', estilos['Heading2']),
+    ]
+
+    totales = [['Método', 'Total']]
+    totales += [[metodo, _dinero(total)] for metodo, total in datos['por_metodo']]
+    totales += [
+        ['Total vendido', _dinero(datos['total_vendido'])],
+        ['Ganancia', _dinero(datos['ganancia'])],
+        ['Margen', f'{margen:.1f}%'],
+    ]
+    tabla = Table(totales, colWidths=[8 * cm, 5 * cm])
+    tabla.setStyle(estilo_tabla)
+    elementos += [tabla, Spacer(1, 0.5 * cm), Paragraph('Productos más vendidos', estilos['Heading2'])]
+
+    productos = [['Producto', 'Cantidad', 'Total']]
+    productos += [[nombre, f'{cantidad:.3f}', _dinero(total)] for nombre, cantidad, total in datos['top_productos']]
+    tabla = Table(productos, colWidths=[9 * cm, 3 * cm, 4 * cm])
+    tabla.setStyle(estilo_tabla)
+    elementos += [tabla, Spacer(1, 0.5 * cm), Paragraph('Ventas por hora', estilos['Heading2'])]
+
+    if datos['por_hora']:
+        grafico = Drawing(16 * cm, 6 * cm)
+        barras = VerticalBarChart()
+        barras.x, barras.y = 1.5 * cm, 1 * cm
+        barras.width, barras.height = 14 * cm, 4.5 * cm
+        barras.data = [[float(total) for _, _, total in datos['por_hora']]]
+        barras.categoryAxis.categoryNames = [f'{hora:02d}h' for hora, _, _ in datos['por_hora']]
+        barras.valueAxis.valueMin = 0
+        barras.bars[0].fillColor = colors.HexColor('#764ba2')
+        grafico.add(barras)
+        elementos.append(grafico)
+    else:
+        elementos.append(Paragraph('Sin ventas registradas.', estilos['Normal']))
+
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=destino.parent, suffix='.tmp')
+    os.close(fd)
+    try:
+        SimpleDocTemplate(temporal, pagesize=A4, title=datos['titulo']).build(elementos)
+        os.replace(temporal, destino)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+    return destino
+
+
+def solicitar_reporte(caja):
+    """
+    Devuelve ``(ruta, futuro)``. Si el PDF de la versión actual ya existe,
+    ``futuro`` es ``None`` y se puede servir de inmediato; si no, se encola
+    su generación (una sola vez por versión) y se devuelve el futuro.
+    """
+    ruta = ruta_reporte(caja)
+    if ruta.exists():
+        return ruta, None
+
+    with _lock:
+        futuro = _pendientes.get(ruta)
+    if futuro is not None:
+        return ruta, futuro
+
+    datos = datos_cierre(caja)
+    with _lock:
+        futuro = _pendientes.get(ruta)
+        if futuro is None:
+            futuro = _executor.submit(dibujar_pdf, datos, ruta)
+            _pendientes[ruta] = futuro
+            futuro.add_done_callback(lambda f: _terminar(caja.pk, ruta, f))
+    return ruta, futuro
+
+
+def descartar(ruta, futuro):
+    """Olvida ``futuro`` si sigue pendiente para ``ruta``: el próximo pedido lo vuelve a encolar."""
+    with _lock:
+        if _pendientes.get(ruta) is futuro:
+            del _pendientes[ruta]
+
+
+def _terminar(caja_id, ruta, futuro):
+    descartar(ruta, futuro)
+    if futuro.exception() is None:
+        # Las versiones anteriores del mismo cierre ya no se van a servir.
+        for anterior in ruta.parent.glob(f'cierre_caja_{caja_id}_*.pdf'):
+            if anterior != ruta:
+                anterior.unlink(missing_ok=True)
@@ -0,0 +1,175 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from core import fragmentos
+from ventas.models import VentaDetalle
+from .models import Caja
+
+
+CAMPO_POR_METODO = {
+    'EFECTIVO': 'total_efectivo',
+    'DEBITO': 'total_debito',
+    'TRANSFERENCIA': 'total_transferencia',
+}
+
+CAMPOS_TOTALES = (
+    'total_vendido',
+    'total_efectivo',
+    'total_debito',
+    'total_transferencia',
+    'ganancia_diaria',
+)
+
+
+# =========================
+# TERMINALES
+# =========================
+# Cada terminal tiene su caja del día y acumula sus ventas en esa fila, así
+# las ventas de terminales distintas nunca esperan por el mismo lock de
+# fila. La vista del local suma las cajas del día: tantas filas como
+# terminales, leídas por el índice único (fecha, terminal).
+
+CLAVE_TERMINAL = 'terminal'
+
+
+def terminales():
+    return range(1, getattr(settings, 'CAJA_TERMINALES', 1) + 1)
+
+
+def leer_terminal(valor):
+    """El número de terminal de ``valor`` o ``None`` si no es una terminal válida."""
+    try:
+        terminal = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return terminal if terminal in terminales() else None
+
+
+def terminal_de(request):
+    """
+    Terminal de la petición: la indicada en ``?terminal=`` o en el POST
+    (que queda guardada en la sesión), la de la sesión, o la 1.
+    """
+    terminal = leer_terminal(request.POST.get(CLAVE_TERMINAL) or request.GET.get(CLAVE_TERMINAL))
+    if terminal is not None:
+        request.session[CLAVE_TERMINAL] = terminal
+        return terminal
+    return leer_terminal(request.session.get(CLAVE_TERMINAL)) or 1
+
+
+def caja_abierta(terminal):
+    # Si quedó abierta la caja de un día anterior, gana la más reciente.
+    return Caja.objects.filter(abierta=True, terminal=terminal).order_by('-fecha').first()
+
+
+def resumen_dia(fecha):
+    """
+    ``(cajas, totales)`` del local en ``fecha``: las cajas de cada terminal
+    y la suma de sus totales, con una sola consulta.
+    """
+    cajas = list(Caja.objects.filter(fecha=fecha).order_by('terminal'))
+    totales = {
+        campo: sum((getattr(caja, campo) for caja in cajas), Decimal('0.00'))
+        for campo in ('monto_inicial',) + CAMPOS_TOTALES
+    }
+    return cajas, totales
+
+
+def acumular_venta(caja, metodo_pago, total, ganancia):
+    """
+    Suma una venta a los totales de la caja con un único UPDATE.
+
+    Se usan expresiones F para que el incremento lo haga la base de datos:
+    dos ventas simultáneas sobre la misma caja no se pisan. Debe llamarse
+    dentro de la misma transacción que inserta la ``Venta``.
+    """
+    acumular_ventas(caja, [(metodo_pago, total, ganancia)])
+
+
+def acumular_ventas(caja, ventas):
+    """
+    Como :func:`acumular_venta` para varias ventas ``(metodo_pago, total,
+    ganancia)`` de la misma caja, también en un único UPDATE.
+    """
+    por_campo = {}
+    ganancia_total = Decimal('0')
+    for metodo_pago, total, ganancia in ventas:
+        campo = CAMPO_POR_METODO[metodo_pago]
+        por_campo[campo] = por_campo.get(campo, Decimal('0')) + total
+        ganancia_total += ganancia
+    if not por_campo:
+        return
+    Caja.objects.filter(pk=caja.pk).update(
+        total_vendido=F('total_vendido') + sum(por_campo.values()),
+        ganancia_diaria=F('ganancia_diaria') + ganancia_total,
+        **{campo: F(campo) + total for campo, total in por_campo.items()},
+    )
+
+
+def totales_por_caja(cajas):
+    """
+    ``{caja_id: totales}`` de las cajas de ``cajas`` (un queryset) que tienen
+    ventas, recalculados desde las líneas de venta en una sola consulta
+    agrupada: las sumas por método de pago son condicionales sobre la misma
+    pasada. La ganancia es la guardada en cada línea al vender.
+    """
+    dinero = DecimalField(max_digits=12, decimal_places=2)
+    cero = Decimal('0')
+    filas = (
+        VentaDetalle.objects
+        .filter(venta__caja__in=cajas)
+        .values('venta__caja_id')
+        .annotate(
+            total_vendido=Coalesce(Sum('subtotal'), cero, output_field=dinero),
+            ganancia_diaria=Coalesce(Sum('ganancia'), cero, output_field=dinero),
+            **{
+                campo: Coalesce(Sum('subtotal', filter=Q(venta__metodo_pago=metodo)), cero, output_field=dinero)
+                for metodo, campo in CAMPO_POR_METODO.items()
+            }
+        )
+        .order_by()
+    )
+    return {
+        fila.pop('venta__caja_id'): {campo: Decimal(valor).quantize(Decimal('0.01')) for campo, valor in fila.items()}
+        for fila in filas
+    }
+
+
+def calcular_totales(caja):
+    """Recalcula desde cero los totales de una caja a partir de sus ventas."""
+    ceros = {campo: Decimal('0.00') for campo in CAMPOS_TOTALES}
+    return totales_por_caja(Caja.objects.filter(pk=caja.pk)).get(caja.pk, ceros)
+
+
+@transaction.atomic
+def recalcular_cajas(cajas, simular=False):
+    """
+    Compara los totales guardados de ``cajas`` con los recalculados y
+    corrige los que difieren con un ``bulk_update``, en una transacción
+    para que una venta que entra entremedio no se pierda. Devuelve
+    ``[(caja, {campo: (guardado, esperado)})]`` de las cajas con diferencias.
+    """
+    esperados = totales_por_caja(cajas)
+    ceros = {campo: Decimal('0.00') for campo in CAMPOS_TOTALES}
+    diferencias = []
+    for caja in cajas.only('pk', 'fecha', *CAMPOS_TOTALES).order_by('fecha', 'pk').iterator(chunk_size=2000):
+        totales = esperados.get(caja.pk, ceros)
+        distintos = {
+            campo: (getattr(caja, campo), valor)
+            for campo, valor in totales.items()
+            if getattr(caja, campo) != valor
+        }
+        if distintos:
+            for campo, valor in totales.items():
+                setattr(caja, campo, valor)
+            diferencias.append((caja, distintos))
+    if diferencias and not simular:
+        Caja.objects.bulk_update([caja for caja, _ in diferencias], CAMPOS_TOTALES, batch_size=500)
+        # bulk_update no emite post_save: las filas cacheadas de caja_list se
+        # renuevan a mano
+        fragmentos.incrementar('caja')
+    return diferencias
@@ -1,3 +1,256 @@
-from django.test import TestCase
+import datetime
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from auditoria.models import Actividad
+from inventario.tests import crear_presentacion
+from ventas.models import VentaDetalle
+from ventas.services import registrar_venta
+from . import reportes
+from .models import Caja
+from .services import acumular_venta, caja_abierta, calcular_totales, recalcular_cajas, resumen_dia
+
+
+class TotalesCajaTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.caja = Caja.objects.create(
+            fecha=datetime.date.today(),
+            monto_inicial=0,
+            hora_apertura=timezone.now(),
+        )
+        # compra 500, venta 800
+        self.presentacion = crear_presentacion(stock_base='100')
+
+    def _vender(self, metodo_pago, cantidad):
+        return registrar_venta(self.user, self.caja, metodo_pago, [{
+            'presentacion_id': self.presentacion.id,
+            'unidad_venta': 'UNIDAD',
+            'cantidad_ingresada': Decimal(cantidad),
+        }])
+
+    def test_venta_acumula_totales_por_metodo_de_pago(self):
+        self._vender('EFECTIVO', '2')
+        self._vender('DEBITO', '1')
+        self._vender('EFECTIVO', '1')
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.total_vendido, Decimal('3200'))
+        self.assertEqual(self.caja.total_efectivo, Decimal('2400'))
+        self.assertEqual(self.caja.total_debito, Decimal('800'))
+        self.assertEqual(self.caja.total_transferencia, Decimal('0'))
+        self.assertEqual(self.caja.ganancia_diaria, Decimal('1200'))
+
+    def test_recompute_caja_corrige_diferencias(self):
+        self._vender('TRANSFERENCIA', '3')
+        Caja.objects.filter(pk=self.caja.pk).update(total_vendido=0, total_transferencia=5, ganancia_diaria=0)
+
+        salida = StringIO()
+        call_command('recompute_caja', '--dry-run', stdout=salida)
+        self.assertIn('total_transferencia 5.00 -> 2400.00', salida.getvalue())
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.total_transferencia, Decimal('5'))
+
+        call_command('recompute_caja', stdout=StringIO())
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.total_vendido, Decimal('2400'))
+        self.assertEqual(self.caja.total_transferencia, Decimal('2400'))
+        self.assertEqual(self.caja.ganancia_diaria, Decimal('900'))
+
+        salida = StringIO()
+        call_command('recompute_caja', stdout=salida)
+        self.assertIn('coinciden', salida.getvalue())
+
+    def test_ganancia_usa_el_costo_al_momento_de_la_venta(self):
+        self._vender('EFECTIVO', '3')
+        self.presentacion.precio_compra = Decimal('700')
+        self.presentacion.save()
+
+        detalle = VentaDetalle.objects.get()
+        self.assertEqual((detalle.costo_unitario, detalle.ganancia), (Decimal('500'), Decimal('900')))
+        self.assertEqual(calcular_totales(self.caja)['ganancia_diaria'], Decimal('900'))
+        self.assertEqual(recalcular_cajas(Caja.objects.all()), [])
+
+    def test_recalcular_cajas_por_rango_de_fechas(self):
+        ayer = Caja.objects.create(
+            fecha=self.caja.fecha - datetime.timedelta(days=1),
+            monto_inicial=0,
+            hora_apertura=timezone.now(),
+        )
+        registrar_venta(self.user, ayer, 'DEBITO', [{
+            'presentacion_id': self.presentacion.id,
+            'unidad_venta': 'UNIDAD',
+            'cantidad_ingresada': Decimal('2'),
+        }])
+        self._vender('EFECTIVO', '1')
+        Caja.objects.update(total_vendido=0, total_efectivo=0, total_debito=0, ganancia_diaria=0)
+
+        # una consulta agrupada para los totales y otra para las cajas
+        with self.assertNumQueries(4):  # + SAVEPOINT / RELEASE
+            diferencias = recalcular_cajas(Caja.objects.all(), simular=True)
+        self.assertEqual([caja.pk for caja, _ in diferencias], [ayer.pk, self.caja.pk])
+        self.assertEqual(diferencias[0][1]['total_debito'], (Decimal('0'), Decimal('1600.00')))
+
+        call_command('recompute_caja', '--desde', str(self.caja.fecha), stdout=StringIO())
+        ayer.refresh_from_db()
+        self.caja.refresh_from_db()
+        self.assertEqual(ayer.total_vendido, Decimal('0'))
+        self.assertEqual((self.caja.total_vendido, self.caja.total_efectivo), (Decimal('800'), Decimal('800')))
+        self.assertEqual(self.caja.ganancia_diaria, Decimal('300'))
+
+
+class TerminalesTest(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.enterContext(override_settings(REPORTES_CAJA_DIR=directorio.name))
+
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.client.force_login(self.user)
+        self.presentacion = crear_presentacion(stock_base='100')
+
+    def _vender(self, terminal, cantidad, metodo_pago='EFECTIVO'):
+        return self.client.post(reverse('venta_create') + f'?terminal={terminal}', {
+            'metodo_pago': metodo_pago,
+            'form-TOTAL_FORMS': '1',
+            'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '1',
+            'form-MAX_NUM_FORMS': '1000',
+            'form-0-producto': str(self.presentacion.pk),
+            'form-0-unidad_venta': 'UNIDAD',
+            'form-0-cantidad_ingresada': cantidad,
+        })
+
+    def test_caja_abierta_prefiere_la_del_dia(self):
+        ayer = timezone.localdate() - datetime.timedelta(days=1)
+        Caja.objects.create(fecha=ayer, terminal=1, monto_inicial=0, hora_apertura=timezone.now())
+        self.client.post(reverse('abrir_caja') + '?terminal=1')
+        self.assertEqual(caja_abierta(1).fecha, timezone.localdate())
+
+    def test_cada_terminal_acumula_en_su_caja(self):
+        self.client.post(reverse('abrir_caja') + '?terminal=1')
+        self.client.post(reverse('abrir_caja') + '?terminal=2')
+        self.assertEqual(Caja.objects.filter(fecha=timezone.localdate(), abierta=True).count(), 2)
+
+        self._vender(1, '2')
+        self._vender(2, '1', 'DEBITO')
+        # sin ?terminal= sigue en la última elegida
+        self.assertEqual(self.client.get(reverse('venta_create')).context['caja_activa'].terminal, 2)
+        uno, dos = Caja.objects.order_by('terminal')
+        self.assertEqual((uno.total_vendido, uno.total_efectivo), (Decimal('1600'), Decimal('1600')))
+        self.assertEqual((dos.total_vendido, dos.total_debito), (Decimal('800'), Decimal('800')))
+
+        with self.assertNumQueries(1):
+            cajas, totales = resumen_dia(timezone.localdate())
+        self.assertEqual([c.terminal for c in cajas], [1, 2])
+        self.assertEqual(totales['total_vendido'], Decimal('2400'))
+        self.assertEqual(totales['ganancia_diaria'], Decimal('900'))
+        resp = self.client.get(reverse('caja_dia'))
+        self.assertEqual(resp.context['totales']['total_debito'], Decimal('800'))
+
+    def test_cerrar_caja_cierra_solo_su_terminal(self):
+        for terminal in (1, 2):
+            Caja.objects.create(
+                fecha=timezone.localdate(), terminal=terminal, monto_inicial=0, hora_apertura=timezone.now(),
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('cerrar_caja') + '?terminal=2')
+        self.assertEqual(list(Caja.objects.filter(abierta=True).values_list('terminal', flat=True)), [1])
+
+        # la terminal 2 ya no vende; la 1 sí
+        resp = self._vender(2, '1')
+        self.assertRedirects(resp, reverse('caja_list'))
+        self.assertRedirects(self._vender(1, '1'), reverse('venta_list'))
+
+
+    def test_cerrar_no_pisa_una_venta_concurrente(self):
+        caja = Caja.objects.create(fecha=timezone.localdate(), monto_inicial=0, hora_apertura=timezone.now())
+
+        def leer_y_vender(terminal):
+            leida = caja_abierta(terminal)
+            # una venta entra entre la lectura y el cierre
+            acumular_venta(leida, 'EFECTIVO', Decimal('800'), Decimal('300'))
+            return leida
+
+        with mock.patch('caja.views.caja_abierta', side_effect=leer_y_vender):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('cerrar_caja'))
+        caja.refresh_from_db()
+        self.assertFalse(caja.abierta)
+        self.assertEqual((caja.total_vendido, caja.total_efectivo), (Decimal('800'), Decimal('800')))
+        self.assertIn('total vendido $800', Actividad.objects.get(tipo_accion='CIERRE_CAJA').descripcion)
+
+        # reabrir tampoco pisa lo vendido entre la lectura y el guardado
+        def vender_y_guardar(leida, **kwargs):
+            acumular_venta(leida, 'DEBITO', Decimal('100'), Decimal('40'))
+            Model.save(leida, **kwargs)
+
+        with mock.patch.object(Caja, 'save', autospec=True, side_effect=vender_y_guardar):
+            self.client.post(reverse('abrir_caja'))
+        caja.refresh_from_db()
+        self.assertTrue(caja.abierta)
+        self.assertEqual((caja.total_vendido, caja.total_debito), (Decimal('900'), Decimal('100')))
+
+
+class ReporteCierreTest(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.enterContext(override_settings(REPORTES_CAJA_DIR=directorio.name))
+
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.client.force_login(self.user)
+        self.caja = Caja.objects.create(
+            fecha=datetime.date.today(),
+            monto_inicial=0,
+            hora_apertura=timezone.now(),
+        )
+        presentacion = crear_presentacion(stock_base='100')
+        registrar_venta(self.user, self.caja, 'EFECTIVO', [{
+            'presentacion_id': presentacion.id,
+            'unidad_venta': 'UNIDAD',
+            'cantidad_ingresada': Decimal('2'),
+        }])
+
+    def test_cierre_genera_pdf_en_segundo_plano(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('cerrar_caja'))
+        self.caja.refresh_from_db()
+        ruta, futuro = reportes.solicitar_reporte(self.caja)
+        if futuro is not None:
+            futuro.result(timeout=30)
+        self.assertTrue(ruta.read_bytes().startswith(b'%PDF'))
+
+        # La reimpresión sale del archivo ya generado.
+        with self.assertNumQueries(1):
+            self.assertEqual(reportes.solicitar_reporte(self.caja), (ruta, None))
+        resp = self.client.get(reverse('caja_reporte', args=[self.caja.pk]))
+        self.assertEqual(resp['Content-Type'], 'application/pdf')
+
+    def test_error_al_generar_no_deja_la_caja_sin_reporte(self):
+        url = reverse('caja_reporte', args=[self.caja.pk])
+        with mock.patch('caja.reportes.dibujar_pdf', side_effect=OSError('disco lleno')), \
+                self.assertLogs('caja.views', 'ERROR'):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 503)
+        self.assertContains(resp, 'No se pudo generar', status_code=503)
+
+        # el siguiente pedido lo vuelve a encolar
+        ruta, futuro = reportes.solicitar_reporte(self.caja)
+        self.assertIsNotNone(futuro)
+        futuro.result(timeout=30)
+        self.assertEqual(self.client.get(url)['Content-Type'], 'application/pdf')
+
+    def test_version_cambia_con_nuevas_ventas(self):
+        version = reportes.version_datos(self.caja)
+        Caja.objects.filter(pk=self.caja.pk).update(total_vendido=1)
+        self.caja.refresh_from_db()
+        self.assertNotEqual(reportes.version_datos(self.caja), version)
@@ -5,4 +5,6 @@ urlpatterns = [
     path('', views.caja_list, name='caja_list'),
     path('abrir/', views.abrir_caja, name='abrir_caja'),
     path('cerrar/', views.cerrar_caja, name='cerrar_caja'),
+    path('dia/', views.caja_dia, name='caja_dia'),
+    path('<int:pk>/reporte/', views.caja_reporte, name='caja_reporte'),
 ]
@@ -1,37 +1,82 @@
-from django.shortcuts import render, redirect
+import logging
+
+from django.http import FileResponse
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from auditoria import registro as auditoria
+from core.instrumentacion import presupuesto_consultas
+from core.paginacion import paginar
+from core.routers import solo_lectura
 from .models import Caja
+from .reportes import descartar, solicitar_reporte
+from .services import CAMPOS_TOTALES, caja_abierta, resumen_dia, terminal_de, terminales
+
+
+logger = logging.getLogger(__name__)
+
 
 @login_required
+@presupuesto_consultas(6)
 def caja_list(request):
-    cajas = Caja.objects.all().order_by('-fecha')
-    return render(request, 'caja/caja_list.html', {'cajas': cajas})
+    terminal = terminal_de(request)
+    pagina = paginar(Caja.objects.all(), ('-fecha', '-id'), request.GET.get('cursor'))
+    abiertas = set(Caja.objects.filter(abierta=True).values_list('terminal', flat=True))
+    return render(request, 'caja/caja_list.html', {
+        'cajas': pagina,
+        'pagina': pagina,
+        'terminal': terminal,
+        'terminales': [(numero, numero in abiertas) for numero in terminales()],
+        'cajas_abiertas': terminal in abiertas,
+    })
+
+
+@login_required
+@presupuesto_consultas(3)
+def caja_dia(request):
+    try:
+        fecha = parse_date(request.GET.get('fecha') or '') or timezone.localdate()
+    except ValueError:
+        fecha = timezone.localdate()
+    cajas, totales = resumen_dia(fecha)
+    return render(request, 'caja/caja_dia.html', {
+        'fecha': fecha,
+        'cajas': cajas,
+        'totales': totales,
+    })
+
 
 @login_required
 def abrir_caja(request):
-    # Verificar si ya existe caja para hoy
-    hoy = timezone.now().date()
-    caja_existente = Caja.objects.filter(fecha=hoy).first()
+    # Cada terminal tiene una sola caja por día
+    terminal = terminal_de(request)
+    hoy = timezone.localdate()
+    caja_existente = Caja.objects.filter(fecha=hoy, terminal=terminal).first()
     
     if caja_existente:
         if caja_existente.abierta:
-            messages.error(request, 'Ya hay una caja abierta para hoy.')
+            messages.error(request, f'La terminal {terminal} ya tiene una caja abierta para hoy.')
         else:
             # Reabrir la caja existente
             caja_existente.abierta = True
             caja_existente.hora_apertura = timezone.now()
-            caja_existente.save()
+            # solo los campos propios: los totales los suma acumular_venta con F()
+            caja_existente.save(update_fields=['abierta', 'hora_apertura'])
+            auditoria.registrar(request.user, 'APERTURA_CAJA', f'Reapertura de {caja_existente}')
             messages.success(request, 'Caja reabierta exitosamente.')
     else:
         # Crear nueva caja si no existe para hoy
         caja = Caja.objects.create(
             fecha=hoy,
+            terminal=terminal,
             monto_inicial=0,
             hora_apertura=timezone.now()
         )
+        auditoria.registrar(request.user, 'APERTURA_CAJA', f'Apertura de {caja}')
         messages.success(request, 'Caja abierta exitosamente.')
     
     # Redirigir al home si viene desde allí, sino a caja_list
@@ -40,15 +85,48 @@ def abrir_caja(request):
 
 @login_required
 def cerrar_caja(request):
-    try:
-        caja = Caja.objects.get(abierta=True)
+    # Cierra solo la caja de la terminal indicada (o la de la sesión)
+    terminal = terminal_de(request)
+    caja = caja_abierta(terminal)
+    if caja is not None:
         caja.abierta = False
         caja.hora_cierre = timezone.now()
-        caja.save()
+        # Sin pisar los totales: una venta que entró después de leer la caja
+        # ya los sumó en la base con F(). Se releen para el reporte.
+        caja.save(update_fields=['abierta', 'hora_cierre'])
+        caja.refresh_from_db(fields=CAMPOS_TOTALES)
+        # El PDF de cierre se genera en segundo plano para no demorar la respuesta.
+        transaction.on_commit(lambda: solicitar_reporte(caja))
+        auditoria.registrar(request.user, 'CIERRE_CAJA', f'Cierre de {caja}: total vendido ${caja.total_vendido}')
         messages.success(request, 'Caja cerrada exitosamente.')
-    except Caja.DoesNotExist:
-        messages.error(request, 'No hay una caja abierta para cerrar.')
+    else:
+        messages.error(request, f'La terminal {terminal} no tiene una caja abierta para cerrar.')
     
     # Redirigir al home si viene desde allí, sino a caja_list
     next_url = request.GET.get('next', 'caja_list')
     return redirect(next_url)
+
+
+@login_required
+@solo_lectura()
+def caja_reporte(request, pk):
+    caja = get_object_or_404(Caja, pk=pk)
+    ruta, futuro = solicitar_reporte(caja)
+    if futuro is not None:
+        # Se espera un poco por si el PDF está por terminar; si no, la
+        # página se recarga sola hasta que esté listo.
+        try:
+            futuro.result(timeout=2)
+        except TimeoutError:
+            return render(request, 'caja/caja_reporte_pendiente.html', {'caja': caja}, status=202)
+        except Exception:
+            # Sin el futuro fallido, el próximo pedido vuelve a generar el PDF.
+            logger.exception('No se pudo generar el reporte de cierre de la caja %s', caja.pk)
+            descartar(ruta, futuro)
+            return render(request, 'caja/caja_reporte_error.html', {'caja': caja}, status=503)
+    try:
+        archivo = open(ruta, 'rb')
+    except FileNotFoundError:
+        # lo borró otro proceso al generar una versión más nueva
+        return render(request, 'caja/caja_reporte_pendiente.html', {'caja': caja}, status=202)
+    return FileResponse(archivo, content_type='application/pdf', filename=f'cierre_{caja.fecha}_terminal_{caja.terminal}.pdf')
@@ -0,0 +1,245 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from caja.services import CLAVE_TERMINAL, terminales
+from core.instrumentacion import Medicion
+
+
+# =========================
+# BENCHMARK DEL CAMINO DE VENTA
+# =========================
+# Siembra un catálogo sintético y simula varias cajeras a la vez, cada una
+# en su hilo con su propio cliente de test, alternando ventas
+# (venta_create), búsquedas de productos y el panel principal. Por
+# escenario informa rendimiento, latencias p50/p95/p99 y consultas por
+# petición; el resultado se guarda en JSON para comparar entre commits.
+#
+# Corre sobre la base que esté configurada: el comando la crea aparte, como
+# el runner de tests (ver benchmark_ventas).
+
+MARCAS = ['Coca-Cola', 'Nestlé', 'Soprole', 'Colún', 'Carozzi', 'Lucchetti', 'Ideal', 'Costa', 'Ambrosoli', 'Watt\'s']
+TIPOS = ['Bebida', 'Jugo', 'Leche', 'Yogur', 'Galletas', 'Fideos', 'Pan', 'Chocolate', 'Café', 'Té', 'Azúcar', 'Arroz']
+VARIANTES = ['Light', 'Zero', 'Natural', 'Frutilla', 'Plátano', 'Vainilla', 'Integral', 'Clásico', 'Limón', 'Piña']
+CATEGORIAS = ['Bebidas', 'Lácteos', 'Despensa', 'Panadería', 'Dulces', 'Desayuno']
+
+# proporción de cada escenario en la mezcla de peticiones
+MEZCLA = {'venta': 6, 'busqueda': 3, 'dashboard': 1}
+
+
+def sembrar(productos=2000, por_producto=2, cajeras=4, semilla=1):
+    """
+    Crea el catálogo (con stock de sobra para no agotar nada), las
+    usuarias cajeras y una caja abierta por terminal. Devuelve ``(cajeras,
+    presentaciones)`` con ``presentaciones`` como lista de ``(id,
+    codigo_barra, nombre del producto)``.
+    """
+    from caja.models import Caja
+    from inventario.models import Categoria, Presentacion, Producto
+
+    azar = random.Random(semilla)
+    categorias = Categoria.objects.bulk_create([Categoria(nombre=nombre) for nombre in CATEGORIAS])
+    nuevos = Producto.objects.bulk_create([
+        Producto(
+            nombre=f'{azar.choice(TIPOS)} {azar.choice(MARCAS)} {azar.choice(VARIANTES)} {azar.randint(100, 3000)}',
+            categoria=azar.choice(categorias),
+            tipo_producto='UNITARIO',
+            unidad_base='UNIDAD',
+            stock_minimo=Decimal('5'),
+        )
+        for _ in range(productos)
+    ], batch_size=1000)
+    codigos = azar.sample(range(10 ** 12, 10 ** 13), productos * por_producto)
+    presentaciones = Presentacion.objects.bulk_create([
+        Presentacion(
+            producto=producto,
+            nombre=f'Formato {i + 1}',
+            codigo_barra=str(codigos.pop()),
+            unidad_venta='UNIDAD',
+            cantidad_base=Decimal('1'),
+            stock_base=Decimal('1000000'),
+            precio_compra=Decimal(azar.randint(300, 3000)),
+            precio_venta=Decimal(azar.randint(3100, 6000)),
+            margen_ganancia=Decimal('0'),
+        )
+        for producto in nuevos
+        for i in range(por_producto)
+    ], batch_size=1000)
+
+    usuarias = [User.objects.create_user(username=f'cajera{i + 1}', password='x') for i in range(cajeras)]
+    Caja.objects.bulk_create([
+        Caja(fecha=timezone.localdate(), terminal=terminal_de_cajera(i), monto_inicial=0, hora_apertura=timezone.now())
+        for i in range(min(cajeras, len(terminales())))
+    ])
+    return usuarias, [(p.pk, p.codigo_barra, p.producto.nombre) for p in presentaciones]
+
+
+def terminal_de_cajera(indice):
+    """Cada cajera vende en su terminal; si hay más cajeras que terminales, comparten."""
+    return indice % len(terminales()) + 1
+
+
+def _venta(cliente, azar, presentaciones):
+    lineas = azar.sample(presentaciones, azar.randint(1, 5))
+    datos = {
+        'metodo_pago': azar.choice(['EFECTIVO', 'DEBITO', 'TRANSFERENCIA']),
+        'form-TOTAL_FORMS': str(len(lineas)),
+        'form-INITIAL_FORMS': '0',
+        'form-MIN_NUM_FORMS': '1',
+        'form-MAX_NUM_FORMS': '1000',
+    }
+    for i, (pk, _, _) in enumerate(lineas):
+        datos[f'form-{i}-producto'] = str(pk)
+        datos[f'form-{i}-unidad_venta'] = 'UNIDAD'
+        datos[f'form-{i}-cantidad_ingresada'] = str(azar.randint(1, 3))
+    return cliente.post(reverse('venta_create'), datos)
+
+
+def _busqueda(cliente, azar, presentaciones):
+    _, codigo, nombre = azar.choice(presentaciones)
+    if azar.random() < 0.5:
+        # lector de código de barras en la pantalla de venta
+        return cliente.get(reverse('presentacion_buscar'), {'codigo': codigo})
+    palabra = azar.choice(nombre.split())
+    return cliente.get(reverse('producto_list'), {'nombre': palabra[:azar.randint(3, 6)]})
+
+
+def _dashboard(cliente, azar, presentaciones):
+    return cliente.get(reverse('home'))
+
+
+ESCENARIOS = {'venta': _venta, 'busqueda': _busqueda, 'dashboard': _dashboard}
+
+
+def _percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _resumir(muestras, duracion):
+    tiempos = sorted(m[0] for m in muestras)
+    consultas = [m[1] for m in muestras]
+    return {
+        'peticiones': len(muestras),
+        'errores': sum(1 for m in muestras if m[2]),
+        'por_segundo': len(muestras) / duracion if duracion else 0.0,
+        'p50_ms': statistics.median(tiempos) * 1000,
+        'p95_ms': _percentil(tiempos, 0.95) * 1000,
+        'p99_ms': _percentil(tiempos, 0.99) * 1000,
+        'max_ms': tiempos[-1] * 1000,
+        'consultas_promedio': sum(consultas) / len(consultas),
+        'consultas_max': max(consultas),
+    }
+
+
+def ejecutar(usuarias, presentaciones, peticiones=100, semilla=1, calentamiento=5):
+    """
+    Cada usuaria hace ``peticiones`` peticiones en su propio hilo, todas a
+    la vez. Antes, ``calentamiento`` peticiones de cada escenario sin medir
+    (el índice de búsqueda y las cachés se llenan en la primera).
+    """
+    escenarios = list(MEZCLA)
+    pesos = list(MEZCLA.values())
+    muestras = {nombre: [] for nombre in escenarios}
+    errores = []
+    lock = threading.Lock()
+    largada = threading.Barrier(len(usuarias) + 1)
+
+    def cajera(indice, cliente):
+        azar = random.Random(semilla * 1000 + indice)
+        propias = []
+        try:
+            largada.wait()
+            for _ in range(peticiones):
+                nombre = azar.choices(escenarios, pesos)[0]
+                medicion = Medicion()
+                inicio = time.perf_counter()
+                fallo = False
+                try:
+                    with connection.execute_wrapper(medicion):
+                        respuesta = ESCENARIOS[nombre](cliente, azar, presentaciones)
+                    # venta_create redirige al listado cuando la venta se registró
+                    fallo = respuesta.status_code >= 400 or (
+                        nombre == 'venta' and respuesta.status_code != 302
+                    )
+                except Exception as exc:
+                    fallo = True
+                    with lock:
+                        errores.append(f'{nombre}: {exc!r}')
+                propias.append((nombre, (time.perf_counter() - inicio, medicion.consultas, fallo)))
+        finally:
+            connection.close()
+        with lock:
+            for nombre, muestra in propias:
+                muestras[nombre].append(muestra)
+
+    clientes = []
+    for indice, usuaria in enumerate(usuarias):
+        cliente = Client()
+        cliente.force_login(usuaria)
+        sesion = cliente.session
+        sesion[CLAVE_TERMINAL] = terminal_de_cajera(indice)
+        sesion.save()
+        clientes.append(cliente)
+    azar = random.Random(semilla)
+    for nombre in escenarios:
+        for _ in range(calentamiento):
+            ESCENARIOS[nombre](clientes[0], azar, presentaciones)
+
+    hilos = [threading.Thread(target=cajera, args=(i, c)) for i, c in enumerate(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    largada.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    todas = [m for lista in muestras.values() for m in lista]
+    return {
+        'duracion_s': duracion,
+        'total': _resumir(todas, duracion),
+        'escenarios': {nombre: _resumir(lista, duracion) for nombre, lista in muestras.items() if lista},
+        'errores': errores[:20],
+    }
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def comparar(actual, anterior):
+    """``[(escenario, métrica, antes, ahora, variación %)]`` de dos resultados."""
+    filas = []
+    for escenario, metricas in actual['escenarios'].items():
+        previas = anterior.get('escenarios', {}).get(escenario)
+        if not previas:
+            continue
+        for metrica in ('por_segundo', 'p50_ms', 'p95_ms', 'p99_ms', 'consultas_promedio'):
+            antes, ahora = previas.get(metrica), metricas[metrica]
+            if antes:
+                filas.append((escenario, metrica, antes, ahora, (ahora - antes) * 100 / antes))
+    return filas
+
+
+def guardar(resultado, ruta):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(resultado, archivo, ensure_ascii=False, indent=2)
+    return ruta
@@ -0,0 +1,78 @@
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from caja.models import Caja
+from inventario import catalogo
+from inventario.models import Presentacion, Producto
+from ventas.models import Venta
+
+from . import fragmentos
+
+
+CLAVE_CACHE = 'dashboard:metricas'
+
+
+def _version():
+    """
+    Versión en la base de los datos del panel, la misma para todos los
+    procesos: ventas, ingresos y ajustes mueven stock y suben la versión del
+    catálogo; abrir o cerrar caja y editar o borrar productos suben la de
+    sus fragmentos.
+    """
+    return f"{catalogo.version_actual()}.{fragmentos.version('caja', 'producto')}"
+
+
+def _calcular():
+    hoy = timezone.localdate()
+    inicio = timezone.make_aware(datetime.datetime.combine(hoy, datetime.time.min))
+    fin = inicio + datetime.timedelta(days=1)
+
+    ventas = Venta.objects.filter(fecha__gte=inicio, fecha__lt=fin).aggregate(
+        ventas_hoy=Count('id'),
+        monto_ventas_hoy=Coalesce(Sum('total'), Value(Decimal('0')), output_field=DecimalField()),
+    )
+
+    # Stock total de cada producto (suma de sus presentaciones) contra su
+    # mínimo, en una sola consulta.
+    stock = (
+        Presentacion.objects
+        .filter(producto=OuterRef('pk'))
+        .values('producto')
+        .annotate(total=Sum('stock_base'))
+        .values('total')
+    )
+    productos_stock_bajo = (
+        Producto.objects
+        .filter(stock_minimo__gt=0)
+        .annotate(stock=Coalesce(Subquery(stock), Value(Decimal('0')), output_field=DecimalField()))
+        .filter(stock__lte=F('stock_minimo'))
+        .count()
+    )
+
+    terminales_abiertas = sorted(Caja.objects.filter(abierta=True).values_list('terminal', flat=True))
+    return {
+        **ventas,
+        'productos_stock_bajo': productos_stock_bajo,
+        'caja_abierta': bool(terminales_abiertas),
+        'terminales_abiertas': terminales_abiertas,
+        'fecha': hoy,
+    }
+
+
+def metricas_dashboard():
+    """
+    Métricas del panel principal, cacheadas mientras no cambie su versión
+    (una venta, un movimiento de stock o la apertura/cierre de caja).
+    """
+    version = _version()
+    metricas = cache.get(CLAVE_CACHE)
+    if metricas is None or metricas['version'] != version or metricas['fecha'] != timezone.localdate():
+        metricas = {**_calcular(), 'version': version}
+        cache.set(CLAVE_CACHE, metricas, getattr(settings, 'DASHBOARD_CACHE_TTL', 300))
+    return metricas
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .models import VersionFragmento
+
+
+# =========================
+# CACHE DE FRAGMENTOS DE PLANTILLA
+# =========================
+# La barra de navegación, las filas de cajas cerradas de caja_list y las
+# filas de producto_list se guardan con {% cache %} y una clave que lleva
+# la versión de los modelos de los que dependen (ver
+# core/templatetags/fragmentos.py). Cada versión es un contador en la base
+# (VersionFragmento) que las señales incrementan al guardar o borrar: los
+# fragmentos viejos dejan de pedirse y vencen solos, sin borrarlos uno por
+# uno.
+#
+# El contador sube dentro de la transacción del cambio, así que todos los
+# procesos ven la versión nueva en cuanto se confirma, aunque cada uno
+# tenga su propia cache local. FRAGMENTOS_CACHE_TTL solo acota cuánto
+# tiempo ocupan memoria los fragmentos que ya no se piden.
+
+
+def ttl():
+    return getattr(settings, 'FRAGMENTOS_CACHE_TTL', 600)
+
+
+def version(*nombres):
+    """Versión combinada de los modelos ``nombres``, para la clave del fragmento."""
+    valores = dict(VersionFragmento.objects.filter(nombre__in=nombres).values_list('nombre', 'valor'))
+    return '.'.join(str(valores.get(nombre, 0)) for nombre in nombres)
+
+
+def incrementar(*nombres):
+    """Invalida los fragmentos de los modelos ``nombres`` al confirmarse la transacción en curso."""
+    for nombre in nombres:
+        if not VersionFragmento.objects.filter(nombre=nombre).update(valor=F('valor') + 1):
+            VersionFragmento.objects.get_or_create(nombre=nombre)
+            VersionFragmento.objects.filter(nombre=nombre).update(valor=F('valor') + 1)
+
+
+# --- señales ---
+
+def _receptor(*nombres):
+    def receptor(sender, raw=False, **kwargs):
+        if not raw:
+            incrementar(*nombres)
+    return receptor
+
+
+def _usuario_guardado(sender, raw=False, update_fields=None, **kwargs):
+    # cada login guarda last_login: no cambia lo que muestra la navegación
+    if raw or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    incrementar('usuarios')
+
+
+def conectar():
+    """Conecta las señales que incrementan las versiones (ver ``CoreConfig.ready``)."""
+    from caja.models import Caja
+    from inventario.models import Categoria, Producto
+
+    for modelo, nombre in ((Caja, 'caja'), (Producto, 'producto'), (Categoria, 'categoria'), (Group, 'usuarios')):
+        receptor = _receptor(nombre)
+        post_save.connect(receptor, sender=modelo, weak=False, dispatch_uid=f'fragmentos_{nombre}_{modelo.__name__}')
+        post_delete.connect(receptor, sender=modelo, weak=False, dispatch_uid=f'fragmentos_{nombre}_{modelo.__name__}')
+
+    post_save.connect(_usuario_guardado, sender=User, dispatch_uid='fragmentos_usuarios_User')
+    post_delete.connect(_receptor('usuarios'), sender=User, weak=False, dispatch_uid='fragmentos_usuarios_User')
+    # grupos y permisos deciden qué ve cada usuario en la navegación
+    for relacion in (User.groups.through, User.user_permissions.through, Group.permissions.through):
+        m2m_changed.connect(
+            _receptor('usuarios'), sender=relacion, weak=False,
+            dispatch_uid=f'fragmentos_usuarios_{relacion.__name__}',
+        )
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class PresupuestoExcedido(AssertionError):
+    pass
+
+
+def presupuesto_consultas(maximo):
+    """
+    Declara la cantidad máxima de consultas SQL que puede hacer una vista.
+    La controla ``InstrumentacionMiddleware``; ver ``core.pruebas``.
+    """
+    def decorador(vista):
+        vista.presupuesto_consultas = maximo
+        return vista
+    return decorador
+
+
+class Medicion:
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_sql = 0.0
+        self._sentencias = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_sql += time.perf_counter() - inicio
+            self.consultas += 1
+            # Con los parámetros aparte, la misma sentencia repetida delata un N+1.
+            self._sentencias[sql] += 1
+
+    @property
+    def duplicadas(self):
+        return sum(veces - 1 for veces in self._sentencias.values() if veces > 1)
+
+    def mas_repetidas(self, cantidad=3):
+        return [(sql, veces) for sql, veces in self._sentencias.most_common(cantidad) if veces > 1]
+
+
+class ResumenVistas:
+    """Últimas mediciones de cada vista, en memoria del proceso."""
+
+    def __init__(self, muestras):
+        self.muestras = muestras
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, vista, tiempo, consultas, tiempo_sql, duplicadas):
+        with self._lock:
+            if vista not in self._datos:
+                self._datos[vista] = deque(maxlen=self.muestras)
+            self._datos[vista].append((tiempo, consultas, tiempo_sql, duplicadas))
+
+    def filas(self):
+        with self._lock:
+            datos = {vista: list(muestras) for vista, muestras in self._datos.items()}
+
+        filas = []
+        for vista, muestras in datos.items():
+            tiempos = sorted(m[0] for m in muestras)
+            n = len(muestras)
+            filas.append({
+                'vista': vista,
+                'peticiones': n,
+                'tiempo_promedio': sum(tiempos) / n * 1000,
+                'tiempo_p95': tiempos[min(n - 1, int(n * 0.95))] * 1000,
+                'consultas_promedio': sum(m[1] for m in muestras) / n,
+                'consultas_max': max(m[1] for m in muestras),
+                'sql_promedio': sum(m[2] for m in muestras) / n * 1000,
+                'duplicadas_max': max(m[3] for m in muestras),
+            })
+        return sorted(filas, key=lambda f: f['tiempo_promedio'], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+resumen = ResumenVistas(getattr(settings, 'INSTRUMENTACION_MUESTRAS', 200))
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide cada petición: consultas SQL, tiempo en SQL, consultas repetidas y
+    tiempo total. Los agrega como cabeceras ``X-Consultas*`` y
+    ``Server-Timing`` y los acumula en ``resumen``.
+
+    Se activa con ``INSTRUMENTACION_ACTIVA``. Si la vista declaró un
+    presupuesto con ``presupuesto_consultas`` y lo excede, se registra una
+    advertencia, o se lanza ``PresupuestoExcedido`` con
+    ``INSTRUMENTACION_PRESUPUESTO_ESTRICTO`` (lo usan los tests).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTACION_ACTIVA', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            # execute_wrapper no abre la conexión: se envuelven todos los alias.
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(medicion))
+            response = self.get_response(request)
+        tiempo = time.perf_counter() - inicio
+
+        response['X-Consultas'] = str(medicion.consultas)
+        response['X-Consultas-Duplicadas'] = str(medicion.duplicadas)
+        response['X-Tiempo-SQL-ms'] = f'{medicion.tiempo_sql * 1000:.1f}'
+        response['Server-Timing'] = (
+            f'sql;dur={medicion.tiempo_sql * 1000:.1f}, total;dur={tiempo * 1000:.1f}'
+        )
+
+        match = request.resolver_match
+        if match is None:
+            return response
+        resumen.registrar(match.view_name, tiempo, medicion.consultas, medicion.tiempo_sql, medicion.duplicadas)
+
+        maximo = getattr(match.func, 'presupuesto_consultas', None)
+        if maximo is not None and medicion.consultas > maximo:
+            mensaje = (
+                f'{match.view_name} hizo {medicion.consultas} consultas '
+                f'(presupuesto: {maximo}). Más repetidas: {medicion.mas_repetidas()}'
+            )
+            if getattr(settings, 'INSTRUMENTACION_PRESUPUESTO_ESTRICTO', False):
+                raise PresupuestoExcedido(mensaje)
+            logger.warning(mensaje)
+        return response
@@ -0,0 +1,91 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from auditoria.registro import escritor
+from core import benchmark
+from core.routers import alias_lectura
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula varias cajas vendiendo, buscando productos y mirando el panel a la vez, '
+        'sobre una base de prueba nueva, y guarda latencias y consultas en JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cajeras', type=int, default=4, help='Cajas simultáneas (un hilo cada una).')
+        parser.add_argument('--peticiones', type=int, default=200, help='Peticiones de cada caja.')
+        parser.add_argument('--productos', type=int, default=2000)
+        parser.add_argument('--por-producto', type=int, default=2, help='Presentaciones por producto.')
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto, en benchmarks/).')
+        parser.add_argument('--comparar', help='JSON de una corrida anterior contra el que comparar.')
+
+    def handle(self, *args, **options):
+        # Igual que el runner de tests: nunca se siembra la base real.
+        setup_test_environment()
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Las vistas de solo lectura (core.routers) leen de la misma base de
+        # prueba, no de la real.
+        lectura = alias_lectura()
+        espejo = connections[lectura] if lectura != DEFAULT_DB_ALIAS else None
+        if espejo is not None:
+            nombre_lectura = espejo.settings_dict['NAME']
+            espejo.close()
+            espejo.creation.set_as_test_mirror(connection.settings_dict)
+        try:
+            usuarias, presentaciones = benchmark.sembrar(
+                options['productos'], options['por_producto'], options['cajeras'], options['semilla'],
+            )
+            resultado = benchmark.ejecutar(usuarias, presentaciones, options['peticiones'], options['semilla'])
+            escritor.vaciar()
+        finally:
+            if espejo is not None:
+                espejo.close()
+                espejo.settings_dict['NAME'] = nombre_lectura
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        commit = benchmark.commit_actual()
+        resultado.update({
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'motor': connection.vendor,
+            'parametros': {
+                clave: options[clave]
+                for clave in ('cajeras', 'peticiones', 'productos', 'por_producto', 'semilla')
+            },
+        })
+        ruta = Path(options['salida']) if options['salida'] else (
+            settings.BASE_DIR / 'benchmarks' / f"ventas-{timezone.localtime():%Y%m%d-%H%M%S}-{commit or 'sin-commit'}.json"
+        )
+        benchmark.guardar(resultado, ruta)
+
+        self.stdout.write(
+            f"{'Escenario':<10} {'Pet.':>6} {'Err.':>5} {'Pet/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'Consultas':>10}"
+        )
+        for nombre, m in [*resultado['escenarios'].items(), ('total', resultado['total'])]:
+            self.stdout.write(
+                f"{nombre:<10} {m['peticiones']:>6} {m['errores']:>5} {m['por_segundo']:>8.1f} "
+                f"{m['p50_ms']:>8.1f} {m['p95_ms']:>8.1f} {m['p99_ms']:>8.1f} "
+                f"{m['consultas_promedio']:>5.1f}/{m['consultas_max']:<4}"
+            )
+        for error in resultado['errores']:
+            self.stdout.write(self.style.WARNING(error))
+
+        if options['comparar']:
+            import json
+            with open(options['comparar'], encoding='utf-8') as archivo:
+                anterior = json.load(archivo)
+            self.stdout.write(f"\nContra {anterior.get('commit') or options['comparar']}:")
+            for escenario, metrica, antes, ahora, variacion in benchmark.comparar(resultado, anterior):
+                self.stdout.write(f'  {escenario:<10} {metrica:<20} {antes:>10.2f} -> {ahora:>10.2f} ({variacion:+.1f}%)')
+
+        self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {ruta}'))
@@ -0,0 +1,10 @@
+from django.db import models
+
+
+class VersionFragmento(models.Model):
+    """Contador de cambios de un modelo, para las claves de los fragmentos cacheados."""
+    nombre = models.CharField(max_length=30, primary_key=True)
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre} v{self.valor}"
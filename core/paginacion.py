@@ -0,0 +1,173 @@
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+
+TAMANO_PAGINA = 50
+
+
+# =========================
+# PAGINACIÓN POR CURSOR
+# =========================
+# En lugar de OFFSET, cada página filtra a partir de los valores de orden de
+# la última fila vista (p. ej. ``fecha < x OR (fecha = x AND id < y)``), así
+# que con un índice sobre esas columnas cuesta lo mismo la primera página que
+# la de hace tres años. El último campo del orden debe ser único (el id).
+
+class PaginaKeyset:
+    def __init__(self, objetos, siguiente=None, anterior=None):
+        self.objetos = objetos
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def tiene_otras_paginas(self):
+        return bool(self.siguiente or self.anterior)
+
+
+def _a_json(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def codificar_cursor(direccion, valores):
+    datos = json.dumps([direccion, [_a_json(v) for v in valores]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, campos):
+    """Devuelve ``(direccion, valores)`` o ``None`` si el cursor no es válido."""
+    try:
+        datos = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direccion, valores = json.loads(datos)
+        if direccion not in ('sig', 'ant') or len(valores) != len(campos):
+            return None
+        return direccion, [campo.to_python(v) for campo, v in zip(campos, valores)]
+    except (binascii.Error, ValueError, TypeError, ValidationError):
+        return None
+
+
+def _despues_de(orden, valores, invertir=False):
+    """Condición para las filas que van después de ``valores`` según ``orden``."""
+    condicion = Q()
+    for i, campo in enumerate(orden):
+        nombre = campo.lstrip('-')
+        descendente = campo.startswith('-') != invertir
+        previos = {c.lstrip('-'): v for c, v in zip(orden[:i], valores[:i])}
+        condicion |= Q(**previos, **{f"{nombre}__{'lt' if descendente else 'gt'}": valores[i]})
+    return condicion
+
+
+def paginar(queryset, orden, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Página de ``queryset`` ordenada por ``orden`` (p. ej. ``('-fecha', '-id')``)
+    a partir de ``cursor``, que es el valor de ``pagina.siguiente`` o
+    ``pagina.anterior`` de una página previa. Sin cursor, o con uno inválido,
+    devuelve la primera página.
+    """
+    opts = queryset.model._meta
+    campos = [opts.pk if c.lstrip('-') in ('pk', 'id') else opts.get_field(c.lstrip('-')) for c in orden]
+
+    decodificado = decodificar_cursor(cursor, campos) if cursor else None
+    direccion, valores = decodificado or ('sig', None)
+    hacia_atras = direccion == 'ant'
+
+    if hacia_atras:
+        orden_consulta = [c[1:] if c.startswith('-') else f'-{c}' for c in orden]
+    else:
+        orden_consulta = list(orden)
+    if valores is not None:
+        queryset = queryset.filter(_despues_de(orden, valores, invertir=hacia_atras))
+
+    filas = list(queryset.order_by(*orden_consulta)[:tamano + 1])
+    return armar_pagina(
+        filas, tamano, hacia_atras, valores is not None,
+        lambda objeto: [getattr(objeto, campo.attname) for campo in campos],
+    )
+
+
+def armar_pagina(filas, tamano, hacia_atras, con_cursor, valores_de):
+    """
+    Arma la ``PaginaKeyset`` a partir de hasta ``tamano + 1`` filas ya
+    ordenadas en el sentido de la consulta. ``valores_de(fila)`` devuelve los
+    valores de orden con que se codifican los cursores.
+    """
+    hay_mas = len(filas) > tamano
+    objetos = filas[:tamano]
+    if hacia_atras:
+        objetos.reverse()
+    if not objetos:
+        return PaginaKeyset(objetos)
+
+    def cursor_de(direccion, objeto):
+        return codificar_cursor(direccion, valores_de(objeto))
+
+    # Hacia adelante, la página anterior existe si se llegó con un cursor;
+    # hacia atrás, la siguiente siempre existe (es de donde se vino).
+    siguiente = cursor_de('sig', objetos[-1]) if (hay_mas or hacia_atras) else None
+    anterior = cursor_de('ant', objetos[0]) if (hay_mas if hacia_atras else con_cursor) else None
+    return PaginaKeyset(objetos, siguiente=siguiente, anterior=anterior)
+
+
+# =========================
+# CONTEO APROXIMADO
+# =========================
+
+def _conteo_estadisticas(tabla):
+    """Filas estimadas según las estadísticas del motor, o ``None`` si no hay."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [tabla])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [tabla],
+            )
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 existe recién después del primer ANALYZE.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [tabla])
+            fila = cursor.fetchone()
+            return int(fila[0].split()[0]) if fila else None
+        else:
+            return None
+        fila = cursor.fetchone()
+    # reltuples vale -1 en tablas que nunca se analizaron.
+    return int(fila[0]) if fila and fila[0] is not None and fila[0] >= 0 else None
+
+
+def conteo_aproximado(model):
+    """
+    Cantidad aproximada de filas de la tabla de ``model``, sin ``COUNT(*)``
+    cuando el motor tiene estadísticas. Si no las tiene se cuenta una vez y
+    el resultado se cachea ``CONTEO_APROXIMADO_TTL`` segundos.
+    """
+    tabla = model._meta.db_table
+    clave = f'conteo_aproximado:{tabla}'
+    conteo = cache.get(clave)
+    if conteo is None:
+        conteo = _conteo_estadisticas(tabla)
+        if conteo is None:
+            conteo = model._default_manager.count()
+        cache.set(clave, conteo, getattr(settings, 'CONTEO_APROXIMADO_TTL', 300))
+    return conteo
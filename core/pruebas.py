@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class Runner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Un hilo escribiendo por su cuenta no ve los datos de la
+        # transacción del test: la auditoría se escribe en el momento.
+        settings.AUDITORIA_SINCRONA = True
+        # Lo mismo con la conexión de solo lectura: todo va a la del test.
+        settings.BASE_LECTURA = None
+
+
+class PresupuestoConsultasMixin:
+    """
+    Para los tests de vistas: activa ``InstrumentacionMiddleware`` en modo
+    estricto, de modo que una vista que hace más consultas que las
+    declaradas con ``presupuesto_consultas`` hace fallar el test.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(override_settings(
+            INSTRUMENTACION_ACTIVA=True,
+            INSTRUMENTACION_PRESUPUESTO_ESTRICTO=True,
+        ))
+
+    def assertConsultas(self, response, maximo):
+        """Comprueba un límite puntual, más estricto que el de la vista."""
+        consultas = int(response['X-Consultas'])
+        self.assertLessEqual(
+            consultas, maximo,
+            f'{consultas} consultas (máximo {maximo}, duplicadas: {response["X-Consultas-Duplicadas"]})',
+        )
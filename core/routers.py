@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+# =========================
+# CONEXIÓN DE SOLO LECTURA
+# =========================
+# Los reportes, las exportaciones y el listado de auditoría leen mucho y no
+# escriben nada. Marcados con ``solo_lectura``, sus consultas van al alias
+# BASE_LECTURA: el mismo archivo SQLite abierto con ``query_only`` y sin
+# ``BEGIN IMMEDIATE``, así una lectura larga nunca toma el lock de escritura
+# (con WAL los lectores tampoco bloquean a quien escribe). Las escrituras
+# siguen yendo a ``default`` aunque ocurran dentro de una vista marcada.
+
+_solo_lectura = ContextVar('solo_lectura', default=False)
+
+
+def alias_lectura():
+    """Alias para las lecturas pesadas; ``default`` si no hay uno configurado."""
+    alias = getattr(settings, 'BASE_LECTURA', 'lectura')
+    return alias if alias in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def solo_lectura():
+    """Envía las lecturas del bloque (o de la vista, como decorador) a ``alias_lectura()``."""
+    token = _solo_lectura.set(True)
+    try:
+        yield
+    finally:
+        _solo_lectura.reset(token)
+
+
+class RouterLectura:
+    def db_for_read(self, model, **hints):
+        if _solo_lectura.get():
+            return alias_lectura()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # los dos alias son la misma base
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db != DEFAULT_DB_ALIAS and db == getattr(settings, 'BASE_LECTURA', 'lectura'):
+            return False
+        return None
@@ -52,8 +52,49 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.instrumentacion.InstrumentacionMiddleware',
 ]
 
+# Consultas, tiempo SQL y tiempo total por vista (cabeceras X-Consultas y
+# Server-Timing, resumen en /instrumentacion/). Desactivado por defecto.
+INSTRUMENTACION_ACTIVA = False
+
+# Auditoría: los eventos se escriben en lotes desde un hilo (ver
+# auditoria/registro.py). Los tests usan escritura síncrona.
+AUDITORIA_TAMANO_LOTE = 200
+AUDITORIA_INTERVALO = 2
+AUDITORIA_SINCRONA = False
+# Un lote que no se pudo escribir se reintenta con espera creciente; tras
+# AUDITORIA_REINTENTOS fallos se escribe evento por evento y lo que aun así
+# falle se guarda en AUDITORIA_ARCHIVO_DIR/pendientes-<pid>.jsonl.
+AUDITORIA_REINTENTOS = 5
+# Eventos con más de AUDITORIA_RETENCION_DIAS días pasan a archivos
+# comprimidos por día con `manage.py archivar_auditoria`.
+AUDITORIA_RETENCION_DIAS = 90
+AUDITORIA_ARCHIVO_DIR = BASE_DIR / 'archivo' / 'auditoria'
+
+# Ventas en lote de terminales sin conexión (ventas/lote/): máximo por
+# petición y ventas por transacción.
+VENTAS_LOTE_MAXIMO = 500
+VENTAS_LOTE_TANDA = 50
+
+# Sugerencias de reposición (inventario/reposicion.py): historia y ventana
+# de consumo, plazo de reposición y cobertura buscada, en días.
+REPOSICION_DIAS_HISTORIA = 365
+REPOSICION_VENTANA = 28
+REPOSICION_PLAZO = 7
+REPOSICION_COBERTURA = 14
+
+# Terminales (puntos de venta) del local: cada una abre y cierra su propia
+# caja del día, numeradas de 1 a CAJA_TERMINALES.
+CAJA_TERMINALES = 4
+
+# Fragmentos de plantilla cacheados por versión de modelo (ver
+# core/fragmentos.py): vencimiento en segundos.
+FRAGMENTOS_CACHE_TTL = 600
+
+TEST_RUNNER = 'core.pruebas.Runner'
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -77,13 +118,62 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Pragmas de cada conexión SQLite nueva: WAL para que leer no bloquee a
+# quien escribe, synchronous=NORMAL (con WAL no corrompe ante un corte, a lo
+# sumo pierde la última transacción) y más caché de páginas y mmap. El
+# busy_timeout lo fija la opción ``timeout``.
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA cache_size=-32000;'
+    'PRAGMA mmap_size=268435456;'
+    'PRAGMA temp_store=MEMORY'
+)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # La conexión se reutiliza entre peticiones del mismo hilo.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Espera a que se libere el lock en lugar de fallar de inmediato
+            # cuando varias cajas venden a la vez.
+            'timeout': 20,
+            # Las transacciones toman el lock de escritura al empezar: una
+            # transacción que leyó y después quiere escribir falla sin
+            # esperar el timeout si otra escribió entremedio.
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': SQLITE_PRAGMAS,
+        },
+        # Base de test en archivo: la de memoria compartida no admite
+        # escrituras concurrentes desde varios hilos.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # Misma base, solo lectura: ver core.routers.
+    'lectura': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'init_command': SQLITE_PRAGMAS + ';PRAGMA query_only=ON',
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['core.routers.RouterLectura']
+
+# Alias al que van las vistas marcadas con core.routers.solo_lectura.
+BASE_LECTURA = 'lectura'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
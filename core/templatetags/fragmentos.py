@@ -0,0 +1,21 @@
+from django import template
+
+from core import fragmentos
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def version_fragmentos(*nombres):
+    """
+    ``{% version_fragmentos 'producto' 'categoria' as version %}`` y después
+    ``{% cache ttl nombre objeto.pk version %}``: el fragmento se renueva
+    cuando cambia cualquiera de esos modelos (ver core/fragmentos.py).
+    """
+    return fragmentos.version(*nombres)
+
+
+@register.simple_tag
+def ttl_fragmentos():
+    return fragmentos.ttl()
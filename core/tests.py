@@ -0,0 +1,392 @@
+import datetime
+import io
+import json
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import ResolverMatch, reverse
+from django.utils import timezone
+
+from auditoria.models import Actividad
+from caja.models import Caja
+from inventario.models import MovimientoStock, Presentacion, Producto
+from inventario.services import aplicar_movimientos
+from inventario.tests import crear_presentacion
+from ventas.services import registrar_venta
+from . import benchmark
+from .dashboard import metricas_dashboard
+from .instrumentacion import InstrumentacionMiddleware, Medicion, PresupuestoExcedido, presupuesto_consultas, resumen
+from .paginacion import conteo_aproximado, paginar
+from .pruebas import PresupuestoConsultasMixin
+from .routers import alias_lectura, solo_lectura
+
+
+class MetricasDashboardTest(PresupuestoConsultasMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.caja = Caja.objects.create(
+            fecha=datetime.date.today(),
+            monto_inicial=0,
+            hora_apertura=timezone.now(),
+        )
+        # stock_minimo 1
+        self.presentacion = crear_presentacion(stock_base='3')
+
+    def _vender(self, cantidad):
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_venta(self.user, self.caja, 'EFECTIVO', [{
+                'presentacion_id': self.presentacion.id,
+                'unidad_venta': 'UNIDAD',
+                'cantidad_ingresada': Decimal(cantidad),
+            }])
+
+    def test_stock_bajo_suma_presentaciones(self):
+        crear_presentacion(codigo_barra='0002', stock_base='0', producto=self.presentacion.producto)
+        Producto.objects.filter(pk=self.presentacion.producto_id).update(stock_minimo=Decimal('3'))
+        # 3 + 0 <= 3
+        self.assertEqual(metricas_dashboard()['productos_stock_bajo'], 1)
+
+        cache.clear()
+        Producto.objects.filter(pk=self.presentacion.producto_id).update(stock_minimo=Decimal('2'))
+        self.assertEqual(metricas_dashboard()['productos_stock_bajo'], 0)
+
+    def test_cachea_hasta_la_siguiente_venta(self):
+        metricas = metricas_dashboard()
+        self.assertEqual(metricas['ventas_hoy'], 0)
+        self.assertTrue(metricas['caja_abierta'])
+
+        # solo las versiones
+        with self.assertNumQueries(2):
+            metricas_dashboard()
+
+        self._vender('2')
+        metricas = metricas_dashboard()
+        self.assertEqual(metricas['ventas_hoy'], 1)
+        self.assertEqual(metricas['monto_ventas_hoy'], Decimal('1600'))
+        self.assertEqual(metricas['productos_stock_bajo'], 1)
+
+    def test_venta_en_otro_proceso_invalida(self):
+        self.assertEqual(metricas_dashboard()['ventas_hoy'], 0)
+        # otro proceso, con su propia cache local, registra la venta
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'otro-proceso',
+        }}):
+            self._vender('1')
+        self.assertEqual(metricas_dashboard()['ventas_hoy'], 1)
+
+    def test_ingreso_de_stock_invalida(self):
+        Producto.objects.filter(pk=self.presentacion.producto_id).update(stock_minimo=Decimal('5'))
+        self.assertEqual(metricas_dashboard()['productos_stock_bajo'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            aplicar_movimientos([MovimientoStock(
+                presentacion=self.presentacion,
+                tipo='INGRESO',
+                cantidad=Decimal('10'),
+            )])
+        self.assertEqual(metricas_dashboard()['productos_stock_bajo'], 0)
+
+    def test_cerrar_caja_invalida(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.enterContext(override_settings(REPORTES_CAJA_DIR=directorio.name))
+        self.client.force_login(self.user)
+        self.assertTrue(metricas_dashboard()['caja_abierta'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('cerrar_caja'))
+        self.assertFalse(metricas_dashboard()['caja_abierta'])
+
+    def test_home_muestra_metricas(self):
+        self._vender('1')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['ventas_hoy'], 1)
+        self.assertEqual(response.context['monto_ventas_hoy'], Decimal('800'))
+
+
+class FragmentosCacheadosTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.client.force_login(self.user)
+
+    def _consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        return respuesta.content.decode(), len(consultas)
+
+    def test_filas_de_producto_se_renuevan_por_version(self):
+        lata = crear_presentacion('0001')
+        for i in range(3):
+            crear_presentacion(f'100{i}', producto=Producto.objects.create(
+                nombre=f'Galletas {i}', categoria=lata.producto.categoria, tipo_producto='UNITARIO',
+                unidad_base='UNIDAD', stock_minimo=1,
+            ))
+        url = reverse('producto_list')
+        primera, consultas = self._consultas(url)
+        # la repetición no resuelve la categoría de cada fila
+        segunda, repetidas = self._consultas(url)
+        self.assertEqual(segunda, primera)
+        self.assertEqual(repetidas, consultas - 4)
+
+        categoria = lata.producto.categoria
+        categoria.nombre = 'Refrescos'
+        categoria.save()
+        # las cuatro filas y la opción del filtro
+        self.assertEqual(self._consultas(url)[0].count('Refrescos'), 5)
+
+    def test_filas_de_cajas_cerradas(self):
+        ayer = Caja.objects.create(
+            fecha=timezone.localdate() - datetime.timedelta(days=1), monto_inicial=0,
+            hora_apertura=timezone.now(), abierta=False, total_vendido=4321,
+        )
+        hoy = Caja.objects.create(fecha=timezone.localdate(), monto_inicial=0, hora_apertura=timezone.now())
+        url = reverse('caja_list')
+        self.assertContains(self.client.get(url), '$4321')
+
+        # update() no emite señales: la fila abierta se ve al día, la cerrada
+        # sigue cacheada hasta que recompute_caja la corrige
+        Caja.objects.filter(pk=hoy.pk).update(total_vendido=1234)
+        Caja.objects.filter(pk=ayer.pk).update(total_vendido=999)
+        html = self.client.get(url).content.decode()
+        self.assertIn('$1234', html)
+        self.assertIn('$4321', html)
+
+        call_command('recompute_caja', stdout=io.StringIO())
+        html = self.client.get(url).content.decode()
+        self.assertNotIn('$4321', html)
+        self.assertNotIn('$999', html)
+
+    def test_navegacion_por_usuario(self):
+        self.assertContains(self.client.get(reverse('producto_list')), 'cajero')
+        otra = User.objects.create_user(username='bodega', password='x')
+        self.client.force_login(otra)
+        respuesta = self.client.get(reverse('producto_list'))
+        self.assertContains(respuesta, 'bodega')
+        self.assertNotContains(respuesta, 'cajero')
+
+
+    def test_cambio_en_otro_proceso(self):
+        url = reverse('producto_list')
+        self.assertContains(self.client.get(url), 'cajero')
+        # otro proceso, con su propia cache local, renombra al usuario
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'otro-proceso',
+        }}):
+            self.user.username = 'cajera'
+            self.user.save()
+        respuesta = self.client.get(url)
+        self.assertContains(respuesta, 'cajera')
+        self.assertNotContains(respuesta, 'cajero')
+
+
+class PaginacionKeysetTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='auditor', password='x')
+        Actividad.objects.bulk_create([
+            Actividad(usuario=user, tipo_accion='VENTA', descripcion=f'Venta {i}')
+            for i in range(23)
+        ])
+        # varias actividades con la misma fecha_hora: el id desempata
+        base = timezone.now()
+        for i, actividad in enumerate(Actividad.objects.order_by('id')):
+            Actividad.objects.filter(pk=actividad.pk).update(
+                fecha_hora=base - datetime.timedelta(minutes=i // 4)
+            )
+        self.orden = list(
+            Actividad.objects.order_by('-fecha_hora', '-id').values_list('id', flat=True)
+        )
+
+    def _recorrer(self, cursor=None):
+        ids = []
+        while True:
+            pagina = paginar(Actividad.objects.all(), ('-fecha_hora', '-id'), cursor, tamano=5)
+            ids.extend(a.id for a in pagina)
+            if not pagina.siguiente:
+                return ids, pagina
+            cursor = pagina.siguiente
+
+    def test_recorre_todas_las_filas_en_orden(self):
+        ids, ultima = self._recorrer()
+        self.assertEqual(ids, self.orden)
+        self.assertEqual(len(ultima), 3)
+
+    def test_pagina_anterior(self):
+        primera = paginar(Actividad.objects.all(), ('-fecha_hora', '-id'), tamano=5)
+        self.assertIsNone(primera.anterior)
+        segunda = paginar(Actividad.objects.all(), ('-fecha_hora', '-id'), primera.siguiente, tamano=5)
+        tercera = paginar(Actividad.objects.all(), ('-fecha_hora', '-id'), segunda.siguiente, tamano=5)
+
+        volver = paginar(Actividad.objects.all(), ('-fecha_hora', '-id'), tercera.anterior, tamano=5)
+        self.assertEqual([a.id for a in volver], [a.id for a in segunda])
+        volver = paginar(Actividad.objects.all(), ('-fecha_hora', '-id'), volver.anterior, tamano=5)
+        self.assertEqual([a.id for a in volver], self.orden[:5])
+        self.assertIsNone(volver.anterior)
+        self.assertIsNotNone(volver.siguiente)
+
+    def test_una_consulta_por_pagina_sin_offset(self):
+        primera = paginar(Actividad.objects.all(), ('-fecha_hora', '-id'), tamano=5)
+        with self.assertNumQueries(1) as consultas:
+            paginar(Actividad.objects.all(), ('-fecha_hora', '-id'), primera.siguiente, tamano=5)
+        self.assertNotIn('OFFSET', consultas.captured_queries[0]['sql'])
+
+    def test_cursor_invalido_devuelve_primera_pagina(self):
+        pagina = paginar(Actividad.objects.all(), ('-fecha_hora', '-id'), 'no-es-un-cursor', tamano=5)
+        self.assertEqual([a.id for a in pagina], self.orden[:5])
+
+    def test_conteo_aproximado(self):
+        cache.clear()
+        self.assertEqual(conteo_aproximado(Actividad), 23)
+        with self.assertNumQueries(0):
+            conteo_aproximado(Actividad)
+
+
+@presupuesto_consultas(1)
+def _vista_n_mas_uno(request):
+    for actividad in Actividad.objects.all():
+        actividad.usuario.username
+    return HttpResponse()
+
+
+@override_settings(INSTRUMENTACION_ACTIVA=True)
+class InstrumentacionTest(TestCase):
+    def setUp(self):
+        resumen.clear()
+        self.user = User.objects.create_user(username='admin', password='x', is_staff=True)
+        Actividad.objects.bulk_create([
+            Actividad(usuario=self.user, tipo_accion='VENTA', descripcion='Venta')
+            for _ in range(3)
+        ])
+
+    def _llamar(self):
+        request = RequestFactory().get('/prueba/')
+        request.resolver_match = ResolverMatch(_vista_n_mas_uno, (), {}, url_name='prueba')
+        return InstrumentacionMiddleware(_vista_n_mas_uno)(request)
+
+    def test_cabeceras_y_consultas_duplicadas(self):
+        with self.assertLogs('core.instrumentacion', 'WARNING'):
+            response = self._llamar()
+        # 1 listado + 3 usuarios, la misma consulta repetida 3 veces
+        self.assertEqual(response['X-Consultas'], '4')
+        self.assertEqual(response['X-Consultas-Duplicadas'], '2')
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertEqual(resumen.filas()[0]['vista'], 'prueba')
+
+    @override_settings(INSTRUMENTACION_PRESUPUESTO_ESTRICTO=True)
+    def test_presupuesto_estricto(self):
+        with self.assertRaisesMessage(PresupuestoExcedido, 'prueba hizo 4 consultas (presupuesto: 1)'):
+            self._llamar()
+
+    def test_resumen(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('instrumentacion_resumen'))
+        self.assertContains(response, 'home')
+        self.assertIn('X-Consultas', response)
+
+
+class BenchmarkVentasTest(TransactionTestCase):
+    # Los hilos del benchmark usan sus propias conexiones: los datos
+    # sembrados tienen que estar confirmados.
+
+    def test_corrida_chica(self):
+        usuarias, presentaciones = benchmark.sembrar(productos=20, cajeras=2)
+        resultado = benchmark.ejecutar(usuarias, presentaciones, peticiones=15, calentamiento=1)
+
+        # dos cajas vendiendo a la vez no chocan con "database is locked"
+        self.assertEqual(resultado['errores'], [])
+        self.assertEqual(resultado['total']['peticiones'], 30)
+        self.assertEqual(resultado['total']['errores'], 0)
+        for metricas in resultado['escenarios'].values():
+            self.assertLessEqual(metricas['p50_ms'], metricas['p95_ms'])
+            self.assertLessEqual(metricas['p95_ms'], metricas['p99_ms'])
+            self.assertGreater(metricas['consultas_promedio'], 0)
+        self.assertTrue(Presentacion.objects.filter(stock_base__lt=Decimal('1000000')).exists())
+
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = benchmark.guardar(resultado, Path(directorio) / 'corrida.json')
+            with open(ruta, encoding='utf-8') as archivo:
+                anterior = json.load(archivo)
+        filas = benchmark.comparar(resultado, anterior)
+        self.assertTrue(filas)
+        self.assertTrue(all(variacion == 0 for *_, variacion in filas))
+
+    @override_settings(BASE_LECTURA='lectura')
+    def test_comando_lee_de_la_base_de_prueba(self):
+        nombres = {}
+        metricas = dict.fromkeys(
+            ('peticiones', 'errores', 'por_segundo', 'p50_ms', 'p95_ms', 'p99_ms', 'consultas_promedio', 'consultas_max'), 0,
+        )
+
+        def crear(**kwargs):
+            connection.settings_dict['NAME'] = 'benchmark_prueba.sqlite3'
+
+        def destruir(nombre_original, **kwargs):
+            connection.settings_dict['NAME'] = nombre_original
+
+        def ejecutar(*args, **kwargs):
+            nombres.update((alias, connections[alias].settings_dict['NAME']) for alias in ('default', 'lectura'))
+            return {'escenarios': {}, 'total': metricas, 'errores': []}
+
+        original = connections['lectura'].settings_dict['NAME']
+        comando = 'core.management.commands.benchmark_ventas'
+        with tempfile.TemporaryDirectory() as directorio, \
+                mock.patch(f'{comando}.setup_test_environment'), mock.patch(f'{comando}.teardown_test_environment'), \
+                mock.patch.object(connection.creation, 'create_test_db', side_effect=crear), \
+                mock.patch.object(connection.creation, 'destroy_test_db', side_effect=destruir), \
+                mock.patch.object(benchmark, 'sembrar', return_value=([], [])), \
+                mock.patch.object(benchmark, 'ejecutar', side_effect=ejecutar):
+            call_command('benchmark_ventas', salida=str(Path(directorio) / 'r.json'), stdout=io.StringIO())
+        self.assertEqual(nombres, {'default': 'benchmark_prueba.sqlite3', 'lectura': 'benchmark_prueba.sqlite3'})
+        self.assertEqual(connections['lectura'].settings_dict['NAME'], original)
+
+
+@override_settings(BASE_LECTURA='lectura')
+class ConexionLecturaTest(TransactionTestCase):
+    databases = {'default', 'lectura'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auditor', password='x')
+        Actividad.objects.create(usuario=self.user, tipo_accion='VENTA', descripcion='Venta 1')
+
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_vistas_de_reporte_leen_de_la_conexion_de_lectura(self):
+        self.client.force_login(self.user)
+        lectura = Medicion()
+        with connections['lectura'].execute_wrapper(lectura):
+            response = self.client.get(reverse('auditoria_list'))
+        self.assertContains(response, 'Venta 1')
+        self.assertGreater(lectura.consultas, 0)
+
+        with solo_lectura():
+            self.assertEqual(Actividad.objects.all().db, 'lectura')
+            # las escrituras siguen yendo a default
+            Actividad.objects.create(usuario=self.user, tipo_accion='VENTA', descripcion='Venta 2')
+        self.assertEqual(Actividad.objects.all().db, 'default')
+
+    def test_la_conexion_de_lectura_no_escribe(self):
+        with self.assertRaises(OperationalError):
+            Actividad.objects.using('lectura').filter(usuario=self.user).delete()
+        self.assertEqual(Actividad.objects.count(), 1)
+
+    @override_settings(BASE_LECTURA=None)
+    def test_sin_alias_lee_de_default(self):
+        self.assertEqual(alias_lectura(), 'default')
+        with solo_lectura():
+            self.assertEqual(Actividad.objects.all().db, 'default')
@@ -23,6 +23,7 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('admin/', admin.site.urls),
+    path('instrumentacion/', views.instrumentacion_resumen, name='instrumentacion_resumen'),
     path('', include('core.auth_urls')),
     path('inventario/', include('inventario.urls')),
     path('ventas/', include('ventas.urls')),
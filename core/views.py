@@ -1,36 +1,37 @@
 from django.shortcuts import render, redirect
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from inventario.models import Producto
-from ventas.models import Venta
-from caja.models import Caja
 from auditoria.models import Actividad
-from django.utils import timezone
-from django.db.models import Count, Sum
+from caja.services import terminal_de
+from .dashboard import metricas_dashboard
+from .instrumentacion import presupuesto_consultas, resumen
 
+@presupuesto_consultas(9)
 def home(request):
     if request.user.is_authenticated:
-        # Estadísticas para el dashboard
-        hoy = timezone.now().date()
-        
-        # Ventas de hoy
-        ventas_hoy = Venta.objects.filter(fecha__date=hoy).count()
-        
-        # Productos con stock bajo
-        productos_stock_bajo = Producto.objects.filter(stock_minimo__gt=0).count()
-        
-        # Estado de caja
-        caja_abierta = Caja.objects.filter(abierta=True).exists()
+        # Estadísticas para el dashboard (cacheadas, ver core.dashboard)
+        metricas = metricas_dashboard()
         
         # Últimas actividades
         ultimas_actividades = Actividad.objects.select_related('usuario').order_by('-fecha_hora')[:10]
         
         context = {
-            'ventas_hoy': ventas_hoy,
-            'productos_stock_bajo': productos_stock_bajo,
-            'caja_abierta': caja_abierta,
+            'ventas_hoy': metricas['ventas_hoy'],
+            'monto_ventas_hoy': metricas['monto_ventas_hoy'],
+            'productos_stock_bajo': metricas['productos_stock_bajo'],
+            # abrir/cerrar actúan sobre la caja de la terminal de la sesión
+            'caja_abierta': terminal_de(request) in metricas['terminales_abiertas'],
             'ultimas_actividades': ultimas_actividades,
         }
         
         return render(request, 'home.html', context)
     else:
         return redirect('login')
+
+
+@staff_member_required
+def instrumentacion_resumen(request):
+    return render(request, 'instrumentacion.html', {
+        'filas': resumen.filas(),
+        'muestras': resumen.muestras,
+    })
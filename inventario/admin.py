@@ -1,28 +1,117 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from auditoria import registro as auditoria
+from .forms import CambioPreciosArchivoForm, CambioPreciosForm, IngresoStockImportForm
+from .importacion import ImportacionInvalida, importar_ingreso
+from .precios import cambiar_precios, leer_codigos, presentaciones_de
 from .models import (
     Categoria,
     Producto,
     Presentacion,
     IngresoStock,
-    IngresoStockDetalle
+    IngresoStockDetalle,
+    MovimientoStock,
+    SnapshotStock,
 )
 
 
+# =========================
+# CAMBIO MASIVO DE PRECIOS
+# =========================
+# La acción "Cambiar precios" de categorías, productos y presentaciones
+# muestra un formulario intermedio y aplica el cambio a las presentaciones
+# de lo seleccionado (ver precios.cambiar_precios).
+MAX_CODIGOS_EN_MENSAJE = 10
+
+
+def _lista_corta(codigos, total):
+    texto = ', '.join(codigos[:MAX_CODIGOS_EN_MENSAJE])
+    if total > MAX_CODIGOS_EN_MENSAJE:
+        texto += f' y {total - MAX_CODIGOS_EN_MENSAJE} más'
+    return texto
+
+
+def informar_cambio_precios(modeladmin, request, resultado):
+    modeladmin.message_user(
+        request,
+        f'{resultado.actualizadas} presentación(es) con precio actualizado.',
+        messages.SUCCESS if resultado.actualizadas else messages.WARNING,
+    )
+    if resultado.total_rechazadas:
+        modeladmin.message_user(
+            request,
+            'Sin cambios por quedar con precio de venta menor al de compra o fuera de rango: '
+            + _lista_corta(resultado.rechazadas, resultado.total_rechazadas),
+            messages.WARNING,
+        )
+    if resultado.no_encontrados:
+        modeladmin.message_user(
+            request,
+            'Códigos de barra no encontrados: '
+            + _lista_corta(resultado.no_encontrados, len(resultado.no_encontrados)),
+            messages.WARNING,
+        )
+
+
+class CambioPreciosMixin:
+    actions = ('cambiar_precios',)
+
+    def presentaciones_seleccionadas(self, queryset):
+        """``(presentaciones, descripción)`` de los objetos seleccionados."""
+        raise NotImplementedError
+
+    def has_cambiar_precios_permission(self, request):
+        return request.user.has_perm('inventario.change_presentacion')
+
+    @admin.action(description='Cambiar precios de las presentaciones', permissions=['cambiar_precios'])
+    def cambiar_precios(self, request, queryset):
+        if 'aplicar' in request.POST:
+            form = CambioPreciosForm(request.POST)
+            if form.is_valid():
+                presentaciones, descripcion = self.presentaciones_seleccionadas(queryset)
+                resultado = cambiar_precios(
+                    presentaciones, request.user, descripcion=descripcion, **form.argumentos()
+                )
+                informar_cambio_precios(self, request, resultado)
+                return None
+        else:
+            form = CambioPreciosForm()
+
+        return TemplateResponse(request, 'admin/inventario/cambiar_precios.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Cambiar precios',
+            'form': form,
+            'seleccionados': queryset.count(),
+            'accion': 'cambiar_precios',
+            'ids': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
 # =========================
 # CATEGORIA
 # =========================
 @admin.register(Categoria)
-class CategoriaAdmin(admin.ModelAdmin):
+class CategoriaAdmin(CambioPreciosMixin, admin.ModelAdmin):
     list_display = ('nombre', 'descripcion')
     search_fields = ('nombre',)
     ordering = ('nombre',)
 
+    def presentaciones_seleccionadas(self, queryset):
+        nombres = ', '.join(queryset.order_by('nombre').values_list('nombre', flat=True))
+        return presentaciones_de(categorias=queryset), f'categoría(s) {nombres}'
+
 
 # =========================
 # PRODUCTO
 # =========================
 @admin.register(Producto)
-class ProductoAdmin(admin.ModelAdmin):
+class ProductoAdmin(CambioPreciosMixin, admin.ModelAdmin):
     list_display = (
         'nombre',
         'categoria',
@@ -49,12 +138,15 @@ class ProductoAdmin(admin.ModelAdmin):
         }),
     )
 
+    def presentaciones_seleccionadas(self, queryset):
+        return presentaciones_de(productos=queryset), f'{queryset.count()} producto(s)'
+
 
 # =========================
 # PRESENTACION
 # =========================
 @admin.register(Presentacion)
-class PresentacionAdmin(admin.ModelAdmin):
+class PresentacionAdmin(CambioPreciosMixin, admin.ModelAdmin):
     list_display = (
         'producto',
         'nombre',
@@ -93,6 +185,52 @@ class PresentacionAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at', 'activo'),
         }),
     )
+    change_list_template = 'admin/inventario/presentacion/change_list.html'
+
+    def presentaciones_seleccionadas(self, queryset):
+        return queryset, f'{queryset.count()} presentación(es) seleccionada(s)'
+
+    def get_urls(self):
+        urls = [
+            path(
+                'cambiar-precios/',
+                self.admin_site.admin_view(self.cambiar_precios_view),
+                name='inventario_presentacion_cambiar_precios',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def cambiar_precios_view(self, request):
+        if not self.has_cambiar_precios_permission(request):
+            return redirect('admin:inventario_presentacion_changelist')
+
+        if request.method == 'POST':
+            form = CambioPreciosArchivoForm(request.POST, request.FILES)
+            if form.is_valid():
+                archivo = form.cleaned_data['archivo']
+                try:
+                    codigos = leer_codigos(archivo, archivo.name)
+                except ImportacionInvalida as exc:
+                    form.add_error('archivo', str(exc))
+                else:
+                    resultado = cambiar_precios(
+                        presentaciones_de(codigos=codigos),
+                        request.user,
+                        descripcion=archivo.name,
+                        codigos=codigos,
+                        **form.argumentos(),
+                    )
+                    informar_cambio_precios(self, request, resultado)
+                    return redirect('admin:inventario_presentacion_changelist')
+        else:
+            form = CambioPreciosArchivoForm()
+
+        return TemplateResponse(request, 'admin/inventario/cambiar_precios.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Cambiar precios desde archivo',
+            'form': form,
+        })
 
 
 # =========================
@@ -109,6 +247,74 @@ class IngresoStockAdmin(admin.ModelAdmin):
     search_fields = ('usuario__username',)
     readonly_fields = ('fecha',)
     inlines = (IngresoStockDetalleInline,)
+    change_list_template = 'admin/inventario/ingresostock/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path(
+                'importar/',
+                self.admin_site.admin_view(self.importar_view),
+                name='inventario_ingresostock_importar',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if not change:
+            auditoria.registrar(
+                request.user,
+                'INGRESO_STOCK',
+                f'Ingreso {form.instance.pk}: {form.instance.detalles.count()} detalle(s)',
+            )
+
+    def importar_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:inventario_ingresostock_changelist')
+
+        resultado = None
+        if request.method == 'POST':
+            form = IngresoStockImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                archivo = form.cleaned_data['archivo']
+                try:
+                    resultado = importar_ingreso(
+                        archivo,
+                        archivo.name,
+                        request.user,
+                        observacion=form.cleaned_data['observacion'] or None,
+                        omitir_errores=form.cleaned_data['omitir_errores'],
+                    )
+                except ImportacionInvalida as exc:
+                    form.add_error('archivo', str(exc))
+                else:
+                    if resultado.ingreso is not None:
+                        self.message_user(
+                            request,
+                            f'{resultado.filas_importadas} fila(s) importada(s) en {resultado.ingreso}.',
+                            messages.SUCCESS,
+                        )
+                        if not resultado.total_errores:
+                            return redirect(reverse(
+                                'admin:inventario_ingresostock_change',
+                                args=[resultado.ingreso.pk],
+                            ))
+                    else:
+                        self.message_user(
+                            request,
+                            f'No se importó nada: {resultado.total_errores} fila(s) con errores.',
+                            messages.ERROR,
+                        )
+        else:
+            form = IngresoStockImportForm()
+
+        return TemplateResponse(request, 'admin/inventario/ingresostock/importar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar ingreso de stock',
+            'form': form,
+            'resultado': resultado,
+        })
 
 
 # =========================
@@ -118,3 +324,30 @@ class IngresoStockAdmin(admin.ModelAdmin):
 class IngresoStockDetalleAdmin(admin.ModelAdmin):
     list_display = ('ingreso', 'presentacion', 'cantidad_base')
     search_fields = ('presentacion__nombre', 'presentacion__codigo_barra')
+
+
+# =========================
+# MOVIMIENTOS DE STOCK
+# =========================
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'presentacion', 'tipo', 'cantidad', 'usuario', 'venta', 'ingreso')
+    list_filter = ('tipo',)
+    search_fields = ('presentacion__codigo_barra', 'presentacion__producto__nombre')
+    list_select_related = ('presentacion__producto', 'usuario', 'venta', 'ingreso')
+    date_hierarchy = 'fecha'
+
+    # El libro es solo de inserción: los ajustes se hacen con nuevos movimientos.
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SnapshotStock)
+class SnapshotStockAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'presentacion', 'stock_base')
+    search_fields = ('presentacion__codigo_barra',)
+    list_select_related = ('presentacion__producto',)
+    date_hierarchy = 'fecha'
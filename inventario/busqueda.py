@@ -0,0 +1,306 @@
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+
+from . import catalogo
+from .models import Presentacion, PresentacionBaja, Producto
+
+
+# =========================
+# ÍNDICE DE BÚSQUEDA DE PRODUCTOS
+# =========================
+# Índice de trigramas en memoria sobre el nombre del producto, el nombre de
+# su categoría y los códigos de barra de sus presentaciones. Cada palabra de
+# la búsqueda debe aparecer (sin tildes ni mayúsculas) en alguno de esos
+# textos; las de una o dos letras se buscan como prefijo de palabra.
+#
+# Las señales actualizan el índice del proceso que hizo el cambio. Los demás
+# procesos se ponen al día con la versión del catálogo: cada
+# BUSQUEDA_REFRESCO segundos releen los productos, presentaciones y bajas
+# posteriores a la última versión indexada. Un producto borrado en otro
+# proceso (solo puede no tener presentaciones) queda en este índice hasta
+# reconstruirlo; quien busca lee los resultados de la base y lo descarta.
+
+_NO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+# Con más candidatos que esto, una búsqueda de una palabra se resuelve por
+# niveles (ver IndiceBusqueda._por_niveles) en lugar de puntuar uno por uno.
+UMBRAL_PUNTAJE = 1000
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto.lower()).strip()
+
+
+def _gramas(palabra):
+    if len(palabra) < 3:
+        return set()
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+class Documento:
+    # Los textos se guardan rodeados de espacios para que las comprobaciones
+    # de palabra exacta y de prefijo sean búsquedas de subcadena.
+    __slots__ = ('nombre', 'categoria', 'codigos', 'texto')
+
+    def __init__(self, nombre, categoria, codigos):
+        self.nombre = f' {normalizar(nombre)} '
+        self.categoria = normalizar(categoria)
+        self.codigos = f" {' '.join(normalizar(c) for c in codigos)} "
+        self.texto = f'{self.nombre}{self.categoria}{self.codigos}'
+
+    def palabras(self):
+        """``(palabras del nombre y códigos, palabras de la categoría)``."""
+        return set((self.nombre + self.codigos).split()), set(self.categoria.split())
+
+
+class IndiceBusqueda:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._documentos = {}
+        self._gramas = {}
+        # prefijos de una y dos letras: de nombre y códigos por un lado
+        # (coincidencias de más peso) y de la categoría por otro
+        self._prefijos = {}
+        self._prefijos_categoria = {}
+        # palabras completas del nombre y de la categoría, y códigos completos
+        self._palabras_nombre = {}
+        self._palabras_categoria = {}
+        self._codigos = {}
+        # nombre normalizado de cada producto, la clave de desempate
+        self._nombres = {}
+        self._producto_de = {}
+        self.version = None
+        self._verificado = 0.0
+
+    @property
+    def construido(self):
+        return self.version is not None
+
+    def __len__(self):
+        return len(self._documentos)
+
+    # --- mantenimiento ---
+
+    def _claves(self, documento):
+        principales, categoria = documento.palabras()
+        for palabras, prefijos in ((principales, self._prefijos), (categoria, self._prefijos_categoria)):
+            for palabra in palabras:
+                for grama in _gramas(palabra):
+                    yield self._gramas, grama
+                yield prefijos, palabra[:1]
+                yield prefijos, palabra[:2]
+        for palabra in documento.nombre.split():
+            yield self._palabras_nombre, palabra
+        for palabra in categoria:
+            yield self._palabras_categoria, palabra
+        for codigo in documento.codigos.split():
+            yield self._codigos, codigo
+
+    def _indexar(self, producto_id, documento):
+        self._documentos[producto_id] = documento
+        self._nombres[producto_id] = documento.nombre
+        for tabla, clave in self._claves(documento):
+            tabla.setdefault(clave, set()).add(producto_id)
+
+    def _desindexar(self, producto_id):
+        documento = self._documentos.pop(producto_id, None)
+        if documento is None:
+            return
+        del self._nombres[producto_id]
+        for tabla, clave in self._claves(documento):
+            ids = tabla.get(clave)
+            if ids is not None:
+                ids.discard(producto_id)
+                if not ids:
+                    del tabla[clave]
+
+    def agregar(self, producto_id, nombre, categoria, codigos):
+        with self._lock:
+            self._desindexar(producto_id)
+            self._indexar(producto_id, Documento(nombre, categoria, codigos))
+
+    def quitar(self, producto_id):
+        with self._lock:
+            self._desindexar(producto_id)
+
+    def _leer(self, producto_ids=None):
+        """``{producto_id: (nombre, categoria, [codigos])}`` desde la base."""
+        productos = Producto.objects.values_list('id', 'nombre', 'categoria__nombre')
+        presentaciones = Presentacion.objects.values_list('producto_id', 'id', 'codigo_barra')
+        if producto_ids is not None:
+            productos = productos.filter(pk__in=producto_ids)
+            presentaciones = presentaciones.filter(producto_id__in=producto_ids)
+
+        datos = {pk: (nombre, categoria, []) for pk, nombre, categoria in productos.iterator(chunk_size=5000)}
+        for producto_id, presentacion_id, codigo in presentaciones.iterator(chunk_size=5000):
+            if producto_id in datos:
+                datos[producto_id][2].append(codigo)
+                self._producto_de[presentacion_id] = producto_id
+        return datos
+
+    def reconstruir(self):
+        with self._lock:
+            version = catalogo.version_actual()
+            self._documentos, self._nombres, self._gramas, self._producto_de = {}, {}, {}, {}
+            self._prefijos, self._prefijos_categoria = {}, {}
+            self._palabras_nombre, self._palabras_categoria, self._codigos = {}, {}, {}
+            for pk, (nombre, categoria, codigos) in self._leer().items():
+                self._indexar(pk, Documento(nombre, categoria, codigos))
+            self.version = version
+            self._verificado = time.monotonic()
+
+    def actualizar_productos(self, producto_ids):
+        """Reindexa los productos indicados (y quita los que ya no existen)."""
+        producto_ids = set(producto_ids)
+        with self._lock:
+            if not self.construido or not producto_ids:
+                return
+            datos = self._leer(producto_ids)
+            for pk in producto_ids:
+                if pk in datos:
+                    nombre, categoria, codigos = datos[pk]
+                    self.agregar(pk, nombre, categoria, codigos)
+                else:
+                    self.quitar(pk)
+
+    def refrescar(self):
+        """Aplica los cambios de catálogo hechos por otros procesos."""
+        with self._lock:
+            version = catalogo.version_actual()
+            if version <= self.version:
+                return
+            productos = set(
+                Presentacion.objects
+                .filter(version_catalogo__gt=self.version)
+                .values_list('producto_id', flat=True)
+            )
+            productos.update(
+                Producto.objects
+                .filter(version_catalogo__gt=self.version)
+                .values_list('pk', flat=True)
+            )
+            for presentacion_id in (
+                PresentacionBaja.objects
+                .filter(version_catalogo__gt=self.version)
+                .values_list('presentacion_id', flat=True)
+            ):
+                if presentacion_id in self._producto_de:
+                    productos.add(self._producto_de.pop(presentacion_id))
+            self.actualizar_productos(productos)
+            self.version = version
+
+    # --- consulta ---
+
+    def _candidatos(self, palabra):
+        if len(palabra) < 3:
+            return self._prefijos.get(palabra, set()) | self._prefijos_categoria.get(palabra, set())
+        listas = sorted((self._gramas.get(g, set()) for g in _gramas(palabra)), key=len)
+        if not listas[0]:
+            return set()
+        return listas[0].intersection(*listas[1:])
+
+    def buscar(self, consulta, limite=50):
+        """Ids de producto que coinciden con ``consulta``, los más relevantes primero."""
+        if not self.construido:
+            self.reconstruir()
+        elif time.monotonic() - self._verificado > getattr(settings, 'BUSQUEDA_REFRESCO', 2):
+            self._verificado = time.monotonic()
+            self.refrescar()
+
+        palabras = normalizar(consulta).split()
+        if not palabras:
+            return []
+        with self._lock:
+            candidatos = None
+            for palabra in sorted(palabras, key=len, reverse=True):
+                ids = self._candidatos(palabra)
+                candidatos = ids if candidatos is None else candidatos & ids
+                if not candidatos:
+                    return []
+
+            if len(palabras) > 1 or len(candidatos) <= UMBRAL_PUNTAJE:
+                return self._puntuar(palabras, candidatos, limite)
+            return self._por_niveles(palabras[0], candidatos, limite)
+
+    def _puntuar(self, palabras, candidatos, limite):
+        # Puntaje por palabra: código exacto 5, palabra exacta del nombre 4,
+        # prefijo de palabra del nombre o de un código 3, dentro del
+        # nombre 2, en otro lugar (categoría, dentro de un código) 1. Es el
+        # lazo más caliente de la búsqueda: todo lo que no depende del
+        # candidato se arma antes.
+        claves = [(p, f' {p} ', f' {p}') for p in palabras]
+        documentos = self._documentos
+        resultados = []
+        for pk in candidatos:
+            documento = documentos[pk]
+            texto, nombre, codigos = documento.texto, documento.nombre, documento.codigos
+            puntaje = 0
+            for palabra, exacta, prefijo in claves:
+                # los trigramas pueden coincidir sin que la palabra esté entera
+                if palabra not in texto:
+                    break
+                if exacta in codigos:
+                    puntaje -= 5
+                elif exacta in nombre:
+                    puntaje -= 4
+                elif prefijo in nombre or prefijo in codigos:
+                    puntaje -= 3
+                elif palabra in nombre:
+                    puntaje -= 2
+                else:
+                    puntaje -= 1
+            else:
+                resultados.append((puntaje, nombre, pk))
+        return [pk for _, _, pk in heapq.nsmallest(limite, resultados)]
+
+    def _por_niveles(self, palabra, candidatos, limite):
+        """
+        Búsqueda de una sola palabra poco selectiva (una marca, una
+        categoría): en lugar de puntuar miles de candidatos se arman los
+        niveles de relevancia con operaciones de conjuntos sobre el
+        vocabulario del nombre, y se ordena por nombre solo lo que entra en
+        el límite. Aquí los prefijos de código cuentan en el último nivel.
+        """
+        if len(palabra) < 3:
+            niveles = [self._prefijos.get(palabra, set()), self._prefijos_categoria.get(palabra, set())]
+        else:
+            prefijo, dentro = set(), set()
+            for vocablo, ids in self._palabras_nombre.items():
+                if vocablo.startswith(palabra):
+                    prefijo |= ids
+                elif palabra in vocablo:
+                    dentro |= ids
+            niveles = [
+                self._codigos.get(palabra, set()),
+                self._palabras_nombre.get(palabra, set()),
+                prefijo,
+                dentro,
+            ]
+            categoria = set()
+            for vocablo, ids in self._palabras_categoria.items():
+                if palabra in vocablo:
+                    categoria |= ids
+            niveles.append(categoria)
+
+        orden = self._nombres.__getitem__
+        resultado, usados = [], set()
+        for nivel in niveles:
+            nivel = (nivel & candidatos) - usados
+            resultado += heapq.nsmallest(limite - len(resultado), nivel, key=orden)
+            if len(resultado) >= limite:
+                return resultado
+            usados |= nivel
+
+        # el resto: dentro de códigos, o falsos positivos de los trigramas
+        documentos = self._documentos
+        resto = (pk for pk in candidatos - usados if palabra in documentos[pk].texto)
+        return resultado + heapq.nsmallest(limite - len(resultado), resto, key=orden)
+
+indice_productos = IndiceBusqueda()
@@ -0,0 +1,432 @@
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import CatalogoVersion, Presentacion, PresentacionBaja
+
+
+CAMPOS_POS = (
+    'id',
+    'codigo_barra',
+    'nombre',
+    'producto__nombre',
+    'producto__tipo_producto',
+    'unidad_venta',
+    'cantidad_base',
+    'stock_base',
+    'precio_venta',
+)
+
+
+class CacheLRU:
+    """
+    Cache LRU acotada y segura entre hilos, local a cada proceso.
+
+    Cada entrada vence a los ``ttl`` segundos: las señales solo invalidan la
+    cache del proceso que hizo el cambio, así que el TTL acota lo que puede
+    quedar desactualizado en los demás workers.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return default
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return default
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def descartar_si(self, condicion):
+        with self._lock:
+            for clave in [c for c, (_, valor) in self._datos.items() if condicion(c, valor)]:
+                del self._datos[clave]
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+cache_presentaciones = CacheLRU(
+    maxsize=getattr(settings, 'CATALOGO_CACHE_MAXSIZE', 4096),
+    ttl=getattr(settings, 'CATALOGO_CACHE_TTL', 60),
+)
+
+_NO_ENCONTRADO = object()
+
+
+def _serializar(fila):
+    return {
+        'id': fila['id'],
+        'codigo_barra': fila['codigo_barra'],
+        'nombre': f"{fila['producto__nombre']} - {fila['nombre']}",
+        'producto_nombre': fila['producto__nombre'],
+        'tipo_producto': fila['producto__tipo_producto'],
+        'unidad': fila['unidad_venta'],
+        'cantidad': float(fila['cantidad_base']),
+        'stock': float(fila['stock_base']),
+        'precio_venta': float(fila['precio_venta']),
+    }
+
+
+def buscar_por_codigo(codigo_barra):
+    """Devuelve la presentación con ese código de barras, o ``None``."""
+    vigente, datos = catalogo_pos.por_codigo(codigo_barra, cache_presentaciones.ttl)
+    if vigente:
+        return datos
+    clave = ('codigo', codigo_barra)
+    resultado = cache_presentaciones.get(clave, _NO_ENCONTRADO)
+    if resultado is _NO_ENCONTRADO:
+        fila = Presentacion.objects.filter(codigo_barra=codigo_barra).values(*CAMPOS_POS).first()
+        resultado = [_serializar(fila)] if fila else []
+        cache_presentaciones.set(clave, resultado)
+    return resultado[0] if resultado else None
+
+
+def buscar_por_prefijo(prefijo, limite=20):
+    """Presentaciones cuyo código de barras empieza con ``prefijo``."""
+    clave = ('prefijo', prefijo, limite)
+    resultado = cache_presentaciones.get(clave, _NO_ENCONTRADO)
+    if resultado is _NO_ENCONTRADO:
+        filas = (
+            Presentacion.objects
+            .filter(codigo_barra__startswith=prefijo)
+            .order_by('codigo_barra')
+            .values(*CAMPOS_POS)[:limite]
+        )
+        resultado = [_serializar(fila) for fila in filas]
+        cache_presentaciones.set(clave, resultado)
+    return resultado
+
+
+def invalidar(presentacion_ids=None):
+    """
+    Descarta de la cache las entradas que contienen alguna de las
+    presentaciones indicadas, o toda la cache si no se indica ninguna.
+
+    Las búsquedas por prefijo y los códigos no encontrados se descartan
+    siempre: un alta o un cambio de código puede hacer aparecer una fila nueva
+    en cualquiera de ellos.
+    """
+    if presentacion_ids is None:
+        cache_presentaciones.clear()
+        catalogo_pos.descartar()
+        return
+    catalogo_pos.marcar_pendiente()
+    ids = set(presentacion_ids)
+    cache_presentaciones.descartar_si(
+        lambda clave, filas: (
+            clave[0] == 'prefijo' or not filas or any(f['id'] in ids for f in filas)
+        )
+    )
+
+
+# =========================
+# VERSIONES Y SNAPSHOTS
+# =========================
+# Cada cambio de catálogo incrementa CatalogoVersion (fila pk=1) y marca las
+# filas tocadas con ese valor. El UPDATE del contador bloquea su fila hasta
+# el commit, así que las versiones se confirman en orden y un terminal que
+# vio la versión N nunca se pierde un cambio <= N confirmado después.
+
+CAMPOS_SNAPSHOT = (
+    'id',
+    'codigo_barra',
+    'nombre',
+    'tipo_producto',
+    'unidad',
+    'cantidad',
+    'stock',
+    'precio_venta',
+)
+
+
+def incrementar_version():
+    if not CatalogoVersion.objects.filter(pk=1).update(valor=F('valor') + 1):
+        CatalogoVersion.objects.get_or_create(pk=1)
+        CatalogoVersion.objects.filter(pk=1).update(valor=F('valor') + 1)
+
+
+def siguiente_version():
+    """Incrementa la versión del catálogo y devuelve el nuevo valor."""
+    incrementar_version()
+    return CatalogoVersion.objects.values_list('valor', flat=True).get(pk=1)
+
+
+def version_actual():
+    return CatalogoVersion.objects.filter(pk=1).values_list('valor', flat=True).first() or 0
+
+
+# =========================
+# CATÁLOGO EN MEMORIA
+# =========================
+# Una copia del catálogo POS por proceso, compartida por todas las
+# peticiones: columnas paralelas (``array`` para los números, listas de str
+# internados para los textos, que se repiten mucho) y dos dicts de
+# posiciones, por id y por código de barras. Se carga una vez con
+# ``values_list`` y después se pone al día por la versión del catálogo,
+# releyendo solo las filas y bajas posteriores a la última versión vista.
+# Si la versión retrocede (una base restaurada) se vuelve a cargar entera.
+#
+# Las búsquedas por código salen de aquí solo si el catálogo se refrescó
+# hace menos de CATALOGO_CACHE_TTL segundos y no hubo cambios en este
+# proceso desde entonces; si no, siguen por cache_presentaciones.
+
+COLUMNAS_MEMORIA = (
+    'id',
+    'codigo_barra',
+    'nombre',
+    'producto__nombre',
+    'producto__tipo_producto',
+    'unidad_venta',
+    'cantidad_base',
+    'stock_base',
+    'precio_venta',
+    'version_catalogo',
+)
+
+
+class CatalogoPOS:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self._cargado_en = None
+        self._refrescado = 0.0
+        self._pendiente = False
+        self._vaciar()
+
+    def _vaciar(self):
+        self._ids = array('q')
+        self._versiones = array('q')
+        self._cantidades = array('d')
+        self._stocks = array('d')
+        self._precios = array('d')
+        self._codigos = []
+        self._nombres = []
+        self._productos = []
+        self._tipos = []
+        self._unidades = []
+        self._posicion = {}
+        self._por_codigo = {}
+        self._borradas = 0
+        # bajas vistas desde la carga: ``(version, presentacion_id)``
+        self._bajas = []
+
+    @property
+    def cargado(self):
+        return self.version is not None
+
+    def __len__(self):
+        return len(self._posicion)
+
+    # --- mantenimiento ---
+
+    def _poner(self, fila):
+        pk, codigo, nombre, producto, tipo, unidad, cantidad, stock, precio, version = fila
+        valores = (
+            sys.intern(nombre), sys.intern(producto), sys.intern(tipo), sys.intern(unidad),
+            float(cantidad), float(stock), float(precio), version,
+        )
+        i = self._posicion.get(pk)
+        if i is None:
+            i = len(self._ids)
+            self._ids.append(pk)
+            self._codigos.append(codigo)
+            for columna, valor in zip(self._columnas(), valores):
+                columna.append(valor)
+            self._posicion[pk] = i
+        else:
+            anterior = self._codigos[i]
+            if anterior != codigo:
+                # si el código pasó a otra fila (un intercambio) ya no es de esta
+                if self._por_codigo.get(anterior) == i:
+                    del self._por_codigo[anterior]
+                self._codigos[i] = codigo
+            for columna, valor in zip(self._columnas(), valores):
+                columna[i] = valor
+        self._por_codigo[codigo] = i
+
+    def _columnas(self):
+        return (
+            self._nombres, self._productos, self._tipos, self._unidades,
+            self._cantidades, self._stocks, self._precios, self._versiones,
+        )
+
+    def _quitar(self, pk):
+        i = self._posicion.pop(pk, None)
+        if i is None:
+            return
+        if self._por_codigo.get(self._codigos[i]) == i:
+            del self._por_codigo[self._codigos[i]]
+        # la fila queda como hueco (id 0) hasta la próxima compactación
+        self._ids[i] = 0
+        self._borradas += 1
+
+    def _compactar(self):
+        vivas = [i for i, pk in enumerate(self._ids) if pk]
+        columnas = (self._ids, self._codigos) + self._columnas()
+        nuevas = [
+            array(c.typecode, [c[i] for i in vivas]) if isinstance(c, array) else [c[i] for i in vivas]
+            for c in columnas
+        ]
+        (self._ids, self._codigos, self._nombres, self._productos, self._tipos, self._unidades,
+         self._cantidades, self._stocks, self._precios, self._versiones) = nuevas
+        self._posicion = {pk: i for i, pk in enumerate(self._ids)}
+        self._por_codigo = {codigo: i for i, codigo in enumerate(self._codigos)}
+        self._borradas = 0
+
+    def cargar(self, filas, version):
+        """Reemplaza el catálogo por ``filas`` (tuplas en el orden de ``COLUMNAS_MEMORIA``)."""
+        with self._lock:
+            self._vaciar()
+            for fila in filas:
+                self._poner(fila)
+            self.version = self._cargado_en = version
+            self._pendiente = False
+            self._refrescado = time.monotonic()
+
+    def descartar(self):
+        """La próxima consulta vuelve a cargar el catálogo entero."""
+        with self._lock:
+            self._vaciar()
+            self.version = self._cargado_en = None
+
+    def marcar_pendiente(self):
+        """Hubo un cambio en este proceso: no responder búsquedas hasta refrescar."""
+        self._pendiente = True
+
+    def al_dia(self, version=None):
+        """Carga o pone al día el catálogo hasta ``version`` (por defecto, la actual)."""
+        if version is None:
+            version = version_actual()
+        with self._lock:
+            if self.cargado and version == self.version:
+                self._pendiente = False
+                self._refrescado = time.monotonic()
+                return
+            presentaciones = Presentacion.objects.values_list(*COLUMNAS_MEMORIA).order_by('id')
+            if not self.cargado or version < self.version:
+                self.cargar(presentaciones.iterator(chunk_size=5000), version)
+                return
+            for fila in presentaciones.filter(version_catalogo__gt=self.version).iterator(chunk_size=5000):
+                self._poner(fila)
+            for version_baja, pk in (
+                PresentacionBaja.objects
+                .filter(version_catalogo__gt=self.version)
+                .values_list('version_catalogo', 'presentacion_id')
+            ):
+                self._quitar(pk)
+                self._bajas.append((version_baja, pk))
+            if self._borradas * 4 > len(self._ids):
+                self._compactar()
+            self.version = version
+            self._pendiente = False
+            self._refrescado = time.monotonic()
+
+    # --- consulta ---
+
+    def _datos(self, i):
+        return {
+            'id': self._ids[i],
+            'codigo_barra': self._codigos[i],
+            'nombre': f'{self._productos[i]} - {self._nombres[i]}',
+            'producto_nombre': self._productos[i],
+            'tipo_producto': self._tipos[i],
+            'unidad': self._unidades[i],
+            'cantidad': self._cantidades[i],
+            'stock': self._stocks[i],
+            'precio_venta': self._precios[i],
+        }
+
+    def por_codigo(self, codigo_barra, vigencia):
+        """
+        ``(True, datos o None)`` si el catálogo se refrescó hace menos de
+        ``vigencia`` segundos y no hay cambios propios pendientes; si no,
+        ``(False, None)`` y quien llama consulta la base.
+        """
+        with self._lock:
+            if not self.cargado or self._pendiente or time.monotonic() - self._refrescado > vigencia:
+                return False, None
+            i = self._por_codigo.get(codigo_barra)
+            return True, (None if i is None else self._datos(i))
+
+    def filas(self, desde=None):
+        """Filas del snapshot (orden de ``CAMPOS_SNAPSHOT``) con versión posterior a ``desde``."""
+        with self._lock:
+            ids, versiones, codigos, nombres, productos, tipos, unidades, cantidades, stocks, precios = (
+                self._ids, self._versiones, self._codigos, self._nombres, self._productos,
+                self._tipos, self._unidades, self._cantidades, self._stocks, self._precios,
+            )
+            return [
+                [ids[i], codigos[i], f'{productos[i]} - {nombres[i]}', tipos[i], unidades[i],
+                 cantidades[i], stocks[i], precios[i]]
+                for i in range(len(ids))
+                if ids[i] and (desde is None or versiones[i] > desde)
+            ]
+
+    def bajas(self, desde):
+        """Ids dados de baja después de ``desde``, o ``None`` si es anterior a la carga."""
+        with self._lock:
+            if self._cargado_en is None or desde < self._cargado_en:
+                return None
+            return [pk for version, pk in self._bajas if version > desde]
+
+
+catalogo_pos = CatalogoPOS()
+
+
+def snapshot(desde=None, version=None):
+    """
+    Catálogo POS compacto: filas como listas en el orden de ``campos``.
+
+    Con ``desde`` solo se incluyen las filas cambiadas y las bajas
+    posteriores a esa versión; si ``desde`` falta o es posterior a la
+    versión actual se devuelve el catálogo completo. ``version`` evita
+    releer la versión actual si quien llama ya la leyó antes que las filas.
+    Las filas salen de ``catalogo_pos``, puesto al día hasta ``version``.
+    """
+    if version is None:
+        version = version_actual()
+    completo = desde is None or desde > version
+
+    catalogo_pos.al_dia(version)
+    bajas = []
+    if not completo:
+        bajas = catalogo_pos.bajas(desde)
+        if bajas is None:
+            bajas = list(
+                PresentacionBaja.objects
+                .filter(version_catalogo__gt=desde)
+                .values_list('presentacion_id', flat=True)
+            )
+
+    return {
+        'version': version,
+        'completo': completo,
+        'campos': CAMPOS_SNAPSHOT,
+        'filas': catalogo_pos.filas(None if completo else desde),
+        'bajas': bajas,
+    }
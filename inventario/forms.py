@@ -96,4 +96,60 @@ class PresentacionForm(forms.ModelForm):
         )
         if commit:
             instance.save()
-        return instance    
\ No newline at end of file
+        return instance
+
+
+class IngresoStockImportForm(forms.Form):
+    archivo = forms.FileField(
+        help_text='Archivo .xlsx o .csv con las columnas codigo_barra y cantidad.'
+    )
+    observacion = forms.CharField(max_length=200, required=False)
+    omitir_errores = forms.BooleanField(
+        required=False,
+        help_text='Importar las filas válidas aunque otras tengan errores.'
+    )
+
+
+class CambioPreciosForm(forms.Form):
+    PRECIO_CHOICES = [
+        ('venta', 'Precio de venta'),
+        ('compra', 'Precio de compra'),
+        ('ambos', 'Ambos'),
+    ]
+    MODO_CHOICES = [
+        ('porcentaje', 'Porcentaje'),
+        ('monto', 'Monto fijo'),
+    ]
+
+    precio = forms.ChoiceField(choices=PRECIO_CHOICES)
+    modo = forms.ChoiceField(choices=MODO_CHOICES)
+    valor = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text='Porcentaje o monto a sumar; negativo para bajar el precio.'
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        valor = cleaned.get('valor')
+        if valor is not None:
+            if valor == 0:
+                self.add_error('valor', 'El cambio no puede ser 0.')
+            elif cleaned.get('modo') == 'porcentaje' and valor <= -100:
+                self.add_error('valor', 'El porcentaje debe ser mayor a -100.')
+        return cleaned
+
+    def argumentos(self):
+        """Argumentos de ``precios.cambiar_precios`` según el formulario."""
+        datos = self.cleaned_data
+        return {
+            'precio': datos['precio'],
+            'porcentaje': datos['valor'] if datos['modo'] == 'porcentaje' else None,
+            'monto': datos['valor'] if datos['modo'] == 'monto' else None,
+        }
+
+
+class CambioPreciosArchivoForm(CambioPreciosForm):
+    archivo = forms.FileField(
+        help_text='Archivo .xlsx o .csv con la columna codigo_barra.'
+    )
@@ -0,0 +1,209 @@
+import csv
+import io
+import zipfile
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from auditoria import registro as auditoria
+
+from .models import IngresoStock, IngresoStockDetalle, MovimientoStock, Presentacion
+from .services import aplicar_movimientos
+
+
+TAMANO_LOTE = 1000
+MAX_ERRORES_REPORTADOS = 500
+# IngresoStockDetalle.cantidad_base: max_digits=10, decimal_places=3
+CANTIDAD_MAXIMA = Decimal('10000000')
+
+COLUMNAS_CODIGO = ('codigo_barra', 'codigo', 'codigo de barra', 'código de barra')
+COLUMNAS_CANTIDAD = ('cantidad', 'cantidad_base')
+
+
+class ImportacionInvalida(Exception):
+    pass
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.ingreso = None
+        self.filas_importadas = 0
+        self.total_errores = 0
+        # (número de fila, mensaje); se guardan solo los primeros
+        # MAX_ERRORES_REPORTADOS para no crecer con el tamaño del archivo.
+        self.errores = []
+
+    def agregar_error(self, fila, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES_REPORTADOS:
+            self.errores.append((fila, mensaje))
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    yield from csv.reader(texto, dialecto)
+
+
+def _filas_xlsx(archivo):
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError):
+        # no es un .xlsx (renombrado) o está dañado
+        raise ImportacionInvalida('El archivo no es un libro .xlsx válido.')
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _filas_validadas(filas):
+    # Los errores de lectura aparecen recién al iterar: se informan como
+    # archivo inválido en lugar de llegar como excepción al que importa.
+    try:
+        yield from filas
+    except UnicodeDecodeError:
+        raise ImportacionInvalida('El archivo CSV debe estar codificado en UTF-8.')
+    except csv.Error as exc:
+        raise ImportacionInvalida(f'El archivo CSV no se puede leer: {exc}')
+
+
+def leer_filas(archivo, nombre):
+    """Itera las filas del archivo sin cargarlo completo en memoria."""
+    if nombre.lower().endswith(('.xlsx', '.xlsm')):
+        return _filas_validadas(_filas_xlsx(archivo))
+    if nombre.lower().endswith(('.csv', '.txt')):
+        return _filas_validadas(_filas_csv(archivo))
+    raise ImportacionInvalida('Formato no soportado: use un archivo .xlsx o .csv.')
+
+
+def _indice_columna(encabezado, nombres):
+    for indice, valor in enumerate(encabezado):
+        if str(valor or '').strip().lower() in nombres:
+            return indice
+    return None
+
+
+def _procesar_lote(lote, ingreso, resultado):
+    codigos = {codigo for _, codigo, _ in lote}
+    presentaciones = Presentacion.objects.in_bulk(codigos, field_name='codigo_barra')
+
+    detalles = []
+    movimientos = []
+    for fila, codigo, cantidad in lote:
+        presentacion = presentaciones.get(codigo)
+        if presentacion is None:
+            resultado.agregar_error(fila, f'Código de barra no encontrado: {codigo}')
+            continue
+        detalles.append(IngresoStockDetalle(
+            ingreso=ingreso,
+            presentacion=presentacion,
+            cantidad_base=cantidad,
+        ))
+        movimientos.append(MovimientoStock(
+            presentacion=presentacion,
+            tipo='INGRESO',
+            cantidad=cantidad,
+            usuario_id=ingreso.usuario_id,
+            ingreso=ingreso,
+        ))
+
+    # bulk_create no emite post_save: el stock y el libro se actualizan aquí
+    # con un INSERT por tabla y un UPDATE por lote.
+    IngresoStockDetalle.objects.bulk_create(detalles)
+    aplicar_movimientos(movimientos)
+    resultado.filas_importadas += len(detalles)
+
+
+def importar_ingreso(archivo, nombre, usuario, observacion=None, omitir_errores=False):
+    """
+    Importa un ingreso de stock desde un archivo XLSX o CSV.
+
+    El archivo debe tener una fila de encabezado con las columnas
+    ``codigo_barra`` y ``cantidad``. Se lee en streaming y se procesa en lotes
+    de ``TAMANO_LOTE`` filas: cada lote resuelve sus códigos con una consulta,
+    inserta los detalles y movimientos con ``bulk_create`` y suma el stock con
+    un UPDATE, de modo que la memoria no depende del tamaño del archivo.
+
+    Todo ocurre en una transacción que crea un único ``IngresoStock``. Si hay
+    filas con errores no se importa nada, salvo que ``omitir_errores`` sea
+    verdadero, en cuyo caso se importan solo las filas válidas.
+    """
+    filas = leer_filas(archivo, nombre)
+    try:
+        encabezado = next(filas)
+    except StopIteration:
+        raise ImportacionInvalida('El archivo está vacío.')
+
+    col_codigo = _indice_columna(encabezado, COLUMNAS_CODIGO)
+    col_cantidad = _indice_columna(encabezado, COLUMNAS_CANTIDAD)
+    if col_codigo is None or col_cantidad is None:
+        raise ImportacionInvalida('El encabezado debe tener las columnas codigo_barra y cantidad.')
+
+    resultado = ResultadoImportacion()
+    try:
+        with transaction.atomic():
+            ingreso = IngresoStock.objects.create(usuario=usuario, observacion=observacion)
+            lote = []
+            for numero, fila in enumerate(filas, start=2):
+                if not fila or all(valor in (None, '') for valor in fila):
+                    continue
+
+                valor = fila[col_codigo] if col_codigo < len(fila) else None
+                if isinstance(valor, float) and valor.is_integer():
+                    # Excel guarda los códigos numéricos como float.
+                    codigo = str(int(valor))
+                else:
+                    codigo = str(valor).strip() if valor is not None else ''
+                if not codigo:
+                    resultado.agregar_error(numero, 'Falta el código de barra.')
+                    continue
+
+                try:
+                    valor = fila[col_cantidad] if col_cantidad < len(fila) else None
+                    cantidad = Decimal(str(valor).strip().replace(',', '.')).quantize(Decimal('0.001'))
+                    if not cantidad.is_finite() or cantidad >= CANTIDAD_MAXIMA:
+                        raise InvalidOperation
+                except (InvalidOperation, ValueError):
+                    resultado.agregar_error(numero, f'Cantidad inválida: {valor}')
+                    continue
+                if cantidad <= 0:
+                    resultado.agregar_error(numero, 'La cantidad debe ser mayor a 0.')
+                    continue
+
+                lote.append((numero, codigo, cantidad))
+                if len(lote) >= TAMANO_LOTE:
+                    _procesar_lote(lote, ingreso, resultado)
+                    lote = []
+            if lote:
+                _procesar_lote(lote, ingreso, resultado)
+
+            if resultado.total_errores and not omitir_errores:
+                raise _Rollback
+            if not resultado.filas_importadas:
+                raise _Rollback
+            auditoria.registrar(
+                usuario,
+                'INGRESO_STOCK',
+                f'Ingreso {ingreso.pk}: {resultado.filas_importadas} fila(s) importadas desde {nombre}',
+            )
+    except _Rollback:
+        resultado.filas_importadas = 0
+    else:
+        resultado.ingreso = ingreso
+    finally:
+        resultado.errores.sort()
+
+    return resultado
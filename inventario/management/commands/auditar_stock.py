@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from inventario.services import auditar_stock
+
+
+class Command(BaseCommand):
+    help = 'Compara stock_base con el libro de movimientos (desde el último snapshot).'
+
+    def handle(self, *args, **options):
+        diferencias = 0
+        for presentacion in auditar_stock().select_related('producto').iterator(chunk_size=2000):
+            diferencias += 1
+            self.stdout.write(
+                f'{presentacion} ({presentacion.codigo_barra}): '
+                f'stock_base {presentacion.stock_base} != libro {presentacion.saldo}'
+            )
+
+        if diferencias:
+            self.stdout.write(self.style.WARNING(f'{diferencias} presentación(es) con diferencias.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('El stock coincide con el libro de movimientos.'))
@@ -0,0 +1,69 @@
+import gc
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.benchmark import CATEGORIAS, MARCAS, TIPOS, VARIANTES
+from inventario.busqueda import IndiceBusqueda
+
+
+class Command(BaseCommand):
+    help = 'Mide la construcción y las consultas del índice de búsqueda con datos sintéticos (sin tocar la base).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--presentaciones', type=int, default=100_000)
+        parser.add_argument('--por-producto', type=int, default=2, help='Presentaciones por producto.')
+        parser.add_argument('--consultas', type=int, default=2000)
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        azar = random.Random(options['semilla'])
+        por_producto = max(options['por_producto'], 1)
+        cantidad_productos = max(options['presentaciones'] // por_producto, 1)
+
+        indice = IndiceBusqueda()
+        productos = []
+        inicio = time.perf_counter()
+        for pk in range(1, cantidad_productos + 1):
+            nombre = f'{azar.choice(TIPOS)} {azar.choice(MARCAS)} {azar.choice(VARIANTES)} {azar.randint(100, 3000)}'
+            codigos = [str(azar.randrange(10 ** 12, 10 ** 13)) for _ in range(por_producto)]
+            indice.agregar(pk, nombre, azar.choice(CATEGORIAS), codigos)
+            productos.append((nombre, codigos))
+        # sin base de datos: el índice se da por construido en la versión 0
+        # (y, como en reconstruir(), queda fuera del recolector de ciclos)
+        indice.version = 0
+        indice._verificado = float('inf')
+        gc.freeze()
+        construccion = time.perf_counter() - inicio
+
+        consultas = []
+        for _ in range(options['consultas']):
+            nombre, codigos = azar.choice(productos)
+            palabras = nombre.lower().replace('é', 'e').split()
+            consultas.append(azar.choice([
+                azar.choice(palabras)[:azar.randint(2, 6)],
+                ' '.join(palabras[:2]),
+                azar.choice(codigos),
+                azar.choice(codigos)[:6],
+                azar.choice(palabras)[1:5],
+            ]))
+
+        tiempos = []
+        resultados = 0
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            resultados += len(indice.buscar(consulta, limite=50))
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+
+        self.stdout.write(f'Productos: {cantidad_productos}  Presentaciones: {cantidad_productos * por_producto}')
+        self.stdout.write(f'Construcción: {construccion:.2f} s')
+        self.stdout.write(
+            f'Consultas: {len(tiempos)}  '
+            f'p50 {statistics.median(tiempos):.3f} ms  '
+            f'p95 {tiempos[int(len(tiempos) * 0.95) - 1]:.3f} ms  '
+            f'máx {tiempos[-1]:.3f} ms  '
+            f'(promedio {resultados / len(tiempos):.1f} resultados)'
+        )
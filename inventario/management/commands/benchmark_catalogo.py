@@ -0,0 +1,99 @@
+import gc
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core.benchmark import MARCAS, TIPOS, VARIANTES
+from inventario.catalogo import CAMPOS_POS, CAMPOS_SNAPSHOT, CatalogoPOS, _serializar
+
+
+def _medir(funcion):
+    """``(resultado, segundos, bytes retenidos, pico de bytes)``."""
+    gc.collect()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    del resultado
+    # la memoria se mide aparte: tracemalloc multiplica los tiempos
+    gc.collect()
+    tracemalloc.start()
+    resultado = funcion()
+    retenidos, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, retenidos, pico
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el catálogo POS en memoria con el armado de dicts por petición '
+        '(tiempo y memoria), con datos sintéticos y sin tocar la base.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--presentaciones', type=int, default=100_000)
+        parser.add_argument('--por-producto', type=int, default=2, help='Presentaciones por producto.')
+        parser.add_argument('--cambios', type=int, default=100, help='Filas de cada puesta al día.')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        azar = random.Random(options['semilla'])
+        por_producto = max(options['por_producto'], 1)
+        filas = []
+        for pk in range(1, options['presentaciones'] + 1):
+            if (pk - 1) % por_producto == 0:
+                # cada fila trae su propia copia del nombre, como la base
+                producto = f'{azar.choice(TIPOS)} {azar.choice(MARCAS)} {azar.choice(VARIANTES)} {azar.randint(100, 3000)}'
+            filas.append((
+                pk, str(10 ** 12 + pk), f'Formato {azar.randint(1, 6)}', ''.join(producto),
+                'UNITARIO', 'UNIDAD', Decimal('1.000'), Decimal(azar.randint(0, 500)).quantize(Decimal('0.001')),
+                Decimal(azar.randint(300, 9000)).quantize(Decimal('0.01')), 1,
+            ))
+
+        # Antes: cada petición arma dicts desde las filas de .values() y los
+        # pasa a listas; nada queda entre peticiones.
+        def por_peticion():
+            return [
+                [datos[campo] for campo in CAMPOS_SNAPSHOT]
+                for datos in (_serializar(dict(zip(CAMPOS_POS, fila))) for fila in filas)
+            ]
+
+        anterior, tiempo_anterior, memoria_anterior, pico_anterior = _medir(por_peticion)
+        del anterior
+
+        catalogo = CatalogoPOS()
+        _, tiempo_carga, memoria_catalogo, _ = _medir(lambda: catalogo.cargar(iter(filas), 1))
+        snapshot, tiempo_filas, _, _ = _medir(catalogo.filas)
+        del snapshot
+
+        cambios = [
+            fila[:7] + (fila[7] - 1, fila[8], 2)
+            for fila in azar.sample(filas, min(options['cambios'], len(filas)))
+        ]
+        inicio = time.perf_counter()
+        with catalogo._lock:
+            for fila in cambios:
+                catalogo._poner(fila)
+        tiempo_cambios = time.perf_counter() - inicio
+
+        codigos = [fila[1] for fila in azar.sample(filas, min(10_000, len(filas)))]
+        inicio = time.perf_counter()
+        for codigo in codigos:
+            catalogo.por_codigo(codigo, float('inf'))
+        tiempo_codigo = (time.perf_counter() - inicio) / len(codigos)
+
+        mb = 1024 * 1024
+        self.stdout.write(f'Presentaciones: {len(filas)}')
+        self.stdout.write(
+            f'Antes, por petición: {tiempo_anterior * 1000:.0f} ms armando dicts, '
+            f'{memoria_anterior / mb:.1f} MB de resultado (pico {pico_anterior / mb:.1f} MB)'
+        )
+        self.stdout.write(
+            f'Catálogo en memoria: carga {tiempo_carga * 1000:.0f} ms una vez, '
+            f'{memoria_catalogo / mb:.1f} MB residentes por proceso'
+        )
+        self.stdout.write(f'  snapshot completo desde las columnas: {tiempo_filas * 1000:.0f} ms')
+        self.stdout.write(f'  puesta al día de {len(cambios)} filas: {tiempo_cambios * 1000:.2f} ms')
+        self.stdout.write(f'  búsqueda por código: {tiempo_codigo * 1e6:.2f} µs')
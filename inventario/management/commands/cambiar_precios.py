@@ -0,0 +1,86 @@
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.importacion import ImportacionInvalida
+from inventario.models import Categoria, Producto
+from inventario.precios import CambioPrecioInvalido, cambiar_precios, leer_codigos, presentaciones_de
+
+
+def _decimal(valor):
+    try:
+        return Decimal(valor.replace(',', '.'))
+    except InvalidOperation:
+        raise CommandError(f'Número inválido: {valor}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Cambia en bloque los precios de las presentaciones de una categoría, un producto '
+        'o una lista de códigos de barra (XLSX o CSV con la columna codigo_barra).'
+    )
+
+    def add_arguments(self, parser):
+        seleccion = parser.add_mutually_exclusive_group(required=True)
+        seleccion.add_argument('--categoria', help='Nombre de la categoría.')
+        seleccion.add_argument('--producto', type=int, help='Id del producto.')
+        seleccion.add_argument('--codigos', help='Archivo con los códigos de barra.')
+        cambio = parser.add_mutually_exclusive_group(required=True)
+        cambio.add_argument('--porcentaje', type=_decimal, help='Por ciento a sumar; negativo para bajar.')
+        cambio.add_argument('--monto', type=_decimal, help='Pesos a sumar; negativo para bajar.')
+        parser.add_argument('--precio', choices=['venta', 'compra', 'ambos'], default='venta')
+        parser.add_argument('--usuario', required=True, help='Username que registra el cambio.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa cuántas presentaciones cambiarían.')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['usuario']}.")
+
+        codigos = None
+        if options['categoria']:
+            categorias = Categoria.objects.filter(nombre=options['categoria'])
+            if not categorias.exists():
+                raise CommandError(f"No existe la categoría {options['categoria']}.")
+            presentaciones = presentaciones_de(categorias=categorias)
+            descripcion = f"categoría {options['categoria']}"
+        elif options['producto']:
+            producto = Producto.objects.filter(pk=options['producto']).first()
+            if producto is None:
+                raise CommandError(f"No existe el producto {options['producto']}.")
+            presentaciones = presentaciones_de(productos=[producto])
+            descripcion = f'producto {producto}'
+        else:
+            try:
+                with open(options['codigos'], 'rb') as archivo:
+                    codigos = leer_codigos(archivo, options['codigos'])
+            except (OSError, ImportacionInvalida) as exc:
+                raise CommandError(str(exc))
+            presentaciones = presentaciones_de(codigos=codigos)
+            descripcion = options['codigos']
+
+        try:
+            resultado = cambiar_precios(
+                presentaciones,
+                usuario,
+                precio=options['precio'],
+                porcentaje=options['porcentaje'],
+                monto=options['monto'],
+                descripcion=descripcion,
+                codigos=codigos,
+                simular=options['dry_run'],
+            )
+        except CambioPrecioInvalido as exc:
+            raise CommandError(str(exc))
+
+        for codigo in resultado.rechazadas:
+            self.stdout.write(f'{codigo}: quedaría con precio de venta menor al de compra o fuera de rango.')
+        if resultado.total_rechazadas > len(resultado.rechazadas):
+            self.stdout.write(f'... y {resultado.total_rechazadas - len(resultado.rechazadas)} rechazada(s) más.')
+        for codigo in resultado.no_encontrados:
+            self.stdout.write(f'{codigo}: código de barra no encontrado.')
+
+        verbo = 'cambiaría(n)' if options['dry_run'] else 'actualizada(s)'
+        self.stdout.write(self.style.SUCCESS(f'{resultado.actualizadas} presentación(es) {verbo}.'))
@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.importacion import ImportacionInvalida, importar_ingreso
+
+
+class Command(BaseCommand):
+    help = 'Importa un ingreso de stock desde un archivo XLSX o CSV (columnas codigo_barra y cantidad).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--usuario', required=True, help='Username que registra el ingreso.')
+        parser.add_argument('--observacion')
+        parser.add_argument(
+            '--omitir-errores',
+            action='store_true',
+            help='Importa las filas válidas aunque otras tengan errores.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['usuario']}.")
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar_ingreso(
+                    archivo,
+                    options['archivo'],
+                    usuario,
+                    observacion=options['observacion'],
+                    omitir_errores=options['omitir_errores'],
+                )
+        except (OSError, ImportacionInvalida) as exc:
+            raise CommandError(str(exc))
+
+        for fila, mensaje in resultado.errores:
+            self.stdout.write(f'Fila {fila}: {mensaje}')
+        if resultado.total_errores > len(resultado.errores):
+            self.stdout.write(f'... y {resultado.total_errores - len(resultado.errores)} error(es) más.')
+
+        if resultado.ingreso is None:
+            raise CommandError('No se importó ninguna fila.')
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.ingreso}: {resultado.filas_importadas} fila(s) importada(s).'
+        ))
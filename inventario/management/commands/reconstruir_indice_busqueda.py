@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventario.busqueda import indice_productos
+from inventario.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos y lo verifica con una consulta opcional.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consulta', help='Búsqueda de prueba a ejecutar sobre el índice reconstruido.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        indice_productos.reconstruir()
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruido: {len(indice_productos)} productos '
+            f'(versión de catálogo {indice_productos.version}) en {duracion:.2f} s.'
+        ))
+
+        if options['consulta']:
+            inicio = time.perf_counter()
+            ids = indice_productos.buscar(options['consulta'], limite=20)
+            duracion = time.perf_counter() - inicio
+            nombres = Producto.objects.in_bulk(ids)
+            self.stdout.write(f'{len(ids)} resultado(s) en {duracion * 1000:.2f} ms:')
+            for pk in ids:
+                self.stdout.write(f'  {nombres[pk]}' if pk in nombres else f'  #{pk}')
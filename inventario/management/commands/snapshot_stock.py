@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from inventario.services import tomar_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Guarda el saldo de stock de cada presentación a una fecha de corte.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corte',
+            help='Fecha y hora de corte (ISO 8601). Por defecto, hace un minuto.',
+        )
+
+    def handle(self, *args, **options):
+        corte = None
+        if options['corte']:
+            corte = parse_datetime(options['corte'])
+            if corte is None:
+                self.stderr.write(self.style.ERROR('Fecha de corte inválida.'))
+                return
+            if timezone.is_naive(corte):
+                corte = timezone.make_aware(corte)
+
+        creados = tomar_snapshots(corte)
+        self.stdout.write(self.style.SUCCESS(f'{creados} snapshot(s) de stock creados.'))
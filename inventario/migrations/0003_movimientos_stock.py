@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-18 17:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def saldos_iniciales(apps, schema_editor):
+    Presentacion = apps.get_model('inventario', 'Presentacion')
+    MovimientoStock = apps.get_model('inventario', 'MovimientoStock')
+    MovimientoStock.objects.bulk_create(
+        [
+            MovimientoStock(
+                presentacion_id=pk,
+                tipo='AJUSTE',
+                cantidad=stock_base,
+                observacion='Saldo inicial',
+            )
+            for pk, stock_base in Presentacion.objects.exclude(stock_base=0).values_list('pk', 'stock_base')
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0002_catalogo_version'),
+        ('ventas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('VENTA', 'Venta'), ('INGRESO', 'Ingreso de Stock'), ('AJUSTE', 'Ajuste')], max_length=10)),
+                ('cantidad', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('observacion', models.CharField(blank=True, max_length=200, null=True)),
+                ('ingreso', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos_stock', to='inventario.ingresostock')),
+                ('presentacion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='inventario.presentacion')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos_stock', to='ventas.venta')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['presentacion', 'fecha'], name='inventario__present_0900ef_idx'), models.Index(fields=['fecha'], name='inventario__fecha_87302d_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock_base', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('presentacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots_stock', to='inventario.presentacion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['presentacion', 'fecha'], name='inventario__present_771606_idx')],
+            },
+        ),
+        migrations.RunPython(saldos_iniciales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_libro_borrar_presentacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='version_catalogo',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
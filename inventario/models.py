@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Categoria(models.Model):
@@ -38,9 +39,20 @@ class Producto(models.Model):
     )
     stock_minimo = models.DecimalField(max_digits=10, decimal_places=3)
 
+    # Versión del catálogo en la que cambió el producto o su categoría; con
+    # ella el índice de búsqueda de otros procesos ve los productos sin
+    # presentaciones y los cambios de categoría (ver inventario.busqueda).
+    version_catalogo = models.BigIntegerField(default=0, editable=False, db_index=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # paginación por cursor de producto_list
+            models.Index(fields=['nombre', 'id'], name='producto_nombre_id_idx'),
+        ]
+
     def __str__(self):
         return self.nombre
 
@@ -83,6 +95,10 @@ class Presentacion(models.Model):
     precio_venta = models.DecimalField(max_digits=10, decimal_places=2)
     margen_ganancia = models.DecimalField(max_digits=10, decimal_places=2, editable=False, default=0)
 
+    # Versión del catálogo en la que cambió esta fila por última vez
+    # (ver inventario.catalogo.siguiente_version).
+    version_catalogo = models.BigIntegerField(default=0, editable=False, db_index=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -95,6 +111,23 @@ class Presentacion(models.Model):
         return f"{self.producto.nombre} - {self.nombre}"
 
 
+class CatalogoVersion(models.Model):
+    """Contador único y creciente de cambios del catálogo POS (fila pk=1)."""
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Catálogo v{self.valor}"
+
+
+class PresentacionBaja(models.Model):
+    """Presentación eliminada, para informarla en la sincronización por deltas."""
+    presentacion_id = models.BigIntegerField()
+    version_catalogo = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"Baja {self.presentacion_id} (v{self.version_catalogo})"
+
+
 class IngresoStock(models.Model):
     fecha = models.DateTimeField(auto_now_add=True)
     usuario = models.ForeignKey(
@@ -121,3 +154,83 @@ class IngresoStockDetalle(models.Model):
 
     def __str__(self):
         return f"{self.presentacion} +{self.cantidad_base}"
+
+
+class MovimientoStock(models.Model):
+    """
+    Libro de movimientos de stock, solo de inserción. ``Presentacion.stock_base``
+    es el saldo materializado de estos movimientos.
+    """
+
+    TIPO_CHOICES = [
+        ('VENTA', 'Venta'),
+        ('INGRESO', 'Ingreso de Stock'),
+        ('AJUSTE', 'Ajuste'),
+    ]
+
+    # Borrar una presentación borra su libro: las que se vendieron o
+    # recibieron ingresos siguen protegidas por VentaDetalle e
+    # IngresoStockDetalle, así que solo se pierden ajustes (el saldo
+    # inicial) de una presentación que nunca se movió.
+    presentacion = models.ForeignKey(
+        Presentacion,
+        on_delete=models.CASCADE,
+        related_name='movimientos'
+    )
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    # Positiva para entradas, negativa para salidas (en unidades de stock_base).
+    cantidad = models.DecimalField(max_digits=10, decimal_places=3)
+    fecha = models.DateTimeField(default=timezone.now)
+    usuario = models.ForeignKey(
+        'auth.User',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True
+    )
+    venta = models.ForeignKey(
+        'ventas.Venta',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='movimientos_stock'
+    )
+    ingreso = models.ForeignKey(
+        IngresoStock,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='movimientos_stock'
+    )
+    observacion = models.CharField(max_length=200, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['presentacion', 'fecha']),
+            models.Index(fields=['fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.presentacion_id} {self.cantidad:+}"
+
+
+class SnapshotStock(models.Model):
+    """
+    Saldo de una presentación a una fecha de corte. Permite calcular el stock
+    a una fecha o auditar ``stock_base`` reproduciendo solo los movimientos
+    posteriores al último snapshot.
+    """
+    presentacion = models.ForeignKey(
+        Presentacion,
+        on_delete=models.CASCADE,
+        related_name='snapshots_stock'
+    )
+    fecha = models.DateTimeField()
+    stock_base = models.DecimalField(max_digits=10, decimal_places=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['presentacion', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.presentacion_id} @ {self.fecha}: {self.stock_base}"
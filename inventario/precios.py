@@ -0,0 +1,169 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Value
+from django.db.models.functions import Round
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+from django.utils import timezone
+
+from auditoria import registro as auditoria
+
+from . import catalogo
+from .importacion import COLUMNAS_CODIGO, ImportacionInvalida, _indice_columna, leer_filas
+from .models import Presentacion
+
+
+# =========================
+# CAMBIO MASIVO DE PRECIOS
+# =========================
+# Aplica un porcentaje o un monto fijo a los precios de muchas
+# presentaciones sin traerlas a memoria: un UPDATE calcula los precios
+# nuevos con expresiones sobre las columnas y otro rehace margen_ganancia.
+# La regla precio_venta >= precio_compra va en el WHERE del primero, así
+# una fila que la rompería no se toca; esas filas se informan como
+# rechazadas. Queda un solo evento de auditoría por cambio.
+
+PRECIOS = {
+    'venta': ('precio_venta',),
+    'compra': ('precio_compra',),
+    'ambos': ('precio_venta', 'precio_compra'),
+}
+
+MAX_RECHAZADAS_REPORTADAS = 500
+# Presentacion.precio_*: max_digits=10, decimal_places=2
+PRECIO_MAXIMO = Decimal('100000000')
+
+CAMPO_PRECIO = DecimalField(max_digits=10, decimal_places=2)
+
+
+class CambioPrecioInvalido(Exception):
+    pass
+
+
+class ResultadoCambioPrecios:
+    def __init__(self):
+        self.actualizadas = 0
+        self.total_rechazadas = 0
+        # códigos de barra de las primeras MAX_RECHAZADAS_REPORTADAS filas
+        # que quedarían con un precio inválido
+        self.rechazadas = []
+        # códigos de la lista que no existen en el catálogo
+        self.no_encontrados = []
+
+
+def _nuevo_precio(campo, porcentaje, monto):
+    if porcentaje is not None:
+        factor = Value((Decimal('100') + porcentaje) / Decimal('100'), output_field=CAMPO_PRECIO)
+        return Round(F(campo) * factor, 2, output_field=CAMPO_PRECIO)
+    return F(campo) + Value(monto, output_field=CAMPO_PRECIO)
+
+
+def presentaciones_de(categorias=None, productos=None, codigos=None):
+    """Presentaciones de las categorías, productos o códigos de barra indicados."""
+    condicion = Q()
+    if categorias is not None:
+        condicion |= Q(producto__categoria__in=categorias)
+    if productos is not None:
+        condicion |= Q(producto__in=productos)
+    if codigos is not None:
+        condicion |= Q(codigo_barra__in=codigos)
+    if not condicion:
+        raise CambioPrecioInvalido('Indique categorías, productos o códigos de barra.')
+    return Presentacion.objects.filter(condicion)
+
+
+def leer_codigos(archivo, nombre):
+    """Códigos de barra de un archivo XLSX o CSV con la columna ``codigo_barra``."""
+    filas = leer_filas(archivo, nombre)
+    try:
+        encabezado = next(filas)
+    except StopIteration:
+        raise ImportacionInvalida('El archivo está vacío.')
+    columna = _indice_columna(encabezado, COLUMNAS_CODIGO)
+    if columna is None:
+        raise ImportacionInvalida('El encabezado debe tener la columna codigo_barra.')
+
+    codigos = []
+    for fila in filas:
+        valor = fila[columna] if fila and columna < len(fila) else None
+        if isinstance(valor, float) and valor.is_integer():
+            # Excel guarda los códigos numéricos como float.
+            valor = int(valor)
+        codigo = str(valor).strip() if valor is not None else ''
+        if codigo:
+            codigos.append(codigo)
+    return list(dict.fromkeys(codigos))
+
+
+def cambiar_precios(presentaciones, usuario, precio='venta', porcentaje=None, monto=None,
+                    descripcion='', codigos=None, simular=False):
+    """
+    Suma ``porcentaje`` (por ciento) o ``monto`` (en pesos, puede ser
+    negativo) a ``precio`` ('venta', 'compra' o 'ambos') de las
+    ``presentaciones`` y recalcula su margen, todo en la base.
+
+    Las filas que quedarían con precio de venta menor al de compra, con un
+    precio negativo o fuera de rango no se modifican y se cuentan en
+    ``rechazadas``. Si se pasa la lista de ``codigos`` con la que se armó
+    la selección, se informan también los que no existen. ``descripcion``
+    nombra la selección en el evento de auditoría. Con ``simular`` solo
+    cuenta.
+    """
+    if precio not in PRECIOS:
+        raise CambioPrecioInvalido(f'Precio desconocido: {precio}')
+    if (porcentaje is None) == (monto is None):
+        raise CambioPrecioInvalido('Indique un porcentaje o un monto, no ambos.')
+    if porcentaje is not None and porcentaje <= -100:
+        raise CambioPrecioInvalido('El porcentaje debe ser mayor a -100.')
+
+    nuevos = {campo: _nuevo_precio(campo, porcentaje, monto) for campo in PRECIOS[precio]}
+    venta = nuevos.get('precio_venta', F('precio_venta'))
+    compra = nuevos.get('precio_compra', F('precio_compra'))
+    validas = Q(GreaterThanOrEqual(venta, compra)) & Q(GreaterThanOrEqual(compra, 0))
+    for expresion in nuevos.values():
+        validas &= Q(LessThan(expresion, PRECIO_MAXIMO))
+
+    resultado = ResultadoCambioPrecios()
+    if codigos is not None:
+        existentes = set(
+            Presentacion.objects.filter(codigo_barra__in=codigos).values_list('codigo_barra', flat=True)
+        )
+        resultado.no_encontrados = [codigo for codigo in codigos if codigo not in existentes]
+
+    with transaction.atomic():
+        rechazadas = presentaciones.exclude(validas).order_by('codigo_barra').values_list('codigo_barra', flat=True)
+        resultado.rechazadas = list(rechazadas[:MAX_RECHAZADAS_REPORTADAS])
+        resultado.total_rechazadas = len(resultado.rechazadas)
+        if resultado.total_rechazadas == MAX_RECHAZADAS_REPORTADAS:
+            resultado.total_rechazadas = rechazadas.count()
+        if simular:
+            resultado.actualizadas = presentaciones.filter(validas).count()
+            return resultado
+
+        # La versión nueva marca las filas de este cambio: nadie más puede
+        # tomarla hasta el commit, porque el contador queda bloqueado.
+        version = catalogo.siguiente_version()
+        resultado.actualizadas = presentaciones.filter(validas).update(
+            **nuevos,
+            version_catalogo=version,
+            updated_at=timezone.now(),
+        )
+        if not resultado.actualizadas:
+            return resultado
+        cambiadas = Presentacion.objects.filter(version_catalogo=version)
+        # En otra sentencia: MySQL evalúa el SET de izquierda a derecha con
+        # los valores ya asignados, SQLite y PostgreSQL con los anteriores.
+        cambiadas.update(margen_ganancia=F('precio_venta') - F('precio_compra'))
+        ids = list(cambiadas.values_list('pk', flat=True))
+
+        # update() no emite señales: el catálogo cacheado se descarta a mano.
+        transaction.on_commit(lambda: catalogo.invalidar(ids))
+        cambio = f'{porcentaje:+}%' if porcentaje is not None else f'{monto:+} pesos'
+        texto = f'Precio de {precio} {cambio}'
+        if descripcion:
+            texto += f' en {descripcion}'
+        texto += f': {resultado.actualizadas} presentación(es)'
+        if resultado.total_rechazadas:
+            texto += f', {resultado.total_rechazadas} rechazada(s)'
+        auditoria.registrar(usuario, 'CAMBIO_PRECIOS', texto[:255])
+    return resultado
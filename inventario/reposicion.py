@@ -0,0 +1,165 @@
+import datetime
+import math
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import DateTimeField, F, FloatField, Func, IntegerField, Min, Q, Sum, Value
+from django.utils import timezone
+
+from ventas.models import ResumenHoraPresentacion
+from .models import Presentacion
+
+
+# =========================
+# SUGERENCIAS DE REPOSICIÓN
+# =========================
+# El consumo de cada presentación sale del resumen por hora de ventas (la
+# suma de VentaDetalle.cantidad_base, en unidades base). Una sola consulta
+# agrupada trae, por presentación, las sumas que necesita una regresión
+# lineal del consumo diario (Σy, Σx·y y el primer día con ventas) y el
+# total de la ventana reciente; el resto es aritmética sobre esas columnas,
+# sin consultas ni series por producto:
+#
+# - consumo reciente: promedio diario de los últimos REPOSICION_VENTANA días;
+# - tendencia: pendiente por mínimos cuadrados del consumo diario desde la
+#   primera venta del período (antes no existía, no es consumo cero);
+# - consumo proyectado: el reciente llevado con la tendencia hasta la mitad
+#   del horizonte (plazo de reposición + días de cobertura buscados).
+#
+# La sugerencia es lo que falta para cubrir el horizonte, en presentaciones
+# enteras (unidades base / Presentacion.cantidad_base).
+
+# con menos días de historia la pendiente es puro ruido
+DIAS_MINIMOS_TENDENCIA = 14
+
+
+Sugerencia = namedtuple('Sugerencia', [
+    'presentacion_id',
+    'codigo_barra',
+    'producto',
+    'presentacion',
+    'stock',
+    'consumo_reciente',
+    'tendencia',
+    'consumo_diario',
+    'dias_cobertura',
+    'sugerido',
+])
+
+
+def _parametro(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+class DiasDesde(Func):
+    """Días completos de ``inicio`` a la expresión, según el motor."""
+
+    output_field = IntegerField()
+    template = 'FLOOR(EXTRACT(EPOCH FROM (%(expressions)s)) / 86400)'
+    arg_joiner = ' - '
+
+    def __init__(self, expression, inicio, **extra):
+        super().__init__(expression, Value(inicio, output_field=DateTimeField()), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)', arg_joiner=') - julianday(',
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        copia = self.copy()
+        copia.set_source_expressions(self.get_source_expressions()[::-1])
+        return copia.as_sql(
+            compiler, connection, template='TIMESTAMPDIFF(DAY, %(expressions)s)', arg_joiner=', ',
+            **extra_context,
+        )
+
+
+def consumos(dias, ventana, hasta=None):
+    """
+    ``{presentacion_id: (total de la ventana, total, Σ dia·unidades, primer
+    dia)}`` en unidades base, con ``dia`` contado desde el comienzo de los
+    ``dias`` de historia que terminan al inicio del día ``hasta`` (por
+    defecto, hoy). Las presentaciones sin ventas en el período no aparecen.
+    """
+    hasta = hasta or timezone.localdate()
+    fin = timezone.make_aware(datetime.datetime.combine(hasta, datetime.time.min))
+    inicio = fin - datetime.timedelta(days=dias)
+    filas = (
+        ResumenHoraPresentacion.objects
+        .filter(hora__gte=inicio, hora__lt=fin)
+        .values('presentacion_id')
+        .annotate(
+            reciente=Sum('unidades', filter=Q(hora__gte=fin - datetime.timedelta(days=ventana))),
+            total=Sum('unidades'),
+            momento=Sum(F('unidades') * DiasDesde('hora', inicio), output_field=FloatField()),
+            # el primer día sale de la hora mínima: comparar es más barato
+            # que calcular el día de cada fila otra vez
+            primera=Min('hora'),
+        )
+        .values_list('presentacion_id', 'reciente', 'total', 'momento', 'primera')
+        .order_by()
+    )
+    return {
+        pk: (float(reciente or 0), float(total), float(momento), (primera - inicio).days)
+        for pk, reciente, total, momento, primera in filas.iterator(chunk_size=5000)
+    }
+
+
+def calcular(presentaciones, consumos, dias, ventana, plazo, cobertura):
+    """
+    Una :class:`Sugerencia` por cada ``(id, codigo_barra, producto,
+    presentacion, cantidad_base, stock_base)`` de ``presentaciones``.
+    """
+    horizonte = plazo + cobertura
+    # del centro de la ventana reciente al centro del horizonte
+    adelanto = (ventana + horizonte) / 2
+
+    sugerencias = []
+    sin_ventas = (0.0, 0.0, 0.0, dias)
+    for pk, codigo, producto, nombre, cantidad_base, stock in presentaciones:
+        reciente, total, momento, primero = consumos.get(pk, sin_ventas)
+        stock = float(stock)
+        promedio = reciente / ventana
+        # Pendiente con x = 0..n-1 contando desde el primer día con ventas:
+        # Σ(x - x̄)·y = Σx·y - x̄·Σy, y Σ(x - x̄)² = n(n² - 1)/12.
+        n = dias - primero
+        tendencia = 0.0
+        if n >= DIAS_MINIMOS_TENDENCIA:
+            tendencia = (momento - primero * total - (n - 1) / 2 * total) / (n * (n * n - 1) / 12)
+        diario = max(0.0, promedio + tendencia * adelanto)
+        faltante = diario * horizonte - stock
+        sugerencias.append(Sugerencia(
+            presentacion_id=pk,
+            codigo_barra=codigo,
+            producto=producto,
+            presentacion=nombre,
+            stock=stock,
+            consumo_reciente=promedio,
+            tendencia=tendencia,
+            consumo_diario=diario,
+            dias_cobertura=stock / diario if diario else None,
+            sugerido=math.ceil(faltante / float(cantidad_base)) if faltante > 0 and cantidad_base else 0,
+        ))
+    return sugerencias
+
+
+def sugerencias(plazo=None, cobertura=None, hasta=None):
+    """
+    Sugerencias de todas las presentaciones, de la que menos días de stock
+    tiene a la que más (las que no se venden, al final).
+    """
+    plazo = _parametro('REPOSICION_PLAZO', 7) if plazo is None else plazo
+    cobertura = _parametro('REPOSICION_COBERTURA', 14) if cobertura is None else cobertura
+    dias = _parametro('REPOSICION_DIAS_HISTORIA', 365)
+    ventana = min(_parametro('REPOSICION_VENTANA', 28), dias)
+
+    por_presentacion = consumos(dias, ventana, hasta)
+    presentaciones = Presentacion.objects.values_list(
+        'id', 'codigo_barra', 'producto__nombre', 'nombre', 'cantidad_base', 'stock_base',
+    ).order_by()
+    resultado = calcular(presentaciones.iterator(chunk_size=5000), por_presentacion, dias, ventana, plazo, cobertura)
+    resultado.sort(key=lambda s: (s.dias_cobertura is None, s.dias_cobertura or 0, s.producto, s.presentacion))
+    return resultado
@@ -0,0 +1,162 @@
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import catalogo
+from .models import CatalogoVersion, MovimientoStock, Presentacion, SnapshotStock
+
+
+class _StockRechazado(Exception):
+    """Fuerza el rollback del savepoint cuando el UPDATE no cubre todas las filas."""
+
+
+def descontar_stock(requeridos):
+    """
+    Valida y descuenta el stock de varias presentaciones en un solo UPDATE.
+
+    ``requeridos`` mapea ``presentacion_id -> cantidad`` (en unidades de
+    ``stock_base``). El UPDATE solo toca las filas que tienen stock
+    suficiente, por lo que la comprobación y el descuento son atómicos frente
+    a otras ventas concurrentes. Si alguna presentación no alcanza, se
+    revierte todo y se devuelve un dict ``presentacion_id -> stock disponible``
+    con las que fallaron. Un dict vacío significa que el descuento se aplicó.
+
+    Quien llama registra los ``MovimientoStock`` correspondientes (ver
+    ``ventas.services.registrar_venta``).
+    """
+    requeridos = {pk: Decimal(cantidad) for pk, cantidad in requeridos.items()}
+    if not requeridos:
+        return {}
+
+    condicion = Q()
+    casos = []
+    for pk, cantidad in requeridos.items():
+        condicion |= Q(pk=pk, stock_base__gte=cantidad)
+        casos.append(When(pk=pk, then=F('stock_base') - cantidad))
+
+    try:
+        with transaction.atomic():
+            # El stock viaja en el snapshot del POS, así que cada venta sube la
+            # versión del catálogo: todas las terminales escriben esa fila.
+            catalogo.incrementar_version()
+            actualizadas = Presentacion.objects.filter(condicion).update(
+                stock_base=Case(*casos, output_field=DecimalField(max_digits=10, decimal_places=3)),
+                version_catalogo=Subquery(CatalogoVersion.objects.filter(pk=1).values('valor')),
+                updated_at=timezone.now(),
+            )
+            if actualizadas != len(requeridos):
+                raise _StockRechazado
+    except _StockRechazado:
+        pass
+    else:
+        # update() no emite post_save: el stock cacheado se descarta a mano.
+        transaction.on_commit(lambda: catalogo.invalidar(requeridos))
+        return {}
+
+    # Solo en el camino de error: averiguar qué presentaciones no alcanzaron.
+    disponibles = dict(
+        Presentacion.objects.filter(pk__in=requeridos).values_list('pk', 'stock_base')
+    )
+    faltantes = {
+        pk: disponibles.get(pk, Decimal('0'))
+        for pk, cantidad in requeridos.items()
+        if disponibles.get(pk, Decimal('0')) < cantidad
+    }
+    # Si otra transacción repuso stock entre el UPDATE y la lectura, se
+    # informa igualmente el rechazo sobre todas las líneas para que se reintente.
+    return faltantes or {pk: disponibles.get(pk, Decimal('0')) for pk in requeridos}
+
+
+CANTIDAD_STOCK = DecimalField(max_digits=10, decimal_places=3)
+
+
+def _sumar_stock(deltas):
+    """Suma ``deltas`` (presentacion_id -> cantidad) a stock_base en un UPDATE."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    catalogo.incrementar_version()
+    Presentacion.objects.filter(pk__in=deltas).update(
+        stock_base=Case(
+            *[When(pk=pk, then=F('stock_base') + delta) for pk, delta in deltas.items()],
+            output_field=CANTIDAD_STOCK,
+        ),
+        version_catalogo=Subquery(CatalogoVersion.objects.filter(pk=1).values('valor')),
+        updated_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: catalogo.invalidar(deltas))
+
+
+@transaction.atomic
+def aplicar_movimientos(movimientos):
+    """
+    Inserta los ``MovimientoStock`` dados y actualiza el saldo materializado
+    de sus presentaciones, con un INSERT y un UPDATE sin importar cuántos sean.
+    """
+    MovimientoStock.objects.bulk_create(movimientos)
+    deltas = {}
+    for movimiento in movimientos:
+        deltas[movimiento.presentacion_id] = deltas.get(movimiento.presentacion_id, Decimal('0')) + movimiento.cantidad
+    _sumar_stock(deltas)
+
+
+_INICIO = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def saldos_stock(hasta=None):
+    """
+    Presentaciones anotadas con ``saldo``: el último snapshot anterior a
+    ``hasta`` más los movimientos posteriores a ese snapshot (y anteriores a
+    ``hasta``, si se indica). Sin ``hasta`` reproduce hasta el presente.
+    """
+    snapshots = SnapshotStock.objects.filter(presentacion=OuterRef('pk'))
+    movimientos = MovimientoStock.objects.filter(presentacion=OuterRef('pk'))
+    if hasta is not None:
+        snapshots = snapshots.filter(fecha__lte=hasta)
+        movimientos = movimientos.filter(fecha__lte=hasta)
+    snapshots = snapshots.order_by('-fecha')
+
+    movimientos = (
+        movimientos
+        .filter(fecha__gt=Coalesce(OuterRef('snapshot_fecha'), Value(_INICIO)))
+        .values('presentacion')
+        .annotate(total=Sum('cantidad'))
+        .values('total')
+    )
+    cero = Value(Decimal('0'), output_field=CANTIDAD_STOCK)
+    return Presentacion.objects.annotate(
+        snapshot_fecha=Subquery(snapshots.values('fecha')[:1]),
+        snapshot_stock=Subquery(snapshots.values('stock_base')[:1]),
+    ).annotate(
+        saldo=Coalesce('snapshot_stock', cero) + Coalesce(Subquery(movimientos), cero),
+    )
+
+
+def stock_a_fecha(presentacion, fecha):
+    """Stock de la presentación en ``fecha`` según el libro de movimientos."""
+    return saldos_stock(hasta=fecha).values_list('saldo', flat=True).get(pk=presentacion.pk)
+
+
+def tomar_snapshots(corte=None):
+    """
+    Guarda el saldo de cada presentación a la fecha ``corte`` (por defecto,
+    hace un minuto, para no dejar fuera movimientos aún sin confirmar).
+    Devuelve la cantidad de snapshots creados.
+    """
+    if corte is None:
+        corte = timezone.now() - datetime.timedelta(minutes=1)
+    snapshots = [
+        SnapshotStock(presentacion_id=pk, fecha=corte, stock_base=saldo)
+        for pk, saldo in saldos_stock(hasta=corte).values_list('pk', 'saldo').iterator(chunk_size=2000)
+    ]
+    SnapshotStock.objects.bulk_create(snapshots, batch_size=1000)
+    return len(snapshots)
+
+
+def auditar_stock():
+    """Presentaciones cuyo ``stock_base`` no coincide con su libro de movimientos."""
+    return saldos_stock().exclude(saldo=F('stock_base'))
@@ -0,0 +1,134 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import catalogo
+from .busqueda import indice_productos
+from .models import Categoria, IngresoStockDetalle, MovimientoStock, Presentacion, PresentacionBaja, Producto
+from .services import aplicar_movimientos
+
+
+@receiver(pre_save, sender=Presentacion)
+@receiver(pre_save, sender=Producto)
+def versionar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.version_catalogo = catalogo.siguiente_version()
+
+
+@receiver(post_save, sender=Producto)
+def versionar_producto(sender, instance, created=False, raw=False, **kwargs):
+    # nombre y tipo_producto viajan en cada presentación del snapshot
+    if not created and not raw:
+        instance.presentaciones.update(version_catalogo=catalogo.siguiente_version())
+
+
+@receiver(post_delete, sender=Presentacion)
+def registrar_baja(sender, instance, **kwargs):
+    PresentacionBaja.objects.create(
+        presentacion_id=instance.pk,
+        version_catalogo=catalogo.siguiente_version(),
+    )
+
+
+@receiver(post_save, sender=Presentacion)
+@receiver(post_delete, sender=Presentacion)
+def invalidar_presentacion(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: catalogo.invalidar([pk]))
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_producto(sender, instance, **kwargs):
+    # El nombre y el tipo del producto viajan en cada presentación. Los ids
+    # se leen ahora: después del commit un producto borrado ya no tiene pk
+    # (y no puede tener presentaciones, las protege el FK).
+    if kwargs['signal'] is post_save:
+        ids = list(instance.presentaciones.values_list('pk', flat=True))
+        transaction.on_commit(lambda: catalogo.invalidar(ids))
+
+
+@receiver(post_save, sender=Presentacion)
+@receiver(post_delete, sender=Presentacion)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def reindexar_producto(sender, instance, **kwargs):
+    producto_id = instance.producto_id if sender is Presentacion else instance.pk
+    transaction.on_commit(lambda: indice_productos.actualizar_productos([producto_id]))
+
+
+@receiver(post_save, sender=Categoria)
+def reindexar_categoria(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        # update() no emite señales: la versión lleva el cambio a los demás procesos
+        instance.productos.update(version_catalogo=catalogo.siguiente_version())
+        transaction.on_commit(lambda: indice_productos.actualizar_productos(
+            instance.productos.values_list('pk', flat=True)
+        ))
+
+
+# =========================
+# LIBRO DE MOVIMIENTOS
+# =========================
+# Las ventas y las importaciones masivas escriben sus movimientos en bloque
+# desde sus servicios; estas señales cubren las ediciones sueltas (admin y
+# formularios) para que stock_base siga siendo el saldo del libro.
+
+def _cantidad_guardada(model, instance, campo):
+    if instance.pk is None:
+        return None
+    return model.objects.filter(pk=instance.pk).values_list(campo, flat=True).first()
+
+
+@receiver(pre_save, sender=Presentacion)
+def recordar_stock_anterior(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._stock_anterior = _cantidad_guardada(Presentacion, instance, 'stock_base')
+
+
+@receiver(post_save, sender=Presentacion)
+def registrar_ajuste(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    delta = instance.stock_base - (getattr(instance, '_stock_anterior', None) or 0)
+    if delta:
+        MovimientoStock.objects.create(
+            presentacion=instance,
+            tipo='AJUSTE',
+            cantidad=delta,
+            observacion='Saldo inicial' if created else 'Edición de la presentación',
+        )
+
+
+@receiver(pre_save, sender=IngresoStockDetalle)
+def recordar_ingreso_anterior(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._cantidad_anterior = _cantidad_guardada(IngresoStockDetalle, instance, 'cantidad_base')
+
+
+@receiver(post_save, sender=IngresoStockDetalle)
+def registrar_ingreso(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_cantidad_anterior', None) or 0
+    delta = instance.cantidad_base - anterior
+    if delta:
+        aplicar_movimientos([MovimientoStock(
+            presentacion_id=instance.presentacion_id,
+            tipo='INGRESO' if created else 'AJUSTE',
+            cantidad=delta,
+            usuario_id=instance.ingreso.usuario_id,
+            ingreso_id=instance.ingreso_id,
+            observacion=None if created else f'Corrección del ingreso {instance.ingreso_id}',
+        )])
+
+
+@receiver(post_delete, sender=IngresoStockDetalle)
+def anular_ingreso(sender, instance, **kwargs):
+    aplicar_movimientos([MovimientoStock(
+        presentacion_id=instance.presentacion_id,
+        tipo='AJUSTE',
+        cantidad=-instance.cantidad_base,
+        ingreso_id=instance.ingreso_id,
+        observacion=f'Anulación de línea del ingreso {instance.ingreso_id}',
+    )])
@@ -1,3 +1,672 @@
-from django.test import TestCase
+import datetime
+import io
+import math
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import ProtectedError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from auditoria.models import Actividad
+from core.pruebas import PresupuestoConsultasMixin
+
+from . import busqueda, catalogo, importacion, precios, reposicion
+from .busqueda import indice_productos
+from .models import (
+    Categoria,
+    IngresoStock,
+    IngresoStockDetalle,
+    MovimientoStock,
+    Presentacion,
+    PresentacionBaja,
+    Producto,
+    SnapshotStock,
+)
+from .services import auditar_stock, descontar_stock, stock_a_fecha, tomar_snapshots
+
+
+def crear_presentacion(codigo_barra='0001', stock_base='10', producto=None, **kwargs):
+    if producto is None:
+        categoria = Categoria.objects.create(nombre='Bebidas')
+        producto = Producto.objects.create(
+            nombre='Bebida',
+            categoria=categoria,
+            tipo_producto='UNITARIO',
+            unidad_base='UNIDAD',
+            stock_minimo=Decimal('1'),
+        )
+    datos = {
+        'nombre': 'Lata 350cc',
+        'unidad_venta': 'UNIDAD',
+        'cantidad_base': Decimal('1'),
+        'precio_compra': Decimal('500'),
+        'precio_venta': Decimal('800'),
+        'margen_ganancia': Decimal('300'),
+    }
+    datos.update(kwargs)
+    return Presentacion.objects.create(
+        producto=producto,
+        codigo_barra=codigo_barra,
+        stock_base=Decimal(stock_base),
+        **datos
+    )
+
+
+class DescontarStockTest(TestCase):
+    def setUp(self):
+        self.p1 = crear_presentacion('0001', stock_base='10')
+        self.p2 = crear_presentacion('0002', stock_base='3', producto=self.p1.producto)
+
+    def test_descuenta_todas_las_lineas_en_un_update(self):
+        # SAVEPOINT + versión del catálogo + UPDATE + RELEASE: un solo
+        # UPDATE de stock para todas las líneas
+        with self.assertNumQueries(4):
+            faltantes = descontar_stock({self.p1.id: Decimal('4'), self.p2.id: Decimal('3')})
+        self.assertEqual(faltantes, {})
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p1.stock_base, Decimal('6'))
+        self.assertEqual(self.p2.stock_base, Decimal('0'))
+
+    def test_rechaza_todo_si_una_linea_no_alcanza(self):
+        faltantes = descontar_stock({self.p1.id: Decimal('4'), self.p2.id: Decimal('5')})
+        self.assertEqual(faltantes, {self.p2.id: Decimal('3')})
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p1.stock_base, Decimal('10'))
+        self.assertEqual(self.p2.stock_base, Decimal('3'))
+
+    def test_presentacion_inexistente_falla(self):
+        faltantes = descontar_stock({self.p1.id: Decimal('1'), 999999: Decimal('1')})
+        self.assertEqual(faltantes, {999999: Decimal('0')})
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock_base, Decimal('10'))
+
+
+class DescontarStockConcurrenteTest(TransactionTestCase):
+    def test_ventas_concurrentes_no_sobrevenden(self):
+        presentacion = crear_presentacion(stock_base='25')
+        hilos = 40
+        resultados = []
+        barrera = threading.Barrier(hilos)
+
+        def vender():
+            try:
+                barrera.wait()
+                with transaction.atomic():
+                    faltantes = descontar_stock({presentacion.id: Decimal('1')})
+                resultados.append(not faltantes)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vender) for _ in range(hilos)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        presentacion.refresh_from_db()
+        self.assertEqual(len(resultados), hilos)
+        self.assertEqual(resultados.count(True), 25)
+        self.assertEqual(presentacion.stock_base, Decimal('0'))
+
+
+class PresentacionBuscarTest(PresupuestoConsultasMixin, TestCase):
+    def setUp(self):
+        catalogo.invalidar()
+        self.client.force_login(User.objects.create_user(username='cajero', password='x'))
+        self.presentacion = crear_presentacion('7801234', stock_base='10')
+        crear_presentacion('7809999', producto=self.presentacion.producto)
+        crear_presentacion('5550000', producto=self.presentacion.producto)
+
+    def test_busca_por_codigo(self):
+        resp = self.client.get(reverse('presentacion_buscar'), {'codigo': '7801234'})
+        self.assertEqual(resp.status_code, 200)
+        datos = resp.json()['presentacion']
+        self.assertEqual(datos['id'], self.presentacion.id)
+        self.assertEqual(datos['nombre'], 'Bebida - Lata 350cc')
+        self.assertEqual(datos['stock'], 10.0)
+
+    def test_codigo_inexistente(self):
+        resp = self.client.get(reverse('presentacion_buscar'), {'codigo': '000'})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_busca_por_prefijo(self):
+        resp = self.client.get(reverse('presentacion_buscar'), {'prefijo': '780'})
+        codigos = [r['codigo_barra'] for r in resp.json()['resultados']]
+        self.assertEqual(codigos, ['7801234', '7809999'])
+
+    def test_segunda_busqueda_sale_de_cache(self):
+        catalogo.buscar_por_codigo('7801234')
+        with self.assertNumQueries(0):
+            catalogo.buscar_por_codigo('7801234')
+
+    def test_post_save_invalida_la_cache(self):
+        catalogo.buscar_por_codigo('7801234')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.presentacion.precio_venta = Decimal('950')
+            self.presentacion.save()
+        self.assertEqual(catalogo.buscar_por_codigo('7801234')['precio_venta'], 950.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = self.presentacion.producto
+            producto.nombre = 'Gaseosa'
+            producto.save()
+        self.assertEqual(catalogo.buscar_por_codigo('7801234')['producto_nombre'], 'Gaseosa')
+
+    def test_descontar_stock_invalida_la_cache(self):
+        catalogo.buscar_por_codigo('7801234')
+        with self.captureOnCommitCallbacks(execute=True):
+            descontar_stock({self.presentacion.id: Decimal('4')})
+        self.assertEqual(catalogo.buscar_por_codigo('7801234')['stock'], 6.0)
+
+    def test_cache_acotada(self):
+        cache = catalogo.CacheLRU(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(len(cache), 2)
+
+
+class CatalogoSnapshotTest(PresupuestoConsultasMixin, TestCase):
+    def setUp(self):
+        # el catálogo en memoria sobrevive al rollback de cada test
+        catalogo.invalidar()
+        self.addCleanup(catalogo.invalidar)
+        self.client.force_login(User.objects.create_user(username='cajero', password='x'))
+        self.p1 = crear_presentacion('111', stock_base='10')
+        self.p2 = crear_presentacion('222', producto=self.p1.producto)
+
+    def _filas(self, datos):
+        return {fila[0]: dict(zip(datos['campos'], fila)) for fila in datos['filas']}
+
+    def test_snapshot_completo(self):
+        resp = self.client.get(reverse('catalogo_snapshot'))
+        datos = resp.json()
+        self.assertTrue(datos['completo'])
+        self.assertEqual(datos['version'], catalogo.version_actual())
+        self.assertEqual(set(self._filas(datos)), {self.p1.id, self.p2.id})
+        self.assertEqual(resp['ETag'], f'"catalogo-{datos["version"]}"')
+
+    def test_delta_solo_trae_lo_cambiado(self):
+        version = catalogo.version_actual()
+        descontar_stock({self.p1.id: Decimal('3')})
+        presentacion = crear_presentacion('333', producto=self.p1.producto)
+        baja_id = presentacion.id
+        presentacion.delete()
+
+        datos = self.client.get(reverse('catalogo_snapshot'), {'desde': version}).json()
+        self.assertFalse(datos['completo'])
+        filas = self._filas(datos)
+        self.assertEqual(set(filas), {self.p1.id})
+        self.assertEqual(filas[self.p1.id]['stock'], 7.0)
+        self.assertEqual(datos['bajas'], [baja_id])
+        self.assertTrue(PresentacionBaja.objects.filter(presentacion_id=baja_id).exists())
+
+    def test_cambio_de_nombre_de_producto_versiona_sus_presentaciones(self):
+        version = catalogo.version_actual()
+        producto = self.p1.producto
+        producto.nombre = 'Gaseosa'
+        producto.save()
+        datos = catalogo.snapshot(version)
+        self.assertEqual(len(datos['filas']), 2)
+        self.assertTrue(all(f[2].startswith('Gaseosa') for f in datos['filas']))
+
+    def test_catalogo_en_memoria_se_pone_al_dia_por_version(self):
+        baja = crear_presentacion('333', producto=self.p1.producto)
+        catalogo.snapshot()
+        version = catalogo.version_actual()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(catalogo.snapshot(version=version)['filas']), 3)
+            self.assertEqual(catalogo.buscar_por_codigo('222')['id'], self.p2.id)
+
+        # un update() no emite señales: lo trae la versión del catálogo
+        Presentacion.objects.filter(pk=self.p1.pk).update(
+            codigo_barra='112', precio_venta=Decimal('999'), version_catalogo=catalogo.siguiente_version(),
+        )
+        baja_id = baja.id
+        baja.delete()
+        datos = catalogo.snapshot(version)
+        self.assertEqual(datos['bajas'], [baja_id])
+        self.assertEqual([(f[0], f[1], f[7]) for f in datos['filas']], [(self.p1.id, '112', 999.0)])
+        self.assertEqual(len(catalogo.catalogo_pos), 2)
+        self.assertEqual(catalogo.buscar_por_codigo('112')['precio_venta'], 999.0)
+        self.assertIsNone(catalogo.catalogo_pos.por_codigo('111', 60)[1])
+
+        # dos presentaciones intercambian sus códigos entre refrescos
+        for pk, codigo in ((self.p1.pk, 'tmp'), (self.p2.pk, '112'), (self.p1.pk, '222')):
+            Presentacion.objects.filter(pk=pk).update(codigo_barra=codigo, version_catalogo=catalogo.siguiente_version())
+        catalogo.snapshot()
+        self.assertEqual(catalogo.catalogo_pos.por_codigo('222', 60)[1]['id'], self.p1.pk)
+        self.assertEqual(catalogo.catalogo_pos.por_codigo('112', 60)[1]['id'], self.p2.pk)
+        self.assertIsNone(catalogo.catalogo_pos.por_codigo('tmp', 60)[1])
+
+    def test_etag_sin_cambios_responde_304(self):
+        resp = self.client.get(reverse('catalogo_snapshot'))
+        resp = self.client.get(reverse('catalogo_snapshot'), HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+        self.p2.precio_venta = Decimal('990')
+        self.p2.save()
+        resp = self.client.get(reverse('catalogo_snapshot'), HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 200)
+
+
+class MovimientoStockTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bodega', password='x')
+        self.presentacion = crear_presentacion(stock_base='10')
+
+    def _saldo_libro(self):
+        return sum(self.presentacion.movimientos.values_list('cantidad', flat=True))
+
+    def test_alta_y_edicion_quedan_en_el_libro(self):
+        self.assertEqual(self._saldo_libro(), Decimal('10'))
+        self.presentacion.stock_base = Decimal('7')
+        self.presentacion.save()
+        self.assertEqual(self._saldo_libro(), Decimal('7'))
+        self.assertFalse(auditar_stock().exists())
+
+    def test_ingreso_suma_stock_y_registra_movimiento(self):
+        ingreso = IngresoStock.objects.create(usuario=self.user)
+        detalle = IngresoStockDetalle.objects.create(
+            ingreso=ingreso, presentacion=self.presentacion, cantidad_base=Decimal('5')
+        )
+        self.presentacion.refresh_from_db()
+        self.assertEqual(self.presentacion.stock_base, Decimal('15'))
+
+        detalle.cantidad_base = Decimal('6')
+        detalle.save()
+        detalle.delete()
+        self.presentacion.refresh_from_db()
+        self.assertEqual(self.presentacion.stock_base, Decimal('10'))
+        self.assertEqual(
+            list(ingreso.movimientos_stock.order_by('id').values_list('tipo', 'cantidad')),
+            [('INGRESO', Decimal('5')), ('AJUSTE', Decimal('1')), ('AJUSTE', Decimal('-6'))],
+        )
+        self.assertFalse(auditar_stock().exists())
+
+    def test_borrar_presentacion_sin_ventas_ni_ingresos(self):
+        # solo tiene el saldo inicial: se borra con su libro
+        self.presentacion.delete()
+        self.assertFalse(MovimientoStock.objects.exists())
+
+        recibida = crear_presentacion('0002', stock_base='0', producto=self.presentacion.producto)
+        IngresoStockDetalle.objects.create(
+            ingreso=IngresoStock.objects.create(usuario=self.user), presentacion=recibida, cantidad_base=Decimal('5'),
+        )
+        with self.assertRaises(ProtectedError):
+            recibida.delete()
+
+    def test_stock_a_fecha_usa_el_ultimo_snapshot(self):
+        ahora = timezone.now()
+        MovimientoStock.objects.filter(presentacion=self.presentacion).update(
+            fecha=ahora - datetime.timedelta(days=3)
+        )
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(presentacion=self.presentacion, tipo='VENTA', cantidad=Decimal('-2'),
+                            fecha=ahora - datetime.timedelta(days=2)),
+            MovimientoStock(presentacion=self.presentacion, tipo='VENTA', cantidad=Decimal('-3'),
+                            fecha=ahora - datetime.timedelta(hours=1)),
+        ])
+        Presentacion.objects.filter(pk=self.presentacion.pk).update(stock_base=Decimal('5'))
+
+        self.assertEqual(tomar_snapshots(ahora - datetime.timedelta(days=1)), 1)
+        self.assertEqual(SnapshotStock.objects.get().stock_base, Decimal('8'))
+
+        # Los movimientos anteriores al snapshot ya no se reproducen.
+        MovimientoStock.objects.filter(fecha__lt=ahora - datetime.timedelta(days=1)).update(cantidad=0)
+        self.assertEqual(stock_a_fecha(self.presentacion, ahora), Decimal('5'))
+        self.assertEqual(stock_a_fecha(self.presentacion, ahora - datetime.timedelta(hours=12)), Decimal('8'))
+        self.assertFalse(auditar_stock().exists())
+
+
+class ImportarIngresoTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bodega', password='x')
+        self.p1 = crear_presentacion('111', stock_base='10')
+        self.p2 = crear_presentacion('222', stock_base='0', producto=self.p1.producto)
+
+    def _csv(self, texto):
+        return io.BytesIO(texto.encode('utf-8'))
+
+    def test_importa_csv_en_lotes(self):
+        archivo = self._csv('codigo_barra;cantidad\n111;5\n222;2,5\n111;1\n')
+        with mock.patch.object(importacion, 'TAMANO_LOTE', 2):
+            resultado = importacion.importar_ingreso(archivo, 'ingreso.csv', self.user)
+
+        self.assertEqual(resultado.total_errores, 0)
+        self.assertEqual(resultado.filas_importadas, 3)
+        self.assertEqual(resultado.ingreso.detalles.count(), 3)
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p1.stock_base, Decimal('16'))
+        self.assertEqual(self.p2.stock_base, Decimal('2.5'))
+        self.assertFalse(auditar_stock().exists())
+
+    def test_errores_revierten_todo(self):
+        archivo = self._csv('codigo_barra,cantidad\n111,5\n999,1\n222,-1\n222,abc\n')
+        resultado = importacion.importar_ingreso(archivo, 'ingreso.csv', self.user)
+
+        self.assertIsNone(resultado.ingreso)
+        self.assertEqual([fila for fila, _ in resultado.errores], [3, 4, 5])
+        self.assertFalse(IngresoStock.objects.exists())
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock_base, Decimal('10'))
+
+    def test_omitir_errores_importa_las_filas_validas(self):
+        archivo = self._csv('codigo_barra,cantidad\n111,5\n999,1\n')
+        resultado = importacion.importar_ingreso(archivo, 'ingreso.csv', self.user, omitir_errores=True)
+
+        self.assertEqual(resultado.filas_importadas, 1)
+        self.assertEqual(resultado.total_errores, 1)
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock_base, Decimal('15'))
+
+    def test_importa_xlsx(self):
+        from openpyxl import Workbook
+
+        libro = Workbook(write_only=True)
+        hoja = libro.create_sheet()
+        hoja.append(['Codigo_Barra', 'Cantidad'])
+        hoja.append([222.0, 3])
+        archivo = io.BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+
+        resultado = importacion.importar_ingreso(archivo, 'ingreso.xlsx', self.user)
+        self.assertEqual(resultado.filas_importadas, 1)
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p2.stock_base, Decimal('3'))
+
+    def test_encabezado_invalido(self):
+        with self.assertRaises(importacion.ImportacionInvalida):
+            importacion.importar_ingreso(self._csv('a,b\n1,2\n'), 'ingreso.csv', self.user)
+
+    def test_archivos_ilegibles(self):
+        latin1 = io.BytesIO('codigo_barra,cantidad\nÑandú,5\n'.encode('latin-1'))
+        with self.assertRaisesMessage(importacion.ImportacionInvalida, 'UTF-8'):
+            importacion.importar_ingreso(latin1, 'ingreso.csv', self.user)
+        renombrado = self._csv('codigo_barra,cantidad\n111,5\n')
+        with self.assertRaisesMessage(importacion.ImportacionInvalida, '.xlsx'):
+            importacion.importar_ingreso(renombrado, 'ingreso.xlsx', self.user)
+        self.assertFalse(IngresoStock.objects.exists())
+
+        # en el admin se muestran como error del formulario, no como un 500
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+        archivo = self._csv('no es un libro')
+        archivo.name = 'ingreso.xlsx'
+        resp = self.client.post(reverse('admin:inventario_ingresostock_importar'), {'archivo': archivo})
+        self.assertContains(resp, 'El archivo no es un libro .xlsx válido.')
+
+    def test_vista_admin(self):
+        admin = User.objects.create_superuser(username='admin', password='x')
+        self.client.force_login(admin)
+        url = reverse('admin:inventario_ingresostock_importar')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        archivo = self._csv('codigo_barra,cantidad\n111,4\n')
+        archivo.name = 'ingreso.csv'
+        resp = self.client.post(url, {'archivo': archivo, 'observacion': 'Proveedor X'})
+        ingreso = IngresoStock.objects.get()
+        self.assertRedirects(resp, reverse('admin:inventario_ingresostock_change', args=[ingreso.pk]))
+        self.assertEqual(ingreso.observacion, 'Proveedor X')
+
+
+class CambioPreciosTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='x')
+        self.p1 = crear_presentacion('111')
+        self.p2 = crear_presentacion('222', producto=self.p1.producto, precio_compra=Decimal('700'))
+        otra = Categoria.objects.create(nombre='Lácteos')
+        self.leche = crear_presentacion('333', producto=Producto.objects.create(
+            nombre='Leche', categoria=otra, tipo_producto='UNITARIO', unidad_base='UNIDAD', stock_minimo=1,
+        ))
+        catalogo.invalidar()
+        self.addCleanup(catalogo.invalidar)
+
+    def _precios(self, presentacion):
+        presentacion.refresh_from_db()
+        return presentacion.precio_compra, presentacion.precio_venta, presentacion.margen_ganancia
+
+    def test_porcentaje_por_categoria_recalcula_margen_en_la_base(self):
+        version = catalogo.version_actual()
+        presentaciones = precios.presentaciones_de(categorias=[self.p1.producto.categoria])
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(8):
+                resultado = precios.cambiar_precios(
+                    presentaciones, self.user, porcentaje=Decimal('12.5'), descripcion='categoría Bebidas',
+                )
+
+        self.assertEqual(resultado.actualizadas, 2)
+        self.assertEqual(self._precios(self.p1), (Decimal('500'), Decimal('900'), Decimal('400')))
+        self.assertEqual(self._precios(self.p2), (Decimal('700'), Decimal('900'), Decimal('200')))
+        self.assertEqual(self._precios(self.leche)[1], Decimal('800'))
+        self.assertEqual(self.p1.version_catalogo, version + 1)
+        actividad = Actividad.objects.get(tipo_accion='CAMBIO_PRECIOS')
+        self.assertEqual(actividad.descripcion, 'Precio de venta +12.5% en categoría Bebidas: 2 presentación(es)')
+
+    def test_no_deja_precio_de_venta_bajo_el_de_compra(self):
+        presentaciones = precios.presentaciones_de(productos=[self.p1.producto])
+        resultado = precios.cambiar_precios(presentaciones, self.user, monto=Decimal('-200'))
+
+        self.assertEqual(resultado.actualizadas, 1)
+        self.assertEqual(resultado.rechazadas, ['222'])
+        self.assertEqual(self._precios(self.p1), (Decimal('500'), Decimal('600'), Decimal('100')))
+        self.assertEqual(self._precios(self.p2), (Decimal('700'), Decimal('800'), Decimal('300')))
+
+        resultado = precios.cambiar_precios(
+            presentaciones, self.user, precio='ambos', porcentaje=Decimal('10'), simular=True,
+        )
+        self.assertEqual(resultado.actualizadas, 2)
+        self.assertEqual(self._precios(self.p1)[1], Decimal('600'))
+
+    def test_accion_admin_por_categoria(self):
+        self.client.force_login(self.user)
+        url = reverse('admin:inventario_categoria_changelist')
+        datos = {'action': 'cambiar_precios', '_selected_action': [self.leche.producto.categoria_id]}
+        resp = self.client.post(url, datos)
+        self.assertContains(resp, 'Aplicar')
+
+        datos.update({'aplicar': '1', 'precio': 'compra', 'modo': 'monto', 'valor': '50'})
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(url, datos)
+        self.assertRedirects(resp, url)
+        self.assertEqual(self._precios(self.leche), (Decimal('550'), Decimal('800'), Decimal('250')))
+        self.assertEqual(self._precios(self.p1)[0], Decimal('500'))
+        self.assertEqual(Actividad.objects.filter(tipo_accion='CAMBIO_PRECIOS').count(), 1)
+
+    def test_vista_admin_con_lista_de_codigos(self):
+        self.client.force_login(self.user)
+        url = reverse('admin:inventario_presentacion_cambiar_precios')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        archivo = io.BytesIO(b'codigo_barra\n111\n333\n999\n')
+        archivo.name = 'lista.csv'
+        resp = self.client.post(url, {'archivo': archivo, 'precio': 'venta', 'modo': 'porcentaje', 'valor': '-10'})
+        self.assertRedirects(resp, reverse('admin:inventario_presentacion_changelist'))
+        self.assertEqual(self._precios(self.p1)[1], Decimal('720'))
+        self.assertEqual(self._precios(self.p2)[1], Decimal('800'))
+        self.assertEqual(self._precios(self.leche)[1], Decimal('720'))
+        mensajes = [str(m) for m in get_messages(resp.wsgi_request)]
+        self.assertIn('Códigos de barra no encontrados: 999', mensajes)
+
+    def test_lista_de_codigos_ilegible(self):
+        self.client.force_login(self.user)
+        archivo = io.BytesIO('codigo_barra\n111\nÑ\n'.encode('latin-1'))
+        archivo.name = 'lista.csv'
+        resp = self.client.post(
+            reverse('admin:inventario_presentacion_cambiar_precios'),
+            {'archivo': archivo, 'precio': 'venta', 'modo': 'porcentaje', 'valor': '10'},
+        )
+        self.assertContains(resp, 'UTF-8')
+
+        with tempfile.NamedTemporaryFile(suffix='.xlsx') as danado:
+            danado.write(b'PK\x03\x04basura')
+            danado.flush()
+            with self.assertRaisesMessage(CommandError, '.xlsx'):
+                call_command(
+                    'cambiar_precios', '--codigos', danado.name, '--monto', '10', '--usuario', 'admin',
+                    stdout=io.StringIO(),
+                )
+        self.assertEqual(self._precios(self.p1)[1], Decimal('800'))
+
+    def test_comando_simular(self):
+        salida = io.StringIO()
+        call_command(
+            'cambiar_precios', '--categoria', 'Lácteos', '--porcentaje', '5', '--usuario', 'admin', '--dry-run',
+            stdout=salida,
+        )
+        self.assertIn('1 presentación(es) cambiaría(n)', salida.getvalue())
+        self.assertEqual(self._precios(self.leche)[1], Decimal('800'))
+
+
+class BusquedaProductosTest(PresupuestoConsultasMixin, TestCase):
+    def setUp(self):
+        self.cafe = crear_presentacion(codigo_barra='7801000000001').producto
+        self.cafe.nombre = 'Café Molido'
+        self.cafe.save()
+        self.te = Producto.objects.create(
+            nombre='Té Cafetero',
+            categoria=self.cafe.categoria,
+            tipo_producto='UNITARIO',
+            unidad_base='UNIDAD',
+            stock_minimo=Decimal('1'),
+        )
+        crear_presentacion(codigo_barra='7801000000002', producto=self.te)
+        indice_productos.reconstruir()
+
+    def test_sin_tildes_y_por_relevancia(self):
+        self.assertEqual(indice_productos.buscar('CAFE'), [self.cafe.pk, self.te.pk])
+        self.assertEqual(indice_productos.buscar('te'), [self.te.pk])
+        # 'bebidas' es la categoría de ambos
+        self.assertEqual(indice_productos.buscar('molido bebidas'), [self.cafe.pk])
+        self.assertEqual(indice_productos.buscar('7801000000002'), [self.te.pk])
+        self.assertEqual(indice_productos.buscar('780100'), [self.cafe.pk, self.te.pk])
+        self.assertEqual(indice_productos.buscar('xyz'), [])
+
+    def test_por_niveles_coincide_con_puntaje(self):
+        for consulta in ('cafe', 'be', 'bebidas', 'feter', '0000'):
+            esperado = indice_productos.buscar(consulta)
+            with mock.patch.object(busqueda, 'UMBRAL_PUNTAJE', 0):
+                self.assertEqual(indice_productos.buscar(consulta), esperado, consulta)
+
+    def test_senales_actualizan_el_indice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.te.nombre = 'Té Verde'
+            self.te.save()
+        self.assertEqual(indice_productos.buscar('cafe'), [self.cafe.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_presentacion(codigo_barra='555', producto=self.te)
+        self.assertEqual(indice_productos.buscar('555'), [self.te.pk])
+
+        categoria = self.cafe.categoria
+        with self.captureOnCommitCallbacks(execute=True):
+            categoria.nombre = 'Almacén'
+            categoria.save()
+        self.assertEqual(indice_productos.buscar('almacen'), [self.cafe.pk, self.te.pk])
+
+    def test_eliminar_producto(self):
+        sin_presentaciones = Producto.objects.create(
+            nombre='Yerba Mate', categoria=self.cafe.categoria, tipo_producto='UNITARIO',
+            unidad_base='UNIDAD', stock_minimo=Decimal('1'),
+        )
+        self.client.force_login(User.objects.create_user(username='admin', password='x'))
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse('producto_delete', args=[sin_presentaciones.pk]))
+        self.assertRedirects(resp, reverse('producto_list'))
+        self.assertFalse(Producto.objects.filter(nombre='Yerba Mate').exists())
+        self.assertEqual(indice_productos.buscar('yerba'), [])
+
+    def test_cambios_de_otro_proceso_por_version(self):
+        # un update() no emite señales: se detecta por la versión del catálogo
+        Presentacion.objects.filter(codigo_barra='7801000000002').update(
+            codigo_barra='999',
+            version_catalogo=catalogo.siguiente_version(),
+        )
+        indice_productos._verificado = 0
+        self.assertEqual(indice_productos.buscar('999'), [self.te.pk])
+
+    def test_categoria_y_producto_sin_presentaciones_de_otro_proceso(self):
+        # sin ejecutar los on_commit: este índice solo ve el cambio por versión
+        categoria = self.cafe.categoria
+        categoria.nombre = 'Almacén'
+        categoria.save()
+        yerba = Producto.objects.create(
+            nombre='Yerba Mate', categoria=categoria, tipo_producto='UNITARIO',
+            unidad_base='UNIDAD', stock_minimo=Decimal('1'),
+        )
+        indice_productos._verificado = 0
+        self.assertEqual(indice_productos.buscar('yerba'), [yerba.pk])
+        self.assertEqual(indice_productos.buscar('almacen'), [self.cafe.pk, self.te.pk, yerba.pk])
+
+    def test_producto_list_usa_el_indice(self):
+        self.client.force_login(User.objects.create_user(username='admin', password='x'))
+        resp = self.client.get(reverse('producto_list'), {'nombre': 'cafe'})
+        self.assertEqual([p.pk for p in resp.context['productos']], [self.cafe.pk, self.te.pk])
+
+
+class ReposicionTest(PresupuestoConsultasMixin, TestCase):
+    def setUp(self):
+        from ventas.models import ResumenHoraPresentacion
+
+        self.user = User.objects.create_user(username='bodega', password='x')
+        self.client.force_login(self.user)
+        self.lata = crear_presentacion('5000', stock_base='10')
+        self.pack = crear_presentacion('5001', stock_base='10', producto=self.lata.producto, cantidad_base=Decimal('6'))
+        self.quieta = crear_presentacion('5002', stock_base='3', producto=self.lata.producto)
+
+        # lata: 2 unidades diarias parejas; pack: consumo creciente semana a semana
+        hoy = timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time(12)))
+        ResumenHoraPresentacion.objects.bulk_create([
+            ResumenHoraPresentacion(presentacion=self.lata, hora=hoy - datetime.timedelta(days=d), unidades=2)
+            for d in range(1, 57)
+        ] + [
+            ResumenHoraPresentacion(presentacion=self.pack, hora=hoy - datetime.timedelta(days=d), unidades=(60 - d) // 7)
+            for d in range(1, 57)
+        ])
+
+    def test_consumo_cobertura_y_sugerido(self):
+        sugerencias = {s.presentacion_id: s for s in reposicion.sugerencias(plazo=7, cobertura=14)}
+
+        lata = sugerencias[self.lata.pk]
+        self.assertAlmostEqual(lata.consumo_diario, 2.0)
+        self.assertAlmostEqual(lata.tendencia, 0.0)
+        self.assertAlmostEqual(lata.dias_cobertura, 5.0)
+        self.assertEqual(lata.sugerido, 32)  # 2 × 21 días - 10 en stock
+
+        pack = sugerencias[self.pack.pk]
+        self.assertGreater(pack.tendencia, 0)
+        self.assertGreater(pack.consumo_diario, pack.consumo_reciente)
+        # en packs de 6 unidades base
+        self.assertEqual(pack.sugerido, math.ceil((pack.consumo_diario * 21 - 10) / 6))
+
+        quieta = sugerencias[self.quieta.pk]
+        self.assertIsNone(quieta.dias_cobertura)
+        self.assertEqual(quieta.sugerido, 0)
+        self.assertEqual(list(sugerencias)[-1], self.quieta.pk)
+
+    def test_vista_y_csv(self):
+        response = self.client.get(reverse('reposicion_sugerida'), {'plazo': 3, 'cobertura': 4})
+        self.assertConsultas(response, 5)
+        # primero la que menos días de stock tiene
+        self.assertEqual([s.presentacion_id for s in response.context['sugerencias']], [self.pack.pk, self.lata.pk])
+        self.assertContains(response, 'Reposición sugerida')
+
+        response = self.client.get(reverse('reposicion_sugerida'), {'formato': 'csv'})
+        filas = response.content.decode('utf-8-sig').splitlines()
+        self.assertEqual(len(filas), 4)
+        self.assertIn('5000,Bebida,Lata 350cc,10.000,2.000,0.0000,2.000,5.0,32', filas)
 
-# Create your tests here.
@@ -6,4 +6,7 @@ urlpatterns = [
     path('productos/nuevo/', views.producto_create, name='producto_create'),
     path('productos/<int:pk>/editar/', views.producto_update, name='producto_update'),
     path('productos/<int:pk>/eliminar/', views.producto_delete, name='producto_delete'),
+    path('presentaciones/buscar/', views.presentacion_buscar, name='presentacion_buscar'),
+    path('catalogo/', views.catalogo_snapshot, name='catalogo_snapshot'),
+    path('reposicion/', views.reposicion_sugerida, name='reposicion_sugerida'),
 ]
\ No newline at end of file
@@ -1,25 +1,48 @@
+import csv
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from auditoria import registro as auditoria
+from core.instrumentacion import presupuesto_consultas
+from core.paginacion import PaginaKeyset, paginar
+from core.routers import solo_lectura
+from . import catalogo, reposicion
+from .busqueda import indice_productos
 from .models import Producto, Presentacion, Categoria
 from .forms import ProductoForm, PresentacionForm
 
+LIMITE_BUSQUEDA = 200
+LIMITE_REPOSICION = 200
+
+
 @login_required
+# el índice de búsqueda puede reconstruirse o refrescarse en la petición
+@presupuesto_consultas(10)
 def producto_list(request):
 	nombre = request.GET.get('nombre', '')
 	categoria = request.GET.get('categoria', '')
 	codigo_barra = request.GET.get('codigo_barra', '')
 
 	productos = Producto.objects.all()
-	if nombre:
-		productos = productos.filter(nombre__icontains=nombre)
 	if categoria:
 		productos = productos.filter(categoria_id=categoria)
-	if codigo_barra:
-		productos = productos.filter(presentaciones__codigo_barra__icontains=codigo_barra).distinct()
 
+	if nombre or codigo_barra:
+		# búsqueda en el índice en memoria: resultados por relevancia, sin cursor
+		ids = indice_productos.buscar(f'{nombre} {codigo_barra}', limite=LIMITE_BUSQUEDA)
+		encontrados = productos.in_bulk(ids)
+		pagina = PaginaKeyset([encontrados[pk] for pk in ids if pk in encontrados])
+	else:
+		pagina = paginar(productos, ('nombre', 'id'), request.GET.get('cursor'))
 	categorias = Categoria.objects.all()
 	return render(request, 'inventario/producto_list.html', {
-		'productos': productos,
+		'productos': pagina,
+		'pagina': pagina,
 		'categorias': categorias,
 		'filtros': {
 			'nombre': nombre,
@@ -40,6 +63,7 @@ def producto_create(request):
             presentacion = presentacion_form.save(commit=False)
             presentacion.producto = producto
             presentacion.save()
+            auditoria.registrar(request.user, 'CREACION_PRODUCTO', f'Producto {producto} ({presentacion.codigo_barra})')
 
             return redirect('producto_list')
     else:
@@ -63,6 +87,7 @@ def producto_update(request, pk):
 			if producto.tipo_producto in ['PACK', 'UNITARIO']:
 				producto.stock_minimo = int(producto.stock_minimo)
 			producto.save()
+			auditoria.registrar(request.user, 'EDICION_PRODUCTO', f'Producto {producto}')
 			return redirect('producto_list')
 	else:
 		form = ProductoForm(instance=producto)
@@ -73,5 +98,88 @@ def producto_delete(request, pk):
 	producto = get_object_or_404(Producto, pk=pk)
 	if request.method == 'POST':
 		producto.delete()
+		auditoria.registrar(request.user, 'ELIMINACION_PRODUCTO', f'Producto {producto}')
 		return redirect('producto_list')
 	return render(request, 'inventario/producto_confirm_delete.html', {'producto': producto})
+
+
+@login_required
+@presupuesto_consultas(3)
+def presentacion_buscar(request):
+	codigo = request.GET.get('codigo', '').strip()
+	prefijo = request.GET.get('prefijo', '').strip()
+
+	if codigo:
+		presentacion = catalogo.buscar_por_codigo(codigo)
+		if presentacion is None:
+			return JsonResponse({'error': f'Producto no encontrado: {codigo}'}, status=404)
+		return JsonResponse({'presentacion': presentacion})
+
+	if prefijo:
+		try:
+			limite = min(max(int(request.GET.get('limite', 20)), 1), 50)
+		except ValueError:
+			limite = 20
+		return JsonResponse({'resultados': catalogo.buscar_por_prefijo(prefijo, limite)})
+
+	return JsonResponse({'error': 'Debe indicar codigo o prefijo.'}, status=400)
+
+
+def _catalogo_etag(request):
+	# La vista reutiliza esta lectura en lugar de repetirla.
+	request.version_catalogo = catalogo.version_actual()
+	return f'catalogo-{request.version_catalogo}'
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_catalogo_etag)
+@presupuesto_consultas(5)
+def catalogo_snapshot(request):
+	try:
+		desde = int(request.GET['desde'])
+	except (KeyError, ValueError):
+		desde = None
+	return JsonResponse(catalogo.snapshot(desde, version=request.version_catalogo))
+
+
+def _dias(request, nombre, defecto):
+	try:
+		return min(max(int(request.GET[nombre]), 0), 365)
+	except (KeyError, ValueError):
+		return defecto
+
+
+@login_required
+@solo_lectura()
+@presupuesto_consultas(5)
+def reposicion_sugerida(request):
+	plazo = _dias(request, 'plazo', getattr(settings, 'REPOSICION_PLAZO', 7))
+	cobertura = _dias(request, 'cobertura', getattr(settings, 'REPOSICION_COBERTURA', 14))
+	sugerencias = reposicion.sugerencias(plazo, cobertura)
+
+	if request.GET.get('formato') == 'csv':
+		response = HttpResponse(content_type='text/csv; charset=utf-8')
+		response['Content-Disposition'] = f'attachment; filename="reposicion_{timezone.localdate():%Y%m%d}.csv"'
+		response.write('\ufeff')  # BOM para que Excel reconozca UTF-8
+		escritor = csv.writer(response)
+		escritor.writerow([
+			'Código de barra', 'Producto', 'Presentación', 'Stock', 'Consumo diario reciente',
+			'Tendencia diaria', 'Consumo diario proyectado', 'Días de cobertura', 'Sugerido',
+		])
+		for s in sugerencias:
+			escritor.writerow([
+				s.codigo_barra, s.producto, s.presentacion, f'{s.stock:.3f}', f'{s.consumo_reciente:.3f}',
+				f'{s.tendencia:.4f}', f'{s.consumo_diario:.3f}',
+				'' if s.dias_cobertura is None else f'{s.dias_cobertura:.1f}', s.sugerido,
+			])
+		return response
+
+	a_pedir = [s for s in sugerencias if s.sugerido]
+	return render(request, 'inventario/reposicion.html', {
+		'sugerencias': a_pedir[:LIMITE_REPOSICION],
+		'total_a_pedir': len(a_pedir),
+		'plazo': plazo,
+		'cobertura': cobertura,
+	})
+
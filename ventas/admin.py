@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Venta, VentaDetalle
+from .models import ResumenDiaCategoria, ResumenHoraPresentacion, Venta, VentaDetalle
 
 class VentaDetalleInline(admin.TabularInline):
     model = VentaDetalle
@@ -12,4 +12,20 @@ class VentaAdmin(admin.ModelAdmin):
 
 @admin.register(VentaDetalle)
 class VentaDetalleAdmin(admin.ModelAdmin):
-    list_display = ('venta', 'presentacion', 'cantidad_ingresada', 'unidad_venta', 'precio_unitario', 'subtotal')
+    list_display = (
+        'venta', 'presentacion', 'cantidad_ingresada', 'unidad_venta', 'precio_unitario', 'subtotal',
+        'costo_unitario', 'ganancia',
+    )
+
+
+@admin.register(ResumenHoraPresentacion)
+class ResumenHoraPresentacionAdmin(admin.ModelAdmin):
+    list_display = ('hora', 'presentacion', 'unidades', 'ingresos', 'ganancia')
+    list_select_related = ('presentacion__producto',)
+    date_hierarchy = 'hora'
+
+@admin.register(ResumenDiaCategoria)
+class ResumenDiaCategoriaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'categoria', 'metodo_pago', 'unidades', 'ingresos', 'ganancia')
+    list_filter = ('metodo_pago', 'categoria')
+    date_hierarchy = 'fecha'
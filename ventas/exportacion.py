@@ -0,0 +1,113 @@
+import csv
+import datetime
+import tempfile
+
+from django.utils import timezone
+
+from .models import VentaDetalle
+
+
+ENCABEZADO = (
+    'Venta',
+    'Fecha',
+    'Caja',
+    'Método de pago',
+    'Usuario',
+    'Código de barra',
+    'Producto',
+    'Presentación',
+    'Cantidad',
+    'Unidad',
+    'Precio unitario',
+    'Subtotal',
+    'Total venta',
+)
+
+COLUMNAS = (
+    'venta_id',
+    'venta__fecha',
+    'venta__caja__fecha',
+    'venta__metodo_pago',
+    'venta__usuario__username',
+    'presentacion__codigo_barra',
+    'presentacion__producto__nombre',
+    'presentacion__nombre',
+    'cantidad_ingresada',
+    'unidad_venta',
+    'precio_unitario',
+    'subtotal',
+    'venta__total',
+)
+
+TAMANO_LOTE = 2000
+
+
+def detalles_filtrados(desde=None, hasta=None, caja=None, metodo_pago=None):
+    """
+    Líneas de venta a exportar, como tuplas en el orden de ``COLUMNAS``.
+
+    Las fechas se traducen a un rango de ``fecha`` (en vez de ``fecha__date``)
+    para que la consulta pueda usar el índice de la columna.
+    """
+    detalles = VentaDetalle.objects.all()
+    if desde:
+        detalles = detalles.filter(venta__fecha__gte=_inicio_del_dia(desde))
+    if hasta:
+        detalles = detalles.filter(venta__fecha__lt=_inicio_del_dia(hasta + datetime.timedelta(days=1)))
+    if caja:
+        detalles = detalles.filter(venta__caja=caja)
+    if metodo_pago:
+        detalles = detalles.filter(venta__metodo_pago=metodo_pago)
+    return detalles.order_by('venta__fecha', 'venta_id', 'id').values_list(*COLUMNAS)
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def _fila(valores):
+    fila = list(valores)
+    fila[1] = timezone.localtime(fila[1]).replace(tzinfo=None)
+    return fila
+
+
+class _Eco:
+    """Pseudo-archivo: csv.writer escribe una fila y se devuelve tal cual."""
+
+    def write(self, valor):
+        return valor
+
+
+def filas_csv(detalles):
+    """
+    Genera el CSV fila por fila. Las filas se leen con ``iterator()`` en
+    lotes, por lo que la memoria no crece con el tamaño de la exportación y
+    el primer byte sale antes de que termine la consulta.
+    """
+    escritor = csv.writer(_Eco())
+    yield '\ufeff'  # BOM para que Excel reconozca UTF-8
+    yield escritor.writerow(ENCABEZADO)
+    for valores in detalles.iterator(chunk_size=TAMANO_LOTE):
+        fila = _fila(valores)
+        fila[1] = fila[1].isoformat(sep=' ', timespec='seconds')
+        yield escritor.writerow(fila)
+
+
+def libro_xlsx(detalles):
+    """
+    Escribe las líneas en un libro XLSX en modo write-only y devuelve un
+    archivo temporal posicionado al inicio. openpyxl vuelca cada fila a disco,
+    así que la memoria tampoco depende del tamaño de la exportación.
+    """
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Ventas')
+    hoja.append(ENCABEZADO)
+    for valores in detalles.iterator(chunk_size=TAMANO_LOTE):
+        hoja.append(_fila(valores))
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
@@ -1,7 +1,8 @@
+from decimal import Decimal
 from django import forms
 from django.forms import formset_factory
-from .models import VentaDetalle
-from inventario.models import Presentacion
+from caja.models import Caja
+from core.enums import MetodoPago
 
 class VentaForm(forms.Form):
     metodo_pago = forms.ChoiceField(choices=[], widget=forms.Select(attrs={'class':'form-select'}))
@@ -14,9 +15,11 @@ class VentaForm(forms.Form):
 
 
 class VentaDetalleForm(forms.Form):
-    producto = forms.ModelChoiceField(queryset=Presentacion.objects.all(), widget=forms.Select(attrs={'class':'form-select'}) )
+    # Solo el id: las presentaciones de todas las líneas se resuelven juntas
+    # en ventas.services.registrar_venta, no una consulta por línea.
+    producto = forms.IntegerField(min_value=1, widget=forms.HiddenInput)
     unidad_venta = forms.ChoiceField(choices=[], widget=forms.Select(attrs={'class':'form-select'}))
-    cantidad_ingresada = forms.DecimalField(widget=forms.NumberInput(attrs={'class':'form-control', 'step':'0.001'}), max_digits=10, decimal_places=3)
+    cantidad_ingresada = forms.DecimalField(widget=forms.NumberInput(attrs={'class':'form-control', 'step':'0.001'}), max_digits=10, decimal_places=3, min_value=Decimal('0.001'))
 
     def __init__(self, *args, **kwargs):
         unidad_choices = kwargs.pop('unidad_choices', None)
@@ -26,3 +29,24 @@ class VentaDetalleForm(forms.Form):
 
 
 VentaDetalleFormSet = formset_factory(VentaDetalleForm, extra=1, min_num=1, validate_min=True, can_delete=True)
+
+
+class VentaExportForm(forms.Form):
+    FORMATO_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+    ]
+
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'class':'form-control', 'type':'date'}))
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'class':'form-control', 'type':'date'}))
+    caja = forms.ModelChoiceField(queryset=Caja.objects.order_by('-fecha', 'terminal'), required=False, widget=forms.Select(attrs={'class':'form-select'}))
+    metodo_pago = forms.ChoiceField(choices=[('', 'Todos')] + MetodoPago.choices, required=False, widget=forms.Select(attrs={'class':'form-select'}))
+    formato = forms.ChoiceField(choices=FORMATO_CHOICES, initial='csv', widget=forms.Select(attrs={'class':'form-select'}))
+
+    def clean(self):
+        cleaned = super().clean()
+        desde = cleaned.get('desde')
+        hasta = cleaned.get('hasta')
+        if desde and hasta and hasta < desde:
+            self.add_error('hasta', 'La fecha final no puede ser anterior a la inicial.')
+        return cleaned
@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ventas import resumenes
+
+
+def _fecha(valor):
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (se espera AAAA-MM-DD).')
+
+
+class Command(BaseCommand):
+    help = 'Rehace los resúmenes de ventas por hora y por día desde los detalles de venta.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help='Primer día a reconstruir (AAAA-MM-DD).')
+        parser.add_argument('--hasta', type=_fecha, help='Último día a reconstruir (AAAA-MM-DD).')
+
+    def handle(self, *args, **options):
+        if options['desde'] and options['hasta'] and options['hasta'] < options['desde']:
+            raise CommandError('--hasta no puede ser anterior a --desde.')
+        por_hora, por_dia = resumenes.reconstruir(options['desde'], options['hasta'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Resúmenes reconstruidos: {por_hora} fila(s) por hora y presentación, '
+            f'{por_dia} fila(s) por día, categoría y método de pago.'
+        ))
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0002_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaIdempotente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True)),
+                ('respuesta', models.JSONField()),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('venta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='idempotencia', to='ventas.venta')),
+            ],
+        ),
+    ]
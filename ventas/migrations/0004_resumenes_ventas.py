@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_indices_paginacion'),
+        ('ventas', '0003_venta_idempotente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiaCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(choices=[('EFECTIVO', 'Efectivo'), ('DEBITO', 'Débito'), ('TRANSFERENCIA', 'Transferencia')], max_length=15)),
+                ('unidades', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ganancia', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resumenes_dia', to='inventario.categoria')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'categoria', 'metodo_pago'), name='resumen_dia_categoria_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenHoraPresentacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField()),
+                ('unidades', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ganancia', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('presentacion', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resumenes_hora', to='inventario.presentacion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hora'], name='resumen_hora_idx')],
+                'constraints': [models.UniqueConstraint(fields=('presentacion', 'hora'), name='resumen_hora_presentacion_unico')],
+            },
+        ),
+    ]
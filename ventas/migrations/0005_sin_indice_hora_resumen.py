@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 19:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0004_resumenes_ventas'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='resumenhorapresentacion',
+            name='resumen_hora_idx',
+        ),
+    ]
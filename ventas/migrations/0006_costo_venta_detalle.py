@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 21:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery
+from django.db.models.functions import Round
+
+
+def costos_historicos(apps, schema_editor):
+    # No hay historial de precios de compra: a las ventas existentes se les
+    # asigna el precio de compra actual, que es lo que ya usaban los totales.
+    VentaDetalle = apps.get_model('ventas', 'VentaDetalle')
+    Presentacion = apps.get_model('inventario', 'Presentacion')
+    VentaDetalle.objects.update(costo_unitario=Subquery(
+        Presentacion.objects.filter(pk=OuterRef('presentacion_id')).values('precio_compra')[:1]
+    ))
+    VentaDetalle.objects.update(ganancia=Round(ExpressionWrapper(
+        (F('precio_unitario') - F('costo_unitario')) * F('cantidad_ingresada'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    ), 2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_indices_paginacion'),
+        ('ventas', '0005_sin_indice_hora_resumen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ventadetalle',
+            name='costo_unitario',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='ventadetalle',
+            name='ganancia',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(costos_historicos, migrations.RunPython.noop),
+    ]
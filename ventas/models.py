@@ -1,5 +1,5 @@
 from django.db import models
-from inventario.models import Presentacion
+from inventario.models import Categoria, Presentacion
 from caja.models import Caja
 
 
@@ -27,6 +27,12 @@ class Venta(models.Model):
         related_name='ventas'
     )
 
+    class Meta:
+        indexes = [
+            # paginación por cursor de venta_list
+            models.Index(fields=['fecha', 'id'], name='venta_fecha_id_idx'),
+        ]
+
     def __str__(self):
         return f"Venta {self.id}"
 
@@ -46,6 +52,82 @@ class VentaDetalle(models.Model):
     cantidad_base = models.DecimalField(max_digits=10, decimal_places=3)
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    # Precio de compra de la presentación al momento de la venta: el margen
+    # no cambia si después cambia el costo.
+    costo_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    ganancia = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
         return f"{self.presentacion} x {self.cantidad_ingresada}"
+
+
+class VentaIdempotente(models.Model):
+    """
+    Clave de idempotencia de cada venta recibida por ``venta_lote``. Un
+    reintento con la misma clave se responde con ``respuesta`` sin volver a
+    procesar la venta.
+    """
+    clave = models.CharField(max_length=64, unique=True)
+    venta = models.OneToOneField(
+        Venta,
+        on_delete=models.CASCADE,
+        related_name='idempotencia'
+    )
+    respuesta = models.JSONField()
+    creada = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.clave
+
+
+# Resúmenes de ventas: se acumulan al registrar cada venta y se pueden
+# reconstruir desde los detalles (ver ventas/resumenes.py).
+
+class ResumenHoraPresentacion(models.Model):
+    hora = models.DateTimeField()
+    presentacion = models.ForeignKey(
+        Presentacion,
+        on_delete=models.PROTECT,
+        related_name='resumenes_hora'
+    )
+    unidades = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ganancia = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        # Sin índice propio sobre hora: las lecturas recorren casi todo el
+        # período agrupando por presentación (ver inventario/reposicion.py)
+        # y con él SQLite elige buscar por rango y ordenar aparte.
+        constraints = [
+            models.UniqueConstraint(fields=['presentacion', 'hora'], name='resumen_hora_presentacion_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.presentacion} {self.hora:%d/%m/%Y %H}h"
+
+
+class ResumenDiaCategoria(models.Model):
+    fecha = models.DateField()
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.PROTECT,
+        related_name='resumenes_dia'
+    )
+    metodo_pago = models.CharField(
+        max_length=15,
+        choices=Venta.METODO_PAGO_CHOICES
+    )
+    unidades = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ganancia = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'categoria', 'metodo_pago'],
+                name='resumen_dia_categoria_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.categoria} {self.fecha:%d/%m/%Y} {self.metodo_pago}"
@@ -0,0 +1,149 @@
+import datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import ResumenDiaCategoria, ResumenHoraPresentacion, VentaDetalle
+
+
+# =========================
+# RESÚMENES DE VENTAS
+# =========================
+# Unidades, ingresos y ganancia por hora × presentación y por día ×
+# categoría × método de pago. registrar_venta los acumula en la misma
+# transacción que la venta con un INSERT ... ON CONFLICT por tabla, así los
+# reportes leen filas ya agregadas en lugar de recorrer los detalles.
+# `manage.py reconstruir_resumenes_ventas` los rehace desde VentaDetalle.
+
+SUMAS = ('unidades', 'ingresos', 'ganancia')
+
+# filas por sentencia: 7 columnas × 100 queda bajo el límite de parámetros
+# de las versiones viejas de SQLite
+FILAS_POR_SENTENCIA = 100
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def _sumar(modelo, claves, deltas):
+    """
+    Suma ``deltas`` (``{valores de claves: (unidades, ingresos, ganancia)}``)
+    a las filas de ``modelo``, creándolas si no existen. El incremento lo
+    hace la base en la misma sentencia, así dos ventas a la vez no se pisan.
+    """
+    if not deltas:
+        return
+    opts = modelo._meta
+    campos = [opts.get_field(nombre) for nombre in claves + SUMAS]
+    qn = connection.ops.quote_name
+    tabla = qn(opts.db_table)
+    columnas = ', '.join(qn(campo.column) for campo in campos)
+    sumas = [qn(opts.get_field(nombre).column) for nombre in SUMAS]
+    if connection.vendor == 'mysql':
+        sufijo = 'ON DUPLICATE KEY UPDATE ' + ', '.join(f'{c} = {c} + VALUES({c})' for c in sumas)
+    else:
+        conflicto = ', '.join(qn(opts.get_field(nombre).column) for nombre in claves)
+        sufijo = f'ON CONFLICT ({conflicto}) DO UPDATE SET ' + ', '.join(
+            f'{c} = {tabla}.{c} + excluded.{c}' for c in sumas
+        )
+
+    # en orden fijo: dos transacciones que tocan las mismas filas las
+    # bloquean en el mismo orden
+    filas = [clave + valores for clave, valores in sorted(deltas.items())]
+    marcas = '(' + ', '.join(['%s'] * len(campos)) + ')'
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(filas), FILAS_POR_SENTENCIA):
+            tramo = filas[inicio:inicio + FILAS_POR_SENTENCIA]
+            cursor.execute(
+                f'INSERT INTO {tabla} ({columnas}) VALUES {", ".join([marcas] * len(tramo))} {sufijo}',
+                [campo.get_db_prep_save(valor, connection) for fila in tramo for campo, valor in zip(campos, fila)],
+            )
+
+
+def acumular(ventas):
+    """
+    Suma a los resúmenes ``ventas``, una lista de ``(venta, detalles)`` con
+    la presentación y su producto ya cargados en cada detalle. Debe llamarse
+    dentro de la transacción que inserta las ventas.
+    """
+    por_hora = {}
+    por_dia = {}
+    for venta, detalles in ventas:
+        local = timezone.localtime(venta.fecha)
+        hora = local.replace(minute=0, second=0, microsecond=0)
+        for detalle in detalles:
+            presentacion = detalle.presentacion
+            for tabla, clave in (
+                (por_hora, (presentacion.pk, hora)),
+                (por_dia, (local.date(), presentacion.producto.categoria_id, venta.metodo_pago)),
+            ):
+                unidades, ingresos, margen = tabla.get(clave, (Decimal('0'),) * 3)
+                tabla[clave] = (unidades + detalle.cantidad_base, ingresos + detalle.subtotal, margen + detalle.ganancia)
+
+    _sumar(ResumenHoraPresentacion, ('presentacion', 'hora'), por_hora)
+    _sumar(ResumenDiaCategoria, ('fecha', 'categoria', 'metodo_pago'), por_dia)
+
+
+@transaction.atomic
+def reconstruir(desde=None, hasta=None):
+    """
+    Rehace los resúmenes de los días ``[desde, hasta]`` (por defecto, todos)
+    a partir de los detalles de venta, con la ganancia guardada en cada
+    línea. Devuelve la cantidad de filas creadas por tabla.
+    """
+    detalles = VentaDetalle.objects.all()
+    horas = ResumenHoraPresentacion.objects.all()
+    dias = ResumenDiaCategoria.objects.all()
+    if desde:
+        detalles = detalles.filter(venta__fecha__gte=_inicio_del_dia(desde))
+        horas = horas.filter(hora__gte=_inicio_del_dia(desde))
+        dias = dias.filter(fecha__gte=desde)
+    if hasta:
+        fin = _inicio_del_dia(hasta + datetime.timedelta(days=1))
+        detalles = detalles.filter(venta__fecha__lt=fin)
+        horas = horas.filter(hora__lt=fin)
+        dias = dias.filter(fecha__lte=hasta)
+    horas.delete()
+    dias.delete()
+
+    totales = {
+        'unidades': Sum('cantidad_base'),
+        'ingresos': Sum('subtotal'),
+        'ganancia': Sum('ganancia'),
+    }
+    zona = timezone.get_current_timezone()
+
+    por_hora = (
+        detalles
+        .annotate(hora=TruncHour('venta__fecha', tzinfo=zona))
+        .values('presentacion_id', 'hora')
+        .annotate(**totales)
+        .order_by()
+    )
+    por_dia = (
+        detalles
+        .annotate(fecha=TruncDate('venta__fecha', tzinfo=zona))
+        .values('fecha', 'presentacion__producto__categoria_id', 'venta__metodo_pago')
+        .annotate(**totales)
+        .order_by()
+    )
+    creadas = []
+    for modelo, filas, claves in (
+        (ResumenHoraPresentacion, por_hora, lambda f: {'presentacion_id': f['presentacion_id'], 'hora': f['hora']}),
+        (ResumenDiaCategoria, por_dia, lambda f: {
+            'fecha': f['fecha'],
+            'categoria_id': f['presentacion__producto__categoria_id'],
+            'metodo_pago': f['venta__metodo_pago'],
+        }),
+    ):
+        objetos = [
+            modelo(**claves(fila), **{campo: fila[campo] or 0 for campo in SUMAS})
+            for fila in filas.iterator(chunk_size=2000)
+        ]
+        modelo.objects.bulk_create(objetos, batch_size=1000)
+        creadas.append(len(objetos))
+    return tuple(creadas)
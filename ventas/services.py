@@ -0,0 +1,298 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from caja.services import acumular_venta, acumular_ventas
+from inventario.models import MovimientoStock, Presentacion
+from inventario.services import descontar_stock
+from . import resumenes
+from .models import Venta, VentaDetalle, VentaIdempotente
+
+
+class VentaRechazada(Exception):
+    """
+    La venta no se pudo registrar. ``errores`` mapea el índice de cada línea
+    rechazada a su mensaje.
+    """
+
+    def __init__(self, mensaje, errores):
+        super().__init__(mensaje)
+        self.errores = errores
+
+
+def _armar_detalles(lineas, presentaciones):
+    """
+    Detalles (sin venta asignada), cantidades requeridas por presentación,
+    ganancia y errores por índice de línea de una venta. Cada detalle guarda
+    el costo y la ganancia de la línea con el precio de compra de ahora.
+    """
+    errores = {}
+    required = {}
+    detalles = []
+    ganancia = Decimal('0')
+    for indice, linea in enumerate(lineas):
+        presentacion = presentaciones.get(linea['presentacion_id'])
+        if presentacion is None:
+            errores[indice] = 'La presentación seleccionada no existe.'
+            continue
+
+        cantidad_ingresada = linea['cantidad_ingresada']
+        # compute cantidad_base (simplificado)
+        cantidad_base = cantidad_ingresada
+        required[presentacion.id] = required.get(presentacion.id, Decimal('0')) + cantidad_base
+
+        precio_unitario = presentacion.precio_venta
+        ganancia_linea = ((precio_unitario - presentacion.precio_compra) * cantidad_ingresada).quantize(Decimal('0.01'))
+        ganancia += ganancia_linea
+        detalles.append(VentaDetalle(
+            presentacion=presentacion,
+            unidad_venta=linea['unidad_venta'],
+            cantidad_ingresada=cantidad_ingresada,
+            cantidad_base=cantidad_base,
+            precio_unitario=precio_unitario,
+            subtotal=(precio_unitario * cantidad_ingresada).quantize(Decimal('0.01')),
+            costo_unitario=presentacion.precio_compra,
+            ganancia=ganancia_linea,
+        ))
+    return detalles, required, ganancia, errores
+
+
+@transaction.atomic
+def registrar_venta(usuario, caja, metodo_pago, lineas):
+    """
+    Registra una venta con un número de consultas que no depende de la
+    cantidad de líneas.
+
+    ``lineas`` es una lista de dicts con ``presentacion_id``, ``unidad_venta``
+    y ``cantidad_ingresada``. Las presentaciones se resuelven con un solo
+    ``in_bulk``, el stock se descuenta con :func:`descontar_stock` y los
+    detalles se insertan con ``bulk_create``; el total sale de esas mismas
+    filas en memoria y se acumula en la caja con un UPDATE. Si alguna línea no se puede vender se lanza
+    :class:`VentaRechazada` y no se modifica nada.
+    """
+    presentaciones = Presentacion.objects.select_related('producto').in_bulk(
+        {linea['presentacion_id'] for linea in lineas}
+    )
+
+    detalles, required, ganancia, errores = _armar_detalles(lineas, presentaciones)
+    if errores:
+        raise VentaRechazada('Algunas presentaciones no existen.', errores)
+
+    # validar y descontar stock de todas las líneas en un solo UPDATE
+    faltantes = descontar_stock(required)
+    if faltantes:
+        for indice, linea in enumerate(lineas):
+            if linea['presentacion_id'] in faltantes:
+                errores[indice] = f"Stock insuficiente. Disponible: {faltantes[linea['presentacion_id']]}"
+        nombres = ', '.join(str(presentaciones[pk]) for pk in faltantes if pk in presentaciones)
+        raise VentaRechazada(f'Stock insuficiente para algunas presentaciones: {nombres}.', errores)
+
+    venta = Venta.objects.create(
+        metodo_pago=metodo_pago,
+        usuario=usuario,
+        caja=caja,
+        total=sum((d.subtotal for d in detalles), Decimal('0')),
+    )
+    for detalle in detalles:
+        detalle.venta = venta
+    VentaDetalle.objects.bulk_create(detalles)
+    resumenes.acumular([(venta, detalles)])
+
+    # el stock ya se descontó: solo queda asentarlo en el libro
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(
+            presentacion_id=pk,
+            tipo='VENTA',
+            cantidad=-cantidad,
+            usuario=usuario,
+            venta=venta,
+            fecha=venta.fecha,
+        )
+        for pk, cantidad in required.items()
+    ])
+
+    # totales de la caja en la misma transacción que la venta
+    acumular_venta(caja, metodo_pago, venta.total, ganancia)
+
+    return venta
+
+
+# =========================
+# VENTAS EN LOTE
+# =========================
+# Las terminales sin conexión encolan ventas y las mandan juntas, cada una
+# con una clave de idempotencia generada por la terminal. Las ventas se
+# registran en tandas de VENTAS_LOTE_TANDA, cada tanda en una transacción
+# con inserciones en bloque; las claves ya vistas se contestan desde
+# VentaIdempotente.
+
+class _StockCambiado(Exception):
+    """Otra venta consumió el stock leído al armar la tanda."""
+
+
+def _respuesta(venta):
+    return {'estado': 'creada', 'venta_id': venta.pk, 'total': str(venta.total)}
+
+
+def _rechazo(errores):
+    return {'estado': 'rechazada', 'errores': {str(i): mensaje for i, mensaje in errores.items()}}
+
+
+def _registrar_tanda(usuario, caja, ventas):
+    """
+    Registra una tanda de ventas (dicts con ``clave``, ``metodo_pago`` y
+    ``lineas``) con un número fijo de consultas. El stock se reparte en
+    memoria en el orden recibido y se descuenta todo junto; si entretanto
+    cambió, se lanza :class:`_StockCambiado`. Devuelve las respuestas en el
+    mismo orden.
+    """
+    presentaciones = Presentacion.objects.select_related('producto').in_bulk(
+        {linea['presentacion_id'] for venta in ventas for linea in venta['lineas']}
+    )
+    disponible = {pk: p.stock_base for pk, p in presentaciones.items()}
+
+    respuestas = []
+    aceptadas = []
+    requeridos = {}
+    for venta in ventas:
+        detalles, required, ganancia, errores = _armar_detalles(venta['lineas'], presentaciones)
+        if not errores:
+            for indice, linea in enumerate(venta['lineas']):
+                pk = linea['presentacion_id']
+                if disponible[pk] < required[pk]:
+                    errores[indice] = f'Stock insuficiente. Disponible: {disponible[pk]}'
+        if errores:
+            respuestas.append(_rechazo(errores))
+            continue
+
+        for pk, cantidad in required.items():
+            disponible[pk] -= cantidad
+            requeridos[pk] = requeridos.get(pk, Decimal('0')) + cantidad
+        registro = Venta(
+            metodo_pago=venta['metodo_pago'],
+            usuario=usuario,
+            caja=caja,
+            total=sum((d.subtotal for d in detalles), Decimal('0')),
+        )
+        aceptadas.append((venta, registro, detalles, required, ganancia))
+        respuestas.append(registro)
+
+    if not aceptadas:
+        return respuestas
+    if descontar_stock(requeridos):
+        raise _StockCambiado
+
+    registros = [registro for _, registro, _, _, _ in aceptadas]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Venta.objects.bulk_create(registros)
+    else:
+        for registro in registros:
+            registro.save()
+
+    detalles_tanda, movimientos, claves = [], [], []
+    for venta, registro, detalles, required, _ in aceptadas:
+        for detalle in detalles:
+            detalle.venta = registro
+        detalles_tanda += detalles
+        movimientos += [
+            MovimientoStock(
+                presentacion_id=pk,
+                tipo='VENTA',
+                cantidad=-cantidad,
+                usuario=usuario,
+                venta=registro,
+                fecha=registro.fecha,
+            )
+            for pk, cantidad in required.items()
+        ]
+        claves.append(VentaIdempotente(clave=venta['clave'], venta=registro, respuesta=_respuesta(registro)))
+    VentaDetalle.objects.bulk_create(detalles_tanda)
+    resumenes.acumular([(registro, detalles) for _, registro, detalles, _, _ in aceptadas])
+    MovimientoStock.objects.bulk_create(movimientos)
+    VentaIdempotente.objects.bulk_create(claves)
+
+    acumular_ventas(caja, [
+        (registro.metodo_pago, registro.total, ganancia) for _, registro, _, _, ganancia in aceptadas
+    ])
+    return [_respuesta(r) if isinstance(r, Venta) else r for r in respuestas]
+
+
+def _registrar_una_a_una(usuario, caja, ventas):
+    """
+    Camino lento de una tanda: cada venta en su propio savepoint. Una clave
+    que otra petición registró a la vez se contesta desde la tabla.
+    """
+    respuestas = []
+    for venta in ventas:
+        try:
+            with transaction.atomic():
+                registro = registrar_venta(usuario, caja, venta['metodo_pago'], venta['lineas'])
+                VentaIdempotente.objects.create(clave=venta['clave'], venta=registro, respuesta=_respuesta(registro))
+        except VentaRechazada as exc:
+            respuestas.append(_rechazo(exc.errores))
+        except IntegrityError:
+            guardada = VentaIdempotente.objects.filter(clave=venta['clave']).values_list('respuesta', flat=True).first()
+            if guardada is None:
+                raise
+            respuestas.append({**guardada, 'repetida': True})
+        else:
+            respuestas.append(_respuesta(registro))
+    return respuestas
+
+
+def registrar_ventas_lote(usuario, caja, ventas):
+    """
+    Registra ``ventas`` (dicts con ``clave``, ``metodo_pago`` y ``lineas``
+    como en :func:`registrar_venta`) y devuelve una respuesta por venta, en
+    el mismo orden: ``estado`` es ``creada`` (con ``venta_id`` y
+    ``total``) o ``rechazada`` (con ``errores`` por índice de línea). Una
+    clave ya registrada, antes o en este mismo lote, se contesta con la
+    respuesta original más ``repetida: True``. Las rechazadas no se
+    recuerdan: la terminal puede corregirlas y reintentar con la misma clave.
+    """
+    respuestas = [None] * len(ventas)
+    guardadas = dict(
+        VentaIdempotente.objects
+        .filter(clave__in={venta['clave'] for venta in ventas})
+        .values_list('clave', 'respuesta')
+    )
+    primera = {}
+    nuevas = []
+    for i, venta in enumerate(ventas):
+        if venta['clave'] in guardadas:
+            respuestas[i] = {**guardadas[venta['clave']], 'repetida': True}
+        elif venta['clave'] not in primera:
+            primera[venta['clave']] = i
+            nuevas.append(i)
+
+    tamano = getattr(settings, 'VENTAS_LOTE_TANDA', 50)
+    for inicio in range(0, len(nuevas), tamano):
+        tanda = nuevas[inicio:inicio + tamano]
+        try:
+            with transaction.atomic():
+                try:
+                    resultado = _registrar_tanda(usuario, caja, [ventas[i] for i in tanda])
+                except _StockCambiado:
+                    resultado = _registrar_una_a_una(usuario, caja, [ventas[i] for i in tanda])
+        except IntegrityError:
+            # Otra petición registró alguna de estas claves a la vez: esas
+            # se contestan desde la tabla y el resto se registra de nuevo.
+            guardadas = dict(
+                VentaIdempotente.objects
+                .filter(clave__in={ventas[i]['clave'] for i in tanda})
+                .values_list('clave', 'respuesta')
+            )
+            for i in tanda:
+                if ventas[i]['clave'] in guardadas:
+                    respuestas[i] = {**guardadas[ventas[i]['clave']], 'repetida': True}
+            tanda = [i for i in tanda if respuestas[i] is None]
+            with transaction.atomic():
+                resultado = _registrar_una_a_una(usuario, caja, [ventas[i] for i in tanda])
+        for i, respuesta in zip(tanda, resultado):
+            respuestas[i] = respuesta
+
+    for i, venta in enumerate(ventas):
+        if respuestas[i] is None:
+            respuestas[i] = {**respuestas[primera[venta['clave']]], 'repetida': True}
+    return respuestas
@@ -1,23 +1,38 @@
-from django.test import TestCase
+from django.db import connection
+from django.db.models import F
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from usuarios.models import Rol, Usuario
+from django.contrib.auth.models import User
+from django.utils import timezone
 from caja.models import Caja
-from inventario.models import Producto
+from core.pruebas import PresupuestoConsultasMixin
+from inventario.models import Presentacion
+from inventario.tests import crear_presentacion
+from . import services
+from .models import ResumenDiaCategoria, ResumenHoraPresentacion, Venta, VentaIdempotente
+from .services import VentaRechazada, registrar_venta, registrar_ventas_lote
 from decimal import Decimal
 import datetime
+import io
+import json
+from unittest import mock
 
 
-class VentaMenuTest(TestCase):
+class VentaMenuTest(PresupuestoConsultasMixin, TestCase):
     def test_venta_menu_links_exist(self):
+        user = User.objects.create_user(username='testuser', password='x')
+        self.client.force_login(user)
         resp = self.client.get('/')
         self.assertEqual(resp.status_code, 200)
         self.assertIn(b'Ventas', resp.content)
 
 
-class VentaCreateTest(TestCase):
+class VentaCreateTest(PresupuestoConsultasMixin, TestCase):
     def setUp(self):
-        self.rol = Rol.objects.create(nombre='ADMIN')
-        self.user = Usuario.objects.create(username='testuser', password_hash='x', nombre='Test', rol=self.rol)
+        self.user = User.objects.create_user(username='testuser', password='x')
+        self.client.force_login(self.user)
         self.caja = Caja.objects.create(
             fecha=datetime.date.today(),
             monto_inicial=0,
@@ -26,28 +41,19 @@ class VentaCreateTest(TestCase):
             total_debito=0,
             total_transferencia=0,
             ganancia_diaria=0,
-            hora_apertura=datetime.datetime.now(),
-            abierta_por=self.user
+            hora_apertura=timezone.now(),
         )
-        self.product = Producto.objects.create(
+        self.product = crear_presentacion(
             codigo_barra='0001',
-            nombre='Producto Test',
-            categoria='Cat',
-            tipo_producto='UNITARIO',
-            unidad_base='UNIDAD',
-            stock_base=Decimal('10'),
-            stock_minimo=Decimal('1'),
+            stock_base='10',
             precio_compra=Decimal('1.00'),
             precio_venta=Decimal('2.00'),
-            margen_ganancia=Decimal('100')
         )
 
     def test_venta_single_line_descuenta_stock(self):
         url = reverse('venta_create')
         data = {
             'metodo_pago': 'EFECTIVO',
-            'usuario': str(self.user.id),
-            'caja': str(self.caja.id),
             # formset management
             'form-TOTAL_FORMS': '1',
             'form-INITIAL_FORMS': '0',
@@ -66,8 +72,6 @@ class VentaCreateTest(TestCase):
         url = reverse('venta_create')
         data = {
             'metodo_pago': 'EFECTIVO',
-            'usuario': str(self.user.id),
-            'caja': str(self.caja.id),
             # formset management
             'form-TOTAL_FORMS': '1',
             'form-INITIAL_FORMS': '0',
@@ -84,3 +88,292 @@ class VentaCreateTest(TestCase):
         self.assertEqual(self.product.stock_base, Decimal('10'))
         # response should include error message
         self.assertContains(resp, 'Stock insuficiente')
+
+    def test_solo_el_post_abre_una_transaccion(self):
+        # con SQLite en modo IMMEDIATE cada atomic() toma el lock de escritura
+        with mock.patch('ventas.views.transaction') as transaccion:
+            resp = self.client.get(reverse('venta_create'))
+            self.assertEqual(resp.status_code, 200)
+            transaccion.atomic.assert_not_called()
+            self.client.post(reverse('venta_create'), {'metodo_pago': 'EFECTIVO', 'form-TOTAL_FORMS': '0',
+                                                       'form-INITIAL_FORMS': '0'})
+            transaccion.atomic.assert_called_once_with()
+
+
+class RegistrarVentaTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.caja = Caja.objects.create(
+            fecha=datetime.date.today(),
+            monto_inicial=0,
+            hora_apertura=timezone.now(),
+        )
+        primera = crear_presentacion(codigo_barra='1000', stock_base='100')
+        self.presentaciones = [primera] + [
+            crear_presentacion(codigo_barra=str(1000 + i), stock_base='100', producto=primera.producto)
+            for i in range(1, 40)
+        ]
+
+    def _lineas(self, cantidad):
+        return [
+            {
+                'presentacion_id': p.id,
+                'unidad_venta': 'UNIDAD',
+                'cantidad_ingresada': Decimal('2'),
+            }
+            for p in self.presentaciones[:cantidad]
+        ]
+
+    def test_consultas_constantes_sin_importar_el_tamano(self):
+        consultas = []
+        for cantidad in (1, 40):
+            with CaptureQueriesContext(connection) as ctx:
+                registrar_venta(self.user, self.caja, 'EFECTIVO', self._lineas(cantidad))
+            consultas.append(len(ctx.captured_queries))
+        self.assertEqual(consultas[0], consultas[1])
+
+        with self.assertNumQueries(consultas[0]):
+            venta = registrar_venta(self.user, self.caja, 'DEBITO', self._lineas(40))
+        self.assertEqual(venta.detalles.count(), 40)
+        self.assertEqual(venta.movimientos_stock.count(), 40)
+        self.assertEqual(venta.total, Decimal('64000.00'))
+
+    def test_presentacion_inexistente_rechaza_la_venta(self):
+        lineas = self._lineas(2) + [
+            {'presentacion_id': 999999, 'unidad_venta': 'UNIDAD', 'cantidad_ingresada': Decimal('1')},
+        ]
+        with self.assertRaises(VentaRechazada) as ctx:
+            registrar_venta(self.user, self.caja, 'EFECTIVO', lineas)
+        self.assertEqual(list(ctx.exception.errores), [2])
+        self.assertFalse(Venta.objects.exists())
+
+
+@override_settings(VENTAS_LOTE_TANDA=10)
+class VentaLoteTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='terminal', password='x')
+        self.client.force_login(self.user)
+        self.caja = Caja.objects.create(
+            fecha=datetime.date.today(),
+            monto_inicial=0,
+            hora_apertura=timezone.now(),
+        )
+        self.presentacion = crear_presentacion(
+            codigo_barra='2000',
+            stock_base='100',
+            precio_compra=Decimal('1.00'),
+            precio_venta=Decimal('3.00'),
+        )
+
+    def _venta(self, clave, cantidad='1', metodo='EFECTIVO', presentacion_id=None):
+        return {
+            'clave': clave,
+            'metodo_pago': metodo,
+            'lineas': [{
+                'presentacion_id': presentacion_id or self.presentacion.id,
+                'unidad_venta': 'UNIDAD',
+                'cantidad_ingresada': cantidad,
+            }],
+        }
+
+    def _enviar(self, ventas):
+        response = self.client.post(
+            reverse('venta_lote'), json.dumps({'ventas': ventas}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['resultados']
+
+    def test_registra_el_lote_y_responde_por_venta(self):
+        ventas = [self._venta(f't1-{i}', metodo='DEBITO' if i % 2 else 'EFECTIVO') for i in range(25)]
+        ventas[3] = self._venta('t1-3', cantidad='1000')
+        ventas[7] = self._venta('t1-7', presentacion_id=999999)
+        ventas[9] = {'clave': 't1-9', 'metodo_pago': 'CHEQUE', 'lineas': []}
+        with self.captureOnCommitCallbacks(execute=True):
+            resultados = self._enviar(ventas)
+
+        self.assertEqual([r['clave'] for r in resultados], [v['clave'] for v in ventas])
+        estados = [r['estado'] for r in resultados]
+        self.assertEqual(estados.count('creada'), 22)
+        self.assertEqual([estados[i] for i in (3, 7, 9)], ['rechazada'] * 3)
+        self.assertIn('Stock insuficiente', resultados[3]['errores']['0'])
+        self.assertEqual(set(resultados[9]['errores']), {'metodo_pago', 'lineas'})
+
+        self.presentacion.refresh_from_db()
+        self.assertEqual(self.presentacion.stock_base, Decimal('78'))
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.total_vendido, Decimal('66.00'))
+        self.assertEqual(self.caja.total_debito + self.caja.total_efectivo, Decimal('66.00'))
+        self.assertEqual(self.caja.ganancia_diaria, Decimal('44.00'))
+        self.assertEqual(Venta.objects.count(), 22)
+        self.assertEqual(self.presentacion.movimientos.filter(tipo='VENTA').count(), 22)
+
+    def test_claves_repetidas_no_se_procesan_de_nuevo(self):
+        primeras = self._enviar([self._venta('a'), self._venta('b'), self._venta('a')])
+        self.assertEqual([r.get('repetida', False) for r in primeras], [False, False, True])
+        self.assertEqual(primeras[2]['venta_id'], primeras[0]['venta_id'])
+
+        # un reintento completo solo lee la tabla de claves
+        with CaptureQueriesContext(connection) as ctx:
+            reintento = self._enviar([self._venta('a'), self._venta('b')])
+        self.assertFalse(any('INSERT' in q['sql'] or 'UPDATE' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual([r['venta_id'] for r in reintento], [r['venta_id'] for r in primeras[:2]])
+        self.assertTrue(all(r['repetida'] for r in reintento))
+        self.assertEqual(Venta.objects.count(), 2)
+        self.assertEqual(VentaIdempotente.objects.count(), 2)
+
+    def test_consultas_por_tanda_y_no_por_venta(self):
+        consultas = []
+        for inicio, cantidad in ((0, 1), (100, 10)):
+            with CaptureQueriesContext(connection) as ctx:
+                registrar_ventas_lote(self.user, self.caja, [
+                    {**self._venta(f'c{inicio + i}'), 'lineas': [{
+                        'presentacion_id': self.presentacion.id,
+                        'unidad_venta': 'UNIDAD',
+                        'cantidad_ingresada': Decimal('1'),
+                    }]}
+                    for i in range(cantidad)
+                ])
+            consultas.append(len(ctx.captured_queries))
+        self.assertEqual(consultas[0], consultas[1])
+
+    def test_stock_cambiado_registra_una_a_una(self):
+        descontar = services.descontar_stock
+        concurrentes = []
+
+        def con_venta_concurrente(requeridos):
+            # otra terminal vende 99 entre la lectura y el descuento de la tanda
+            if not concurrentes:
+                concurrentes.append(Presentacion.objects.filter(pk=self.presentacion.pk).update(
+                    stock_base=F('stock_base') - 99,
+                ))
+            return descontar(requeridos)
+
+        with mock.patch('ventas.services.descontar_stock', side_effect=con_venta_concurrente):
+            resultados = self._enviar([self._venta('x'), self._venta('y')])
+        self.assertEqual([r['estado'] for r in resultados], ['creada', 'rechazada'])
+        self.assertEqual(VentaIdempotente.objects.get().clave, 'x')
+        self.presentacion.refresh_from_db()
+        self.assertEqual(self.presentacion.stock_base, Decimal('0'))
+
+    def test_clave_registrada_a_la_vez_en_el_camino_lento(self):
+        otra = []
+
+        def con_peticion_concurrente(usuario, caja, ventas):
+            # otra petición registra la clave 'x' y la tanda sigue una a una
+            venta = registrar_venta(usuario, caja, 'EFECTIVO', ventas[0]['lineas'])
+            otra.append(VentaIdempotente.objects.create(
+                clave='x', venta=venta, respuesta=services._respuesta(venta),
+            ))
+            raise services._StockCambiado
+
+        with mock.patch('ventas.services._registrar_tanda', side_effect=con_peticion_concurrente):
+            resultados = registrar_ventas_lote(self.user, self.caja, [
+                self._venta('x', cantidad=Decimal('1')), self._venta('y', cantidad=Decimal('1')),
+            ])
+        self.assertEqual(resultados[0], {**otra[0].respuesta, 'repetida': True})
+        self.assertEqual(resultados[1]['estado'], 'creada')
+        self.assertEqual(Venta.objects.count(), 2)
+        self.presentacion.refresh_from_db()
+        self.assertEqual(self.presentacion.stock_base, Decimal('98'))
+
+    def test_sin_caja_abierta(self):
+        Caja.objects.update(abierta=False)
+        response = self.client.post(
+            reverse('venta_lote'), json.dumps({'ventas': [self._venta('a')]}), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 409)
+
+
+class ResumenesVentasTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cajero', password='x')
+        self.caja = Caja.objects.create(
+            fecha=datetime.date.today(),
+            monto_inicial=0,
+            hora_apertura=timezone.now(),
+        )
+        self.lata = crear_presentacion(codigo_barra='3000', stock_base='100')
+        self.pack = crear_presentacion(
+            codigo_barra='3001', stock_base='100', producto=self.lata.producto,
+            precio_compra=Decimal('2500'), precio_venta=Decimal('4000'),
+        )
+
+    def _vender(self, metodo, *lineas):
+        return registrar_venta(self.user, self.caja, metodo, [
+            {'presentacion_id': p.id, 'unidad_venta': 'UNIDAD', 'cantidad_ingresada': Decimal(c)}
+            for p, c in lineas
+        ])
+
+    def _resumenes(self):
+        return (
+            sorted(ResumenHoraPresentacion.objects.values_list('presentacion', 'hora', 'unidades', 'ingresos', 'ganancia')),
+            sorted(ResumenDiaCategoria.objects.values_list('fecha', 'categoria', 'metodo_pago', 'unidades', 'ingresos', 'ganancia')),
+        )
+
+    def test_acumula_al_vender(self):
+        self._vender('EFECTIVO', (self.lata, '2'), (self.pack, '1'))
+        self._vender('EFECTIVO', (self.lata, '3'))
+        self._vender('DEBITO', (self.lata, '1'))
+
+        lata = ResumenHoraPresentacion.objects.get(presentacion=self.lata)
+        self.assertEqual((lata.unidades, lata.ingresos, lata.ganancia), (Decimal('6'), Decimal('4800'), Decimal('1800')))
+        self.assertEqual(lata.hora, timezone.localtime().replace(minute=0, second=0, microsecond=0))
+        efectivo = ResumenDiaCategoria.objects.get(metodo_pago='EFECTIVO')
+        self.assertEqual(efectivo.fecha, timezone.localdate())
+        self.assertEqual(
+            (efectivo.unidades, efectivo.ingresos, efectivo.ganancia),
+            (Decimal('6'), Decimal('8000'), Decimal('3000')),
+        )
+        self.assertEqual(ResumenDiaCategoria.objects.get(metodo_pago='DEBITO').ingresos, Decimal('800'))
+
+    def test_reconstruir_coincide_con_lo_acumulado(self):
+        self._vender('EFECTIVO', (self.lata, '2'), (self.pack, '1'))
+        self._vender('TRANSFERENCIA', (self.pack, '2'))
+        acumulado = self._resumenes()
+
+        ResumenHoraPresentacion.objects.update(unidades=0)
+        out = io.StringIO()
+        call_command('reconstruir_resumenes_ventas', '--desde', timezone.localdate().isoformat(), stdout=out)
+        self.assertIn('2 fila(s) por hora', out.getvalue())
+        self.assertEqual(self._resumenes(), acumulado)
+
+
+class VentaExportarTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='contador', password='x')
+        self.client.force_login(self.user)
+        self.caja = Caja.objects.create(
+            fecha=datetime.date.today(),
+            monto_inicial=0,
+            hora_apertura=timezone.now(),
+        )
+        self.presentacion = crear_presentacion(stock_base='100')
+        for metodo in ('EFECTIVO', 'DEBITO', 'EFECTIVO'):
+            registrar_venta(self.user, self.caja, metodo, [{
+                'presentacion_id': self.presentacion.id,
+                'unidad_venta': 'UNIDAD',
+                'cantidad_ingresada': Decimal('1'),
+            }])
+
+    def test_csv_en_streaming_con_filtros(self):
+        resp = self.client.get(reverse('venta_exportar'), {'formato': 'csv', 'metodo_pago': 'EFECTIVO'})
+        self.assertTrue(resp.streaming)
+        lineas = b''.join(resp.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lineas), 3)
+        self.assertTrue(lineas[0].startswith('Venta,Fecha,Caja'))
+        self.assertIn('EFECTIVO,contador,0001,Bebida,Lata 350cc,1.000', lineas[1])
+
+    def test_rango_de_fechas(self):
+        ayer = datetime.date.today() - datetime.timedelta(days=1)
+        resp = self.client.get(reverse('venta_exportar'), {'formato': 'csv', 'hasta': ayer.isoformat()})
+        lineas = b''.join(resp.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lineas), 1)
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        resp = self.client.get(reverse('venta_exportar'), {'formato': 'xlsx', 'caja': self.caja.id})
+        libro = load_workbook(io.BytesIO(b''.join(resp.streaming_content)), read_only=True)
+        filas = list(libro.active.iter_rows(values_only=True))
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(filas[1][3], 'EFECTIVO')
@@ -4,4 +4,6 @@ from . import views
 urlpatterns = [
     path('', views.venta_list, name='venta_list'),
     path('create/', views.venta_create, name='venta_create'),
+    path('exportar/', views.venta_exportar, name='venta_exportar'),
+    path('lote/', views.venta_lote, name='venta_lote'),
 ]
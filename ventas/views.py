@@ -1,126 +1,146 @@
+import json
 from decimal import Decimal
+from functools import wraps
+from django.conf import settings
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.db import transaction
 from django.contrib import messages
 from django.contrib.auth import get_user_model
+from django.contrib.auth.decorators import login_required
+from django.utils import timezone
+from django.views.decorators.http import require_POST
 
 from core.enums import MetodoPago, UnidadVenta
-from caja.models import Caja
-from inventario.models import Presentacion
-from .models import Venta, VentaDetalle
-from .forms import VentaForm, VentaDetalleFormSet
-
-
+from core.instrumentacion import presupuesto_consultas
+from core.paginacion import conteo_aproximado, paginar
+from core.routers import solo_lectura
+from auditoria import registro as auditoria
+from caja.services import caja_abierta, leer_terminal, terminal_de
+from .models import Venta
+from .exportacion import detalles_filtrados, filas_csv, libro_xlsx
+from .forms import VentaForm, VentaDetalleForm, VentaDetalleFormSet, VentaExportForm
+from .services import VentaRechazada, registrar_venta, registrar_ventas_lote
+
+
+@presupuesto_consultas(7)
 def venta_list(request):
-    ventas = Venta.objects.order_by('-fecha')[:50]
-    return render(request, 'ventas/venta_list.html', {'ventas': ventas})
-
-
-@transaction.atomic
+    pagina = paginar(
+        Venta.objects.select_related('usuario', 'caja'),
+        ('-fecha', '-id'),
+        request.GET.get('cursor'),
+    )
+    return render(request, 'ventas/venta_list.html', {
+        'ventas': pagina,
+        'pagina': pagina,
+        'total_aproximado': conteo_aproximado(Venta),
+        'export_form': VentaExportForm(),
+    })
+
+
+@login_required
+@solo_lectura()
+def venta_exportar(request):
+    form = VentaExportForm(request.GET)
+    if not form.is_valid():
+        messages.error(request, 'Filtros de exportación inválidos.')
+        return redirect('venta_list')
+
+    detalles = detalles_filtrados(
+        desde=form.cleaned_data['desde'],
+        hasta=form.cleaned_data['hasta'],
+        caja=form.cleaned_data['caja'],
+        metodo_pago=form.cleaned_data['metodo_pago'],
+    )
+    # El CSV se genera después de que la vista devuelve: se fija el alias ahora.
+    detalles = detalles.using(detalles.db)
+    nombre = f"ventas_{timezone.localdate():%Y%m%d}"
+
+    if form.cleaned_data['formato'] == 'xlsx':
+        return FileResponse(
+            libro_xlsx(detalles),
+            as_attachment=True,
+            filename=f'{nombre}.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+    response = StreamingHttpResponse(filas_csv(detalles), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    return response
+
+
+def _atomica_en_post(vista):
+    """
+    ``transaction.atomic`` solo para POST. Con SQLite en modo IMMEDIATE
+    cada bloque atómico toma el lock de escritura al empezar: el GET del
+    formulario no escribe y no debe hacer esperar a las cajas que venden.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method == 'POST':
+            with transaction.atomic():
+                return vista(request, *args, **kwargs)
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+@_atomica_en_post
+@presupuesto_consultas(18)
 def venta_create(request):
     User = get_user_model()
     
-    # Obtener usuario actual y caja activa automáticamente
+    # Obtener usuario actual y la caja abierta de su terminal automáticamente
     usuario_actual = request.user
-    caja_activa = Caja.objects.filter(abierta=True).first()
+    caja_activa = caja_abierta(terminal_de(request))
     
     if not caja_activa:
-        messages.error(request, 'No hay una caja abierta. Por favor, abra una caja primero.')
+        messages.error(request, 'No hay una caja abierta en esta terminal. Por favor, abra una caja primero.')
         return redirect('caja_list')
     
     metodo_choices = MetodoPago.choices
     unidad_choices = UnidadVenta.choices
 
-    presentaciones = Presentacion.objects.all()
-    presentaciones_data = []
-    presentacion_stock_map = {}
-    
-    for p in presentaciones:
-        if p.stock_base > 0:  # Solo presentaciones con stock
-            presentaciones_data.append({
-                'id': p.id,
-                'codigo_barra': p.codigo_barra,
-                'nombre': f"{p.producto.nombre} - {p.nombre}",
-                'precio': float(p.precio_venta),
-                'producto_nombre': p.producto.nombre,
-                'cantidad': float(p.cantidad_base),
-                'unidad': p.unidad_venta
-            })
-            presentacion_stock_map[str(p.id)] = str(p.stock_base)
-
     if request.method == 'POST':
         vform = VentaForm(request.POST, metodo_choices=metodo_choices)
         dformset = VentaDetalleFormSet(request.POST, form_kwargs={'unidad_choices': unidad_choices})
 
         if vform.is_valid() and dformset.is_valid():
-            # aggregate required stock per presentacion
-            required = {}
-            detalles = []
+            lineas = []
+            lineas_forms = []
             for form in dformset:
                 if form.cleaned_data and not form.cleaned_data.get('DELETE', False):
-                    presentacion = form.cleaned_data['presentacion']
-                    unidad_venta = form.cleaned_data['unidad_venta']
-                    cantidad_ingresada = form.cleaned_data['cantidad_ingresada']
-
-                    # compute cantidad_base (simplificado)
-                    cantidad_base = cantidad_ingresada
-
-                    # accumulate per presentacion
-                    required.setdefault(presentacion.id, Decimal('0'))
-                    required[presentacion.id] += cantidad_base
-
-                    # compute precio_unitario
-                    precio_unitario = presentacion.precio_venta
-
-                    subtotal = (precio_unitario * cantidad_ingresada).quantize(Decimal('0.01'))
-
-                    detalles.append({
-                        'presentacion': presentacion,
-                        'unidad_venta': unidad_venta,
-                        'cantidad_ingresada': cantidad_ingresada,
-                        'cantidad_base': cantidad_base,
-                        'precio_unitario': precio_unitario,
-                        'subtotal': subtotal
+                    lineas.append({
+                        'presentacion_id': form.cleaned_data['producto'],
+                        'unidad_venta': form.cleaned_data['unidad_venta'],
+                        'cantidad_ingresada': form.cleaned_data['cantidad_ingresada'],
                     })
+                    lineas_forms.append(form)
 
-            # check stock availability
-            stock_insuficiente = False
-            for presentacion_id, required_qty in required.items():
-                available_stock = presentacion_stock_map.get(str(presentacion_id), '0')
-                if Decimal(required_qty) > Decimal(available_stock):
-                    stock_insuficiente = True
-                    break
-
-            if stock_insuficiente:
-                messages.error(request, 'Stock insuficiente para algunas presentaciones.')
+            # create venta con usuario y caja automáticos
+            try:
+                venta = registrar_venta(
+                    usuario=usuario_actual,
+                    caja=caja_activa,
+                    metodo_pago=vform.cleaned_data['metodo_pago'],
+                    lineas=lineas,
+                )
+            except VentaRechazada as exc:
+                for indice, error in exc.errores.items():
+                    lineas_forms[indice].add_error('cantidad_ingresada', error)
+                messages.error(request, str(exc))
                 return render(request, 'ventas/venta_form.html', {
                     'vform': vform,
                     'dformset': dformset,
-                    'products': presentaciones_data,
-                    'product_stock_map': presentacion_stock_map,
                     'unidad_choices': unidad_choices,
+                    'caja_activa': caja_activa,
+                    'usuario_actual': usuario_actual,
                 })
 
-            # create venta con usuario y caja automáticos
-            venta = Venta.objects.create(
-                metodo_pago=vform.cleaned_data['metodo_pago'],
-                usuario=usuario_actual,
-                caja=caja_activa,
-                total=sum(d['subtotal'] for d in detalles)
+            auditoria.registrar(
+                usuario_actual,
+                'VENTA',
+                f'Venta {venta.id} por ${venta.total} ({venta.get_metodo_pago_display()}, {len(lineas)} línea(s))',
             )
-
-            # create venta detalles
-            for detalle_data in detalles:
-                VentaDetalle.objects.create(
-                    venta=venta,
-                    presentacion=detalle_data['presentacion'],
-                    unidad_venta=detalle_data['unidad_venta'],
-                    cantidad_ingresada=detalle_data['cantidad_ingresada'],
-                    cantidad_base=detalle_data['cantidad_base'],
-                    precio_unitario=detalle_data['precio_unitario'],
-                    subtotal=detalle_data['subtotal']
-                )
-
             messages.success(request, 'Venta creada exitosamente.')
             return redirect('venta_list')
 
@@ -131,9 +151,98 @@ def venta_create(request):
     return render(request, 'ventas/venta_form.html', {
         'vform': vform,
         'dformset': dformset,
-        'products': presentaciones_data,
-        'product_stock_map': presentacion_stock_map,
         'unidad_choices': unidad_choices,
         'caja_activa': caja_activa,
         'usuario_actual': usuario_actual,
-    })
\ No newline at end of file
+    })
+
+
+def _venta_del_lote(datos):
+    """
+    Valida una venta del lote con los mismos formularios que ``venta_create``.
+    Devuelve ``(venta, None)`` lista para ``registrar_ventas_lote`` o
+    ``(None, errores)``.
+    """
+    if not isinstance(datos, dict):
+        return None, {'venta': ['Debe ser un objeto.']}
+    vform = VentaForm({'metodo_pago': datos.get('metodo_pago')}, metodo_choices=MetodoPago.choices)
+    errores = {} if vform.is_valid() else {campo: list(e) for campo, e in vform.errors.items()}
+    lineas = datos.get('lineas')
+    if not isinstance(lineas, list) or not lineas:
+        errores['lineas'] = ['Debe indicar al menos una línea.']
+        return None, errores
+
+    validas = []
+    for indice, linea in enumerate(lineas):
+        linea = linea if isinstance(linea, dict) else {}
+        form = VentaDetalleForm({
+            'producto': linea.get('presentacion_id'),
+            'unidad_venta': linea.get('unidad_venta'),
+            'cantidad_ingresada': linea.get('cantidad_ingresada'),
+        }, unidad_choices=UnidadVenta.choices)
+        if form.is_valid():
+            validas.append({
+                'presentacion_id': form.cleaned_data['producto'],
+                'unidad_venta': form.cleaned_data['unidad_venta'],
+                'cantidad_ingresada': form.cleaned_data['cantidad_ingresada'],
+            })
+        else:
+            errores[str(indice)] = [e for lista in form.errors.values() for e in lista]
+    if errores:
+        return None, errores
+    return {'clave': datos['clave'], 'metodo_pago': vform.cleaned_data['metodo_pago'], 'lineas': validas}, None
+
+
+@login_required
+@require_POST
+def venta_lote(request):
+    """
+    Recibe ``{"terminal": 2, "ventas": [{"clave", "metodo_pago", "lineas":
+    [...]}, ...]}`` desde una terminal que estuvo sin conexión (sin
+    ``terminal``, la de la sesión) y contesta
+    ``{"resultados": [...]}`` con una respuesta por venta, en el mismo orden
+    (ver ``ventas.services.registrar_ventas_lote``).
+    """
+    try:
+        datos_lote = json.loads(request.body)
+        ventas = datos_lote['ventas']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Se esperaba un JSON con la lista "ventas".'}, status=400)
+    if not isinstance(ventas, list):
+        return JsonResponse({'error': 'Se esperaba un JSON con la lista "ventas".'}, status=400)
+    maximo = getattr(settings, 'VENTAS_LOTE_MAXIMO', 500)
+    if len(ventas) > maximo:
+        return JsonResponse({'error': f'Se aceptan hasta {maximo} ventas por lote.'}, status=400)
+    for datos in ventas:
+        clave = datos.get('clave') if isinstance(datos, dict) else None
+        if not isinstance(clave, str) or not 0 < len(clave) <= 64:
+            return JsonResponse({'error': 'Cada venta necesita una "clave" de 1 a 64 caracteres.'}, status=400)
+
+    # la terminal puede venir en el JSON; si no, la de la sesión
+    terminal = leer_terminal(datos_lote.get('terminal')) or terminal_de(request)
+    caja_activa = caja_abierta(terminal)
+    if not caja_activa:
+        return JsonResponse({'error': f'La terminal {terminal} no tiene una caja abierta.'}, status=409)
+
+    resultados = [None] * len(ventas)
+    validas, posiciones = [], []
+    for i, datos in enumerate(ventas):
+        venta, errores = _venta_del_lote(datos)
+        if errores:
+            resultados[i] = {'estado': 'rechazada', 'errores': errores}
+        else:
+            validas.append(venta)
+            posiciones.append(i)
+
+    for i, respuesta in zip(posiciones, registrar_ventas_lote(request.user, caja_activa, validas)):
+        resultados[i] = respuesta
+        if respuesta['estado'] == 'creada' and not respuesta.get('repetida'):
+            auditoria.registrar(
+                request.user,
+                'VENTA',
+                f"Venta {respuesta['venta_id']} por ${respuesta['total']} (lote de terminal)",
+            )
+    for datos, resultado in zip(ventas, resultados):
+        resultado['clave'] = datos['clave']
+    return JsonResponse({'resultados': resultados})
+